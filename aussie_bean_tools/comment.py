@@ -1,32 +1,222 @@
+import collections
+import datetime
+import mmap
+import os
 import re
+import shutil
 import sys
+import tempfile
 
 import click
+from beancount import loader
+from beancount.core import data, number
 
+# The first line of a transaction block, eg: '2026-05-27 * "Up Simon" ...'
+DATE_RE = re.compile(r'^(\d{4}-\d{2}-\d{2})\s')
 
-def comment_transactions(accounts, text):
-    """Return text with any transaction posting to one of accounts commented out."""
+# An indented posting line, with its amount if one is given,
+# eg: '  Assets:Bank:Joint-CompleteFreedom  -350.00 AUD'
+POSTING_RE = re.compile(
+    r'^[ \t]+([A-Z][A-Za-z0-9-]*(?::[A-Za-z0-9][A-Za-z0-9-]*)+)'
+    r'(?:[ \t]+(-?[\d,]*\.?\d+)[ \t]+[A-Z]+)?',
+    re.MULTILINE,
+)
+
+# The start of a transaction block in a raw ledger file, eg: b'2026-05-27 * '.
+# Matched against the memory-mapped bytes so the file is never decoded whole.
+TRANSACTION_START_RE = re.compile(
+    rb'(?:\A|\n\n)(\d{4}-\d{2}-\d{2})[ \t]+(?:\*|!|txn)[ \t]')
+
+
+def _comment_block(block):
+    """Prefix every non-blank line of block with ';'."""
+    return '\n'.join(
+        (';' + line) if line.strip() else line
+        for line in block.split('\n')
+    )
+
+
+def _comment_blocks(text, predicate):
+    """Return text with every block for which predicate(block) is true commented out."""
     blocks = re.split(r'\n\n', text)
     result = []
     for block in blocks:
-        if block.strip() and any(account in block for account in accounts):
-            block = '\n'.join(
-                (';' + line) if line.strip() else line
-                for line in block.split('\n')
-            )
+        if block.strip() and predicate(block):
+            block = _comment_block(block)
         result.append(block)
     return '\n\n'.join(result)
 
 
+def comment_transactions(accounts, text):
+    """Return text with any transaction posting to one of accounts commented out."""
+    return _comment_blocks(
+        text, lambda block: any(account in block for account in accounts))
+
+
+def transfer_index(entries):
+    """Index transactions by (date, abs amount).
+
+    Each key maps to the account sets of the transactions with that date and
+    amount, so a lookup is a single hash probe however many years of entries
+    are indexed.
+
+    Args:
+        entries: beancount directives, eg: from loader.load_file().
+
+    Returns:
+        dict of (datetime.date, Decimal) -> list of frozensets of account names.
+    """
+    index = collections.defaultdict(list)
+    for entry in entries:
+        if not isinstance(entry, data.Transaction):
+            continue
+        accounts = frozenset(posting.account for posting in entry.postings)
+        for posting in entry.postings:
+            if posting.units is None or not isinstance(
+                    posting.units.number, number.Decimal):
+                continue
+            key = (entry.date, abs(posting.units.number))
+            if accounts not in index[key]:
+                index[key].append(accounts)
+    return index
+
+
+def load_transfer_index(filenames):
+    """Build a transfer_index() over every transaction in the given ledger files."""
+    entries = []
+    for filename in filenames:
+        loaded, _, _ = loader.load_file(filename)
+        entries.extend(loaded)
+    return transfer_index(entries)
+
+
+def is_recorded_transfer(index, block):
+    """Return True if the transaction in block is already recorded in index.
+
+    The block matches when it has the date and absolute amount of an indexed
+    transaction, and that transaction also posts to every one of the block's
+    accounts (ie: it is the other side of the same transfer).
+    """
+    match = DATE_RE.match(block)
+    if match is None:
+        return False
+    date_ = datetime.date.fromisoformat(match.group(1))
+    postings = POSTING_RE.findall(block)
+    accounts = {account for account, _ in postings}
+    for _, value in postings:
+        if not value:
+            continue
+        recorded = index.get((date_, abs(number.D(value))), ())
+        if any(accounts <= other for other in recorded):
+            return True
+    return False
+
+
+def comment_transfers(index, text):
+    """Return text with any transaction already recorded in index commented out."""
+    return _comment_blocks(text, lambda block: is_recorded_transfer(index, block))
+
+
+def _transaction_spans(buf):
+    """Yield (start, end, date) for each transaction block in buf.
+
+    Blocks are separated by a blank line, as in comment_transactions(). buf is
+    any bytes-like object (eg: an mmap); only the date is copied out of it.
+    """
+    for match in TRANSACTION_START_RE.finditer(buf):
+        start = match.start(1)
+        end = buf.find(b'\n\n', start)
+        yield start, (len(buf) if end == -1 else end), match.group(1)
+
+
+def matching_spans(buf, accounts=(), index=None):
+    """Yield (start, end) of each transaction block in buf to comment out.
+
+    A block matches if it contains one of accounts, or is_recorded_transfer()
+    finds it in index. Only blocks dated on a day present in index are decoded.
+    """
+    accounts = [account.encode() for account in accounts]
+    dates = {date_ for date_, _ in index} if index else set()
+    for start, end, date_ in _transaction_spans(buf):
+        if any(buf.find(account, start, end) != -1 for account in accounts):
+            yield start, end
+        elif (datetime.date.fromisoformat(date_.decode()) in dates
+              and is_recorded_transfer(index, buf[start:end].decode())):
+            yield start, end
+
+
+def comment_in_place(filename, accounts=(), index=None):
+    """Comment out matching transactions directly in a ledger file.
+
+    The file is memory-mapped and scanned with matching_spans(). If anything
+    matches, a replacement is written alongside it, copying the untouched byte
+    ranges verbatim, and atomically renamed over the original.
+
+    Returns:
+        The number of transactions commented out.
+    """
+    with open(filename, 'rb') as fileobj:
+        if os.fstat(fileobj.fileno()).st_size == 0:
+            return 0  # An empty file cannot be mapped, and has nothing to match.
+        with mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            spans = list(matching_spans(buf, accounts, index))
+            if not spans:
+                return 0
+            out = tempfile.NamedTemporaryFile(
+                'wb', delete=False,
+                dir=os.path.dirname(os.path.abspath(filename)),
+                prefix=f'.{os.path.basename(filename)}.', suffix='.tmp',
+            )
+            try:
+                with out, memoryview(buf) as view:
+                    pos = 0
+                    for start, end in spans:
+                        out.write(view[pos:start])
+                        out.write(b'\n'.join(
+                            (b';' + line) if line.strip() else line
+                            for line in buf[start:end].split(b'\n')
+                        ))
+                        pos = end
+                    out.write(view[pos:])
+                    out.flush()
+                    os.fsync(out.fileno())
+                shutil.copymode(filename, out.name)
+            except BaseException:
+                os.unlink(out.name)
+                raise
+    os.replace(out.name, filename)
+    return len(spans)
+
+
 @click.command
-@click.argument('accounts', nargs=-1, required=True)
-def cli(accounts):
+@click.option(
+    '--ledger', 'ledgers',
+    multiple=True,
+    type=click.Path(exists=True, dir_okay=False),
+    help='Sibling ledger file whose recorded transfers are silenced. Repeatable.',
+)
+@click.option(
+    '--in-place', 'files',
+    multiple=True,
+    type=click.Path(exists=True, dir_okay=False, writable=True),
+    help='Rewrite this ledger file instead of filtering stdin. Repeatable.',
+)
+@click.argument('accounts', nargs=-1)
+def cli(ledgers, files, accounts):
     """Read beancount from stdin; comment out transactions posting to ACCOUNTS.
 
     Any transaction that contains a posting to one of the given ACCOUNTS has
     every line prefixed with ';', turning it into a beancount comment block.
     All other transactions pass through unchanged.
 
+    With --ledger, only transactions already recorded in one of the given
+    ledger files are commented out: those with the same date and absolute
+    amount as a transaction there which also posts to all of their accounts.
+
+    With --in-place, the given ledger files are edited directly instead:
+    matching transactions are commented out and the rest of each file is
+    left byte-for-byte unchanged.
+
     Typical use: pipe fuzzer output through bean-comment before appending to
     your ledger, to silence transfers that are already recorded in another
     account's file.
@@ -36,5 +226,24 @@ def cli(accounts):
         fuzzer /tmp/joint.beancount \\
             | bean-comment Assets:Bank:Simon-Upbank Assets:Bank:Sheryl-Upbank \\
             >> joint-freedom-2026.beancount
+        fuzzer /tmp/joint.beancount \\
+            | bean-comment --ledger simon-upbank-2026.beancount \\
+                           --ledger sheryl-upbank-2026.beancount \\
+            >> joint-freedom-2026.beancount
+        bean-comment --in-place joint-freedom-2024.beancount \\
+            --ledger simon-upbank-2024.beancount
     """
-    print(comment_transactions(accounts, sys.stdin.read()), end='')
+    if not accounts and not ledgers:
+        raise click.UsageError('Give one or more ACCOUNTS, or --ledger FILE.')
+    if files:
+        index = load_transfer_index(ledgers) if ledgers else None
+        for filename in files:
+            count = comment_in_place(filename, accounts, index)
+            click.echo(f'{filename}: commented out {count} transactions', err=True)
+        return
+    text = sys.stdin.read()
+    if accounts:
+        text = comment_transactions(accounts, text)
+    if ledgers:
+        text = comment_transfers(load_transfer_index(ledgers), text)
+    print(text, end='')
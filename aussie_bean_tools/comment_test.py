@@ -1,4 +1,12 @@
-from .comment import comment_transactions
+import datetime
+from decimal import Decimal
+
+from click.testing import CliRunner
+
+from .comment import (
+    cli, comment_in_place, comment_transactions, comment_transfers,
+    load_transfer_index,
+)
 
 UPBANK_ACCOUNTS = ["Assets:Bank:Simon-Upbank", "Assets:Bank:Sheryl-Upbank"]
 
@@ -53,3 +61,118 @@ def test_no_accounts_matches_nothing():
     text = f"{TRANSFER_JOHN}\n\n{UNRELATED}"
     result = comment_transactions([], text)
     assert result == text
+
+
+SIMON_LEDGER = """\
+2026-01-01 open Assets:Bank:Simon-Upbank
+2026-01-01 open Assets:Bank:Joint-CompleteFreedom
+2026-01-01 open Expenses:Food
+
+2026-05-27 * "Up Simon" "Transfer from joint"
+  Assets:Bank:Simon-Upbank  350.00 AUD
+  Assets:Bank:Joint-CompleteFreedom
+
+2026-05-28 * "Woolworths" "Groceries"
+  Assets:Bank:Simon-Upbank  -20.99 AUD
+  Expenses:Food
+"""
+
+
+def _index(tmp_path, text=SIMON_LEDGER):
+    ledger = tmp_path / "simon.beancount"
+    ledger.write_text(text)
+    return load_transfer_index([str(ledger)])
+
+
+def test_index_keys_by_date_and_absolute_amount(tmp_path):
+    index = _index(tmp_path)
+    assert index[(datetime.date(2026, 5, 27), Decimal("350"))] == [
+        frozenset({"Assets:Bank:Simon-Upbank", "Assets:Bank:Joint-CompleteFreedom"})]
+
+
+def test_comments_transfer_recorded_in_sibling_ledger(tmp_path):
+    result = comment_transfers(_index(tmp_path), TRANSFER_JOHN)
+    assert result.splitlines() == [f";{line}" for line in TRANSFER_JOHN.splitlines()]
+
+
+def test_leaves_same_date_and_amount_on_unshared_accounts(tmp_path):
+    # The sibling's $20.99 grocery shop does not touch the joint account, so
+    # the joint account's own $20.99 purchase on the same day is kept.
+    result = comment_transfers(_index(tmp_path), UNRELATED)
+    assert result == UNRELATED
+
+
+def test_leaves_same_transfer_amount_to_another_sibling(tmp_path):
+    result = comment_transfers(_index(tmp_path), TRANSFER_FIONA)
+    assert result == TRANSFER_FIONA
+
+
+def test_leaves_transfer_not_recorded_in_sibling_ledger(tmp_path):
+    text = TRANSFER_JOHN.replace("-350.00", "-351.00")
+    assert comment_transfers(_index(tmp_path), text) == text
+
+
+def test_cli_ledger_option_comments_only_recorded_transfers(tmp_path):
+    ledger = tmp_path / "simon.beancount"
+    ledger.write_text(SIMON_LEDGER)
+    text = f"{TRANSFER_JOHN}\n\n{UNRELATED}\n\n{TRANSFER_FIONA}"
+    result = CliRunner().invoke(cli, ["--ledger", str(ledger)], input=text)
+    assert result.exit_code == 0, result.output
+    assert UNRELATED in result.output
+    assert TRANSFER_FIONA in result.output
+    for line in TRANSFER_JOHN.splitlines():
+        assert f";{line}" in result.output
+
+
+def test_cli_requires_accounts_or_ledger():
+    result = CliRunner().invoke(cli, [], input=UNRELATED)
+    assert result.exit_code != 0
+
+
+LEDGER_FILE = f"""\
+2026-01-01 open Assets:Bank:Joint-CompleteFreedom
+2026-01-01 open Assets:Bank:Simon-Upbank
+
+{TRANSFER_JOHN}
+
+{UNRELATED}
+"""
+
+
+def test_in_place_comments_only_matching_transactions(tmp_path):
+    ledger = tmp_path / "joint.beancount"
+    ledger.write_text(LEDGER_FILE)
+    count = comment_in_place(str(ledger), index=_index(tmp_path))
+    assert count == 1
+    commented = "\n".join(f";{line}" for line in TRANSFER_JOHN.splitlines())
+    assert ledger.read_text() == LEDGER_FILE.replace(TRANSFER_JOHN, commented)
+
+
+def test_in_place_by_account_skips_non_transaction_directives(tmp_path):
+    ledger = tmp_path / "joint.beancount"
+    ledger.write_text(LEDGER_FILE)
+    count = comment_in_place(str(ledger), accounts=["Assets:Bank:Simon-Upbank"])
+    assert count == 1
+    assert ledger.read_text().startswith(
+        "2026-01-01 open Assets:Bank:Joint-CompleteFreedom\n"
+        "2026-01-01 open Assets:Bank:Simon-Upbank\n\n;2026-05-27")
+
+
+def test_in_place_leaves_file_untouched_when_nothing_matches(tmp_path):
+    ledger = tmp_path / "joint.beancount"
+    ledger.write_text(LEDGER_FILE)
+    inode = ledger.stat().st_ino
+    assert comment_in_place(str(ledger), accounts=["Assets:Bank:Nobody"]) == 0
+    assert ledger.stat().st_ino == inode
+    assert ledger.read_text() == LEDGER_FILE
+    assert list(tmp_path.iterdir()) == [ledger]
+
+
+def test_cli_in_place_rewrites_files(tmp_path):
+    ledger = tmp_path / "joint.beancount"
+    ledger.write_text(LEDGER_FILE)
+    result = CliRunner().invoke(
+        cli, ["--in-place", str(ledger), "Assets:Bank:Simon-Upbank"])
+    assert result.exit_code == 0, result.output
+    assert f";{TRANSFER_JOHN.splitlines()[0]}" in ledger.read_text()
+    assert "commented out 1 transactions" in result.output
@@ -0,0 +1,152 @@
+"""Per-file memo of an importer's extracted entries.
+
+beangulp calls an importer's identify(), extract(), date() and filename()
+separately for each file, and date() needs the entries to find the last
+date, so without a memo each file is parsed two or three times per run.
+
+Entries are kept per (path, content hash). The hash is only recomputed when
+the file's size or mtime changes, so a file that is merely touched is not
+parsed again, and one that is rewritten in place is.
+
+Given a cache_dir, the entries are also pickled to disk, keyed by the
+content hash and the importer's configuration and code, so re-running an
+extract over unchanged downloads does not parse them at all. Only point
+cache_dir at a directory you trust: the pickles are loaded as they are.
+"""
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import sys
+import tempfile
+import types
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fileobj:
+        for chunk in iter(lambda: fileobj.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _dependencies(cls):
+    """The modules cls's behaviour comes from.
+
+    Those defining cls and its base classes, this one, and, transitively,
+    the modules of their own package that they use.
+    """
+    todo = [sys.modules[base.__module__] for base in cls.__mro__] + [sys.modules[__name__]]
+    found = set()
+    while todo:
+        module = todo.pop()
+        if module in found or getattr(module, "__file__", None) is None:
+            continue  # Seen, or built in.
+        found.add(module)
+        package = module.__name__.partition(".")[0]
+        for value in vars(module).values():
+            if isinstance(value, types.ModuleType):
+                name = value.__name__
+            else:
+                name = getattr(value, "__module__", None)
+            if isinstance(name, str) and name.partition(".")[0] == package and name in sys.modules:
+                todo.append(sys.modules[name])
+    return found
+
+
+@functools.lru_cache(maxsize=None)
+def code_version(cls):
+    """A hash of the source of every module cls depends on, for cache keys.
+
+    Any edit to the importer's code, its helpers or this module changes it,
+    so stale entries are never read back after an upgrade. Computed once
+    per process.
+    """
+    digest = hashlib.sha256()
+    for module in sorted(_dependencies(cls), key=lambda module: module.__name__):
+        digest.update(f"{module.__name__}:{_sha256(inspect.getfile(module))}\n".encode())
+    return digest.hexdigest()
+
+
+class ExtractMemo:
+    """Remembers what an importer extracted from each file."""
+
+    def __init__(self, cache_dir: str = None, config: tuple = ()):
+        """
+        cache_dir: directory to also keep the entries in; or None for memory only.
+        config: everything besides the file that the entries depend on, eg:
+            (account name, tags, code_version(type(importer))).
+        """
+        self.cache_dir = cache_dir
+        self.config = config
+        # (path, size, mtime) -> content hash
+        self._digests = {}
+        # (path, content hash), or a tuple of them when merged -> entries
+        self._entries = {}
+
+    def key(self, filepath):
+        """Return (absolute path, content hash) for filepath."""
+        path = os.path.abspath(filepath)
+        stat = os.stat(path)
+        identity = (path, stat.st_size, stat.st_mtime_ns)
+        digest = self._digests.get(identity)
+        if digest is None:
+            digest = self._digests[identity] = _sha256(path)
+        return path, digest
+
+    def get(self, filepath, extract):
+        """Return extract(filepath), calling it only the first time for this content.
+
+        Each call returns a new list of entries with their own copy of the
+        metadata, since beangulp marks duplicates in entry.meta in place.
+        """
+        return self._get(self.key(filepath), lambda: extract(filepath))
+
+    def get_merged(self, filepaths, extract):
+        """Return extract(filepaths), as get() does for one file.
+
+        The entries are kept for this combination of files and contents, so
+        a change to any of them extracts them all again.
+        """
+        return self._get(tuple(self.key(path) for path in filepaths),
+                         lambda: extract(filepaths))
+
+    def _get(self, key, extract):
+        try:
+            entries = self._entries[key]
+        except KeyError:
+            entries = self._load(key)
+            if entries is None:
+                entries = extract()
+                self._store(key, entries)
+            self._entries[key] = entries
+        return [entry._replace(meta=dict(entry.meta)) for entry in entries]
+
+    def _cache_path(self, key):
+        name = hashlib.sha256(repr((key, self.config)).encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}.pickle")
+
+    def _load(self, key):
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self._cache_path(key), "rb") as fileobj:
+                return pickle.load(fileobj)
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None  # Truncated or from an incompatible version: re-extract.
+
+    def _store(self, key, entries):
+        if self.cache_dir is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+                "wb", dir=self.cache_dir, suffix=".tmp", delete=False) as out:
+            pickle.dump(entries, out, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(out.name, self._cache_path(key))
+
+    def clear(self):
+        self._digests.clear()
+        self._entries.clear()
@@ -0,0 +1,24 @@
+from aussie_bean_tools import extract_cache
+from aussie_bean_tools.stgeorge import StGeorgeImporter
+
+
+class _MyImporter(StGeorgeImporter):
+    """An importer subclassed in someone's own config."""
+
+
+def test_code_version_covers_base_classes_and_helpers():
+    names = {module.__name__ for module in extract_cache._dependencies(_MyImporter)}
+    assert {
+        __name__,
+        "aussie_bean_tools.stgeorge",
+        "aussie_bean_tools.dedup",
+        "aussie_bean_tools.extract_cache",
+    } <= names
+
+
+def test_code_version_is_computed_once_per_class(monkeypatch):
+    version = extract_cache.code_version(_MyImporter)
+    monkeypatch.setattr(extract_cache, "_sha256", lambda path: "edited")
+    assert extract_cache.code_version(_MyImporter) == version
+    assert extract_cache.code_version(_MyImporter) != extract_cache.code_version.__wrapped__(
+        _MyImporter)
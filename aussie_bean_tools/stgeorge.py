@@ -1,8 +1,15 @@
+import collections
 import csv
 import decimal
+import functools
+import glob
+import heapq
+import itertools
+import logging
+import operator
+import os
 import re
-from dataclasses import dataclass
-from datetime import date, datetime, timedelta
+from datetime import date, timedelta
 
 import beancount
 import beangulp
@@ -11,17 +18,41 @@ from beancount.core.data import EMPTY_SET, Balance, Posting, Transaction, new_me
 from beangulp import cache
 
 from .dedup import exact_amount_comparator
+from .extract_cache import ExtractMemo, code_version
 
 CURRENCY = "AUD"
 
+CENT = decimal.Decimal("0.01")
+
+# Noted, while extracting, on a transaction whose Balance, plus the next
+# newer row's amount, is not the next newer row's Balance: the net amount of
+# the missing rows, and the file:line of that newer row. Only kept with the
+# memoized entries: _warn_balance_gaps() logs them and takes them out of the
+# entries it returns, so they never reach the ledger.
+BALANCE_GAP = "balance_gap"
+BALANCE_GAP_BEFORE = "balance_gap_before"
+
+log = logging.getLogger(__name__)
+
+
+FIELDNAMES = ("Date", "Description", "Debit", "Credit", "Balance")
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_date(value):
+    """Parse a "dd/mm/yyyy" date; memoized, since every day has several rows."""
+    day, month, year = value.split("/")
+    return date(int(year), int(month), int(day))
+
 
-@dataclass
 class StGeorgeTransaction:
     """Parse a CSV row from StGeorge.
 
     Presents an object.
     """
-    TIME_FORMAT = [
+    # Descriptions starting with these (in the first 30 characters) are
+    # looked up in a frozenset: one hash per row instead of a list scan.
+    TIME_FORMAT = frozenset({
         "Osko Withdrawal",
         "Osko Deposit",
         "Internet Withdrawal",
@@ -31,52 +62,228 @@ class StGeorgeTransaction:
         "Atm Withdrawal",
         "Atm Withdrawal -Wbc",
         "Tfr Wdl BPAY Internet",
-    ]
-    LOCATION_FORMAT = [
+    })
+    LOCATION_FORMAT = frozenset({
         "Visa Purchase",
         "Visa Purchase O/Seas",
         "Visa Cash Advance",
         "Visa Credit",
-    ]
+    })
+
+    # No per-instance __dict__: a multi-year export is a lot of rows.
+    __slots__ = (
+        "_fields", "date", "raw", "credit", "debit", "balance", "effective_date",
+        "effective_time", "location", "narration", "payee", "lineno",
+    )
 
     def __init__(self, row: dict):
-        self._row = row
-        self.date = datetime.strptime(row["Date"], "%d/%m/%Y").date()
-        self.raw = row["Description"].strip()
-        self.credit = decimal.Decimal(row["Credit"]) if len(row["Credit"]) else None
-        self.debit = decimal.Decimal(row["Debit"]) if len(row["Debit"]) else None
-        self.balance = row["Balance"] if len(row["Balance"]) else None
+        self._parse(tuple(row[name] for name in FIELDNAMES))
+
+    @classmethod
+    def from_fields(cls, fields: tuple):
+        """Make a transaction from the (Date, Description, Debit, Credit, Balance) values."""
+        trans = cls.__new__(cls)
+        trans._parse(fields)
+        return trans
+
+    def _parse(self, fields):
+        date_, description, debit, credit, balance = fields
+        # Keep only the values (for __str__), not the csv row dict.
+        self._fields = fields
+        self.date = _parse_date(date_)
+        self.raw = description.strip()
+        self.credit = decimal.Decimal(credit) if credit else None
+        self.debit = decimal.Decimal(debit) if debit else None
+        self.balance = balance if balance else None
         self.effective_date = None
         self.effective_time = None
         self.location = None
-        self.narration = self.raw.strip()
+        self.narration = self.raw
         self.payee = None
+        self.lineno = None  # In the file; set by csv_reader().
 
-        if self.raw[:30].strip() in self.TIME_FORMAT:
+        prefix = self.raw[:30].strip()
+        if prefix in self.TIME_FORMAT:
             # These descriptions include the time, but not location.
             # eg: "Internet Withdrawal           15Jan05:44 Night Church"
-            self.narration = self.raw[:30].strip()
+            self.narration = prefix
             self.effective_date = self.raw[30:35].strip()
             self.effective_time = self.raw[35:40].strip()
             self.payee = " ".join(self.raw[41:].split())
 
-        elif self.raw[:30].strip() in self.LOCATION_FORMAT:
+        elif prefix in self.LOCATION_FORMAT:
             # These descriptions include the location, but not the time.
             # eg: "Visa Purchase                 12Jan David Jones Limited  Artarmon"
-            self.narration = self.raw[:30].strip()
+            self.narration = prefix
             self.effective_date = self.raw[30:35].strip()
             self.payee = self.raw[36:56].strip()
             self.location = self.raw[57:].strip() or None
 
-
     def __str__(self):
-        return ",".join(self._row.values())
+        return ",".join(self._fields)
+
+    def key(self):
+        """The row's (Date, Description, Debit, Credit, Balance) values, as given."""
+        return self._fields
 
     @staticmethod
     def csv_reader(file):
-        with open(file.name, "r") as fileobj:
-            for row in csv.DictReader(fileobj):
-                yield StGeorgeTransaction(row)
+        """Yield a StGeorgeTransaction for each row of the CSV, a row at a time."""
+        with open(file.name, "r", newline="") as fileobj:
+            reader = csv.reader(fileobj)
+            header = next(reader, None)
+            if header is None:
+                return
+            # Columns by name, as DictReader did, without a dict per row.
+            columns = operator.itemgetter(*(header.index(name) for name in FIELDNAMES))
+            width = len(header)
+            for values in reader:
+                if not values:
+                    continue  # DictReader skips blank lines too.
+                if len(values) < width:
+                    values += [""] * (width - len(values))
+                trans = StGeorgeTransaction.from_fields(columns(values))
+                trans.lineno = reader.line_num
+                yield trans
+
+
+def _warn_balance_gaps(entries):
+    """Log each transaction that extract() found a running balance gap after.
+
+    The entries must be the memo's copies: their gap metadata is removed.
+    """
+    for entry in entries:
+        gap = entry.meta.pop(BALANCE_GAP, None)
+        before = entry.meta.pop(BALANCE_GAP_BEFORE, None)
+        if gap is not None:
+            log.warning(
+                "%s:%d: running balance is out by %s %s before %s; rows are missing",
+                entry.meta["filename"], entry.meta["lineno"], gap, CURRENCY, before)
+    return entries
+
+
+def _numbered_rows(filepath):
+    """Yield (filepath, line number, StGeorgeTransaction) for each row of the CSV."""
+    for row in StGeorgeTransaction.csv_reader(cache.get_file(filepath)):
+        yield filepath, row.lineno, row
+
+
+def _days(index, rows):
+    """Yield (date, index, [rows of that date]) for each day of one export."""
+    for day, group in itertools.groupby(rows, key=lambda item: item[2].date):
+        yield day, index, list(group)
+
+
+def _position(row):
+    """The row's (balance before, balance after); or None without a Balance."""
+    if not row.balance:
+        return None
+    after = decimal.Decimal(row.balance)
+    change = row.credit if row.credit else -(row.debit or 0)
+    return after - change, after
+
+
+def _identity(row):
+    """What makes two exports' rows the same transaction.
+
+    Its place in the running balance, where there is one: two identical
+    purchases on one day leave different balances. Otherwise its values.
+    """
+    return _position(row) or row.key()
+
+
+def _chain(items, closing=None):
+    """Order one day's (filepath, lineno, row) newest first by running balance.
+
+    The rows are the steps of a walk from the day's opening balance to its
+    closing one, each from its balance before to its Balance. The walk is
+    traced back from the closing balance: the newer day's opening balance,
+    if known, else the balance more rows end at than start from (or, when a
+    purchase and its refund make the day a loop, the first row's). Tracing
+    uses every row, so a refund back to an earlier balance is placed where
+    it fits. A day with a gap is traced in pieces, newest first, and a row
+    without a Balance keeps the day in its given order.
+    """
+    positions = [_position(row) for _, _, row in items]
+    if None in positions:
+        return items
+    remaining = list(range(len(items)))
+    newest_first = []
+    while remaining:
+        afters = collections.Counter(positions[i][1] for i in remaining)
+        surplus = afters - collections.Counter(positions[i][0] for i in remaining)
+        if closing in afters:
+            end = closing
+        else:
+            end = next((positions[i][1] for i in remaining if surplus[positions[i][1]]),
+                       positions[remaining[0]][1])
+        closing = None
+        # Hierholzer's algorithm, backwards from the end. The rows into
+        # each balance are taken in the order given, which is newest first.
+        into = collections.defaultdict(list)
+        for i in reversed(remaining):
+            into[positions[i][1]].append(i)
+        stack = [(end, None)]
+        trail = []
+        while stack:
+            balance, step = stack[-1]
+            if into[balance]:
+                i = into[balance].pop()
+                stack.append((positions[i][0], i))
+            else:
+                stack.pop()
+                if step is not None:
+                    trail.append(step)
+        trail.reverse()
+        newest_first.extend(trail)
+        taken = set(trail)
+        remaining = [i for i in remaining if i not in taken]
+    return [items[i] for i in newest_first]
+
+
+def merge_rows(filepaths):
+    """Merge several St George exports of one account, dropping the overlaps.
+
+    Each export lists its rows newest first, so they are merged by date in a
+    single streaming pass, holding one day's rows at a time. A row is an
+    overlap if another export has one in the same place in the running
+    balance (see _identity()): so two genuinely separate, identical
+    purchases on one day are both kept, as they leave different balances.
+    Each day's rows are then put in the order their balances chain in,
+    ending at the opening balance of the newer day before it.
+
+    Yields:
+        (filepath, line number, StGeorgeTransaction), newest first.
+    """
+    days = heapq.merge(
+        *(_days(index, _numbered_rows(filepath)) for index, filepath in enumerate(filepaths)),
+        key=lambda day: day[0], reverse=True)
+    opening = None  # Of the newer day: this day's closing balance.
+    for _, same_day in itertools.groupby(days, key=lambda day: day[0]):
+        groups = [rows for _, _, rows in same_day]
+        # The rows of the export with the most that day come first, so they
+        # are the ones kept (and, where the balances don't say, in its order).
+        groups.sort(key=len, reverse=True)
+        kept = []
+        counts = collections.Counter()
+        for rows in groups:
+            seen = collections.Counter()
+            for item in rows:
+                identity = _identity(item[2])
+                seen[identity] += 1
+                if seen[identity] > counts[identity]:
+                    counts[identity] += 1
+                    kept.append(item)
+        chained = _chain(kept, opening)
+        position = _position(chained[-1][2])
+        opening = position[0] if position else None
+        yield from chained
+
+
+def _share(entries, filepath):
+    """The entries made from filepath's rows (of a merged extraction, say)."""
+    path = os.path.abspath(filepath)
+    return [entry for entry in entries if os.path.abspath(entry.meta["filename"]) == path]
 
 
 class StGeorgeImporter(beangulp.Importer):
@@ -91,14 +298,24 @@ class StGeorgeImporter(beangulp.Importer):
     # comparison is per-importer, so it must be set here too.
     cmp = staticmethod(exact_amount_comparator)
 
-    def __init__(self, account_name, tags=EMPTY_SET):
+    def __init__(self, account_name, tags=EMPTY_SET, cache_dir=None, merge=None):
         """
         Args:
             account_name: beancount account name for the upbank account.
                 eg:  "Assets:Bank:StGeorge:Freedom"
+            cache_dir: directory to keep extracted entries in between runs, so
+                unchanged files are not parsed again; or None.
+            merge: glob of this account's exports, eg: "~/Downloads/joint-*.csv".
+                If given, only those files are identified, and they are
+                extracted together, overlaps removed, as one set of entries;
+                each file returns its own share of them.
         """
         self.account_name = account_name
         self.tags = tags
+        self.merge = merge
+        # Entries already extracted, per file, for date() and repeat calls.
+        self._memo = ExtractMemo(cache_dir, config=(
+            type(self).__name__, account_name, sorted(tags), code_version(type(self))))
 
     @property
     def name(self):
@@ -118,8 +335,15 @@ class StGeorgeImporter(beangulp.Importer):
           A boolean, true if this importer can handle this file.
         """
         file = cache.get_file(filepath)
+        if self.merge is not None and os.path.abspath(filepath) not in self._merge_group():
+            return False
         return re.match("Date,Description,Debit,Credit,Balance", file.head())
 
+    def _merge_group(self):
+        """The absolute paths of the exports to merge, in name order."""
+        return sorted(os.path.abspath(path)
+                      for path in glob.glob(os.path.expanduser(self.merge)))
+
     def extract(self, filepath, existing_entries=None):
         """Extract transactions from a file.
 
@@ -133,18 +357,53 @@ class StGeorgeImporter(beangulp.Importer):
           A list of new, imported directives (usually mostly Transactions)
           extracted from the file.
         """
-        file = cache.get_file(filepath)
+        group = self._group_of(filepath)
+        if group is not None:
+            return _share(self.extract_merged(group), filepath)
+        return _warn_balance_gaps(self._memo.get(filepath, self._extract))
+
+    def _group_of(self, filepath):
+        """The merge group filepath is extracted with; or None if it is alone."""
+        if self.merge is None:
+            return None
+        group = self._merge_group()
+        return group if os.path.abspath(filepath) in group else None
+
+    def extract_merged(self, filepaths, existing_entries=None):
+        """Extract one account's transactions from several, overlapping, exports.
+
+        The files are merged in a single pass by merge_rows(), so each row is
+        parsed once and the overlaps never reach duplicate detection.
+
+        Args:
+          filepaths: St George CSV exports of this importer's account.
+          existing_entries: as for extract().
+        Returns:
+          A list of directives, as extract() returns for a single file.
+        """
+        return _warn_balance_gaps(self._memo.get_merged(list(filepaths), self._extract_merged))
+
+    def _extract_merged(self, filepaths):
+        return self._entries(merge_rows(filepaths))
+
+    def _extract(self, filepath):
+        return self._entries(_numbered_rows(filepath))
+
+    def _entries(self, rows):
+        """Build the directives from (filename, lineno, StGeorgeTransaction), newest first."""
         date_of_last = None
         first_row = None
+        newer = None  # (filename, lineno, row, value) of the row before, a newer one.
         entries = []
-        for lineno, row in enumerate(StGeorgeTransaction.csv_reader(file)):
+        for filename, lineno, row in rows:
             if first_row is None:
                 first_row = row
+                first_filename = filename
 
             # Declare the balance at the start of a new month.
             if date_of_last and date_of_last.month != row.date.month:
                 balance = Balance(
-                    new_metadata(file.name, lineno + 2),
+                    new_metadata(filename, lineno),
                     date(date_of_last.year, date_of_last.month, 1),
                     self.account_name,
                     amount.Amount(number.D(row.balance), CURRENCY),
@@ -154,11 +413,10 @@ class StGeorgeImporter(beangulp.Importer):
                 entries.append(balance)
 
             # Post a transaction.
-            value = number.D(row.credit if row.credit else row.debit).quantize(
-                decimal.Decimal("0.01")
-            )
+            # A row may have no amount, eg: a notice of an interest rate change.
+            value = (row.credit or row.debit or number.ZERO).quantize(CENT)
             if row.debit:
-                value *= decimal.Decimal(-1)
+                value = -value
             posting = Posting(
                 self.account_name,
                 amount.Amount(value, CURRENCY),
@@ -167,8 +425,17 @@ class StGeorgeImporter(beangulp.Importer):
                 None,
                 None,
             )
+            meta = new_metadata(filename, lineno)
+            # Check the running balance as we go: this row's balance, plus the
+            # newer row's amount, must be the newer row's balance.
+            if newer is not None and row.balance and newer[2].balance:
+                gap = (number.D(newer[2].balance) - newer[3]) - number.D(row.balance)
+                if gap:
+                    meta[BALANCE_GAP] = gap
+                    meta[BALANCE_GAP_BEFORE] = f"{newer[0]}:{newer[1]}"
+            newer = (filename, lineno, row, value)
             txn_args = {
-                "meta": new_metadata(file.name, lineno + 2),
+                "meta": meta,
                 "date": row.date,
                 "flag": beancount.core.flags.FLAG_OKAY,
                 "tags": self.tags,
@@ -183,7 +450,7 @@ class StGeorgeImporter(beangulp.Importer):
 
         if first_row:
             entries.append(Balance(
-                new_metadata(file.name, 1),
+                new_metadata(first_filename, 1),
                 first_row.date + timedelta(days=1),
                 self.account_name,
                 amount.Amount(number.D(first_row.balance), CURRENCY),
@@ -237,5 +504,12 @@ class StGeorgeImporter(beangulp.Importer):
           (If no date is returned, the file creation time is used. This is the
           default.)
         """
-        # Date of last transaction in the file.
-        return self.extract(filepath)[-1].date
+        # Date of the file's last entry, from the memoized extraction: the
+        # merged one, if the file is merged, so both agree.
+        group = self._group_of(filepath)
+        if group is None:
+            entries = self._memo.get(filepath, self._extract)
+        else:
+            entries = self._memo.get_merged(group, self._extract_merged)
+        dates = [entry.date for entry in _share(entries, filepath)]
+        return max(dates) if dates else None
@@ -0,0 +1,145 @@
+"""Parsing benchmark for the St George importer.
+
+Writes a synthetic multi-year CSV export and times parsing it the way
+StGeorgeTransaction used to (csv.DictReader, strptime per row, list scans,
+the row dict kept alive) against StGeorgeTransaction.csv_reader(), and a
+full StGeorgeImporter.extract(), in rows/sec and peak memory.
+
+    python -m aussie_bean_tools.stgeorge_bench -n 10000 -n 200000
+"""
+import csv
+import datetime
+import decimal
+import os
+import tempfile
+import time
+import tracemalloc
+
+import click
+from beangulp import cache
+
+from .stgeorge import StGeorgeImporter, StGeorgeTransaction
+
+DESCRIPTIONS = [
+    "Visa Purchase                 12Jan David Jones Limited  Artarmon",
+    "Osko Deposit                  15Jan09:08 Ustacest Lile Malliak",
+    "Internet Withdrawal           15Jan05:44 Night Church",
+    "Eftpos Purchase               03Feb18:20 Woolworths 1234",
+    "Su Australia 1479342325",
+    "Interest Credit",
+]
+
+
+def write_csv(path, rows, latest=datetime.date(2026, 6, 30), per_day=4):
+    """Write a St George style export of rows transactions, newest first.
+
+    The Balance column runs consistently from the oldest row to the newest.
+    """
+    balance = decimal.Decimal("100000.00")
+    with open(path, "w", newline="") as fileobj:
+        writer = csv.writer(fileobj)
+        writer.writerow(["Date", "Description", "Debit", "Credit", "Balance"])
+        for index in range(rows):
+            date_ = latest - datetime.timedelta(days=index // per_day)
+            cents = decimal.Decimal((index * 7919) % 20000 + 1) / 100
+            debit = index % 3 != 0
+            writer.writerow([
+                date_.strftime("%d/%m/%Y"),
+                DESCRIPTIONS[index % len(DESCRIPTIONS)],
+                f"{cents:.2f}" if debit else "",
+                "" if debit else f"{cents:.2f}",
+                f"{balance:.2f}",
+            ])
+            # Working backwards: the balance before this row.
+            balance += cents if debit else -cents
+
+
+def _baseline(path):
+    """Parse the CSV as StGeorgeTransaction did before its fast path."""
+    time_format = list(StGeorgeTransaction.TIME_FORMAT)
+    location_format = list(StGeorgeTransaction.LOCATION_FORMAT)
+    rows = []
+    with open(path, "r") as fileobj:
+        for row in csv.DictReader(fileobj):
+            raw = row["Description"].strip()
+            parsed = {
+                "row": row,
+                "date": datetime.datetime.strptime(row["Date"], "%d/%m/%Y").date(),
+                "credit": decimal.Decimal(row["Credit"]) if len(row["Credit"]) else None,
+                "debit": decimal.Decimal(row["Debit"]) if len(row["Debit"]) else None,
+            }
+            if raw[:30].strip() in time_format or raw[:30].strip() in location_format:
+                parsed["narration"] = raw[:30].strip()
+            rows.append(parsed)
+    return rows
+
+
+def _fast(path):
+    return list(StGeorgeTransaction.csv_reader(cache.get_file(path)))
+
+
+def _extract(path):
+    return StGeorgeImporter("Assets:Bank:StGeorge:Bench").extract(path)
+
+
+PARSERS = {
+    "baseline": _baseline,
+    "fast": _fast,
+    "extract": _extract,
+}
+
+
+def run(path, parser, memory=False):
+    """Time one parser over path.
+
+    Returns:
+        dict of items, seconds, rows_per_sec and peak_bytes (or None).
+    """
+    with open(path) as fileobj:
+        rows = sum(1 for _ in fileobj) - 1
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        items = PARSERS[parser](path)
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if memory else None
+    finally:
+        if memory:
+            tracemalloc.stop()
+    return {
+        "items": len(items),
+        "seconds": seconds,
+        "rows_per_sec": rows / seconds if seconds else float("inf"),
+        "peak_bytes": peak,
+    }
+
+
+@click.command()
+@click.option("-n", "--rows", "sizes", type=int, multiple=True,
+              default=[10_000, 100_000], show_default=True,
+              help="Rows in the synthetic export. Repeatable.")
+@click.option("--parser", "parsers", type=click.Choice(list(PARSERS)), multiple=True,
+              default=list(PARSERS), show_default=True,
+              help="Parser to time. Repeatable.")
+@click.option("--memory/--no-memory", default=False, show_default=True,
+              help="Trace peak memory with tracemalloc (slower).")
+def cli(sizes, parsers, memory):
+    """Benchmark St George CSV parsing on synthetic exports."""
+    click.echo(f"{'rows':>9} {'parser':<9} {'items':>9} {'seconds':>8} "
+               f"{'rows/s':>10} {'peak MiB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, f"stgeorge-{size}.csv")
+            write_csv(path, size)
+            for parser in parsers:
+                result = run(path, parser, memory)
+                peak = ("-" if result["peak_bytes"] is None
+                        else f"{result['peak_bytes'] / 2 ** 20:.1f}")
+                click.echo(f"{size:>9} {parser:<9} {result['items']:>9} "
+                           f"{result['seconds']:>8.2f} {result['rows_per_sec']:>10.0f} "
+                           f"{peak:>9}")
+
+
+if __name__ == "__main__":
+    cli()
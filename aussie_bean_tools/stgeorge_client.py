@@ -4,11 +4,17 @@ Drives a browser (no public API) to export a date-ranged CSV per account.
 Contains no personal data: credentials and account identifiers are supplied
 by the caller via options / environment variables.
 """
+import asyncio
 import datetime
+import inspect
 import os
+import time
+import urllib.parse
 
 import click
 
+from . import stgeorge_daemon
+
 
 def _format_date(iso_date):
     """Convert a YYYY-MM-DD string to the d/mm/yyyy the St George form accepts.
@@ -53,6 +59,71 @@ def _filter_csv_to_range(csv_bytes, date_from, date_to):
     return ("\n".join(kept) + "\n").encode("utf-8")
 
 
+# Request headers not to replay: the APIRequestContext sets these itself.
+_UNREPLAYED_HEADERS = frozenset({"content-length", "cookie", "host"})
+
+
+def _text_forms(typed):
+    """The ways some text may appear in the export request: as typed, and URL-encoded."""
+    return [typed, urllib.parse.quote(typed, safe=""), urllib.parse.quote_plus(typed)]
+
+
+def _date_forms(iso_date):
+    return _text_forms(_format_date(iso_date))
+
+
+def _forms(date_from, date_to):
+    """Yield (text, "from" or "to", form number) for each form of the two dates."""
+    for name, iso_date in (("from", date_from), ("to", date_to)):
+        for form, text in enumerate(_date_forms(iso_date)):
+            yield text, name, form
+
+
+def _placeholder(name, form):
+    # NUL never appears in a URL or form body, so it can't clash.
+    return f"\0{name}{form}\0"
+
+
+def _export_template(method, url, headers, post_data, account, date_from, date_to):
+    """Make a replayable template of a recorded export request.
+
+    Each form of the two dates (see _date_forms()) is replaced by a
+    placeholder, so the request can be replayed for any range. If the dates
+    can't be told apart in it (they are the same, or do not appear at all),
+    None is returned.
+
+    None is returned too unless the request names the account. Otherwise
+    the account may be one the server remembers as "selected", and a replay
+    after another account's export would return that account's CSV.
+    """
+    if date_from == date_to:
+        return None
+    parts = [url, post_data or ""]
+    if not any(text in part for text in _text_forms(account) for part in parts):
+        return None
+    found = False
+    # Longest first, so "1/05/2026" is not found inside "11/05/2026".
+    for text, name, form in sorted(_forms(date_from, date_to), key=lambda f: -len(f[0])):
+        if any(text in part for part in parts):
+            parts = [part.replace(text, _placeholder(name, form)) for part in parts]
+            found = True
+    if not found:
+        return None
+    headers = {key: value for key, value in headers.items()
+               if key.lower() not in _UNREPLAYED_HEADERS and not key.startswith(":")}
+    return {"method": method, "url": parts[0], "headers": headers,
+            "post_data": parts[1] if post_data is not None else None}
+
+
+def _fill_template(template, date_from, date_to):
+    """Return (url, post data) of the recorded export request for another range."""
+    parts = [template["url"], template["post_data"]]
+    for text, name, form in _forms(date_from, date_to):
+        parts = [part if part is None else part.replace(_placeholder(name, form), text)
+                 for part in parts]
+    return parts[0], parts[1]
+
+
 def resolve_password(password):
     """Return the internet password, prompting with hidden input if absent.
 
@@ -70,13 +141,86 @@ def _default_profile_dir():
 
 ACCOUNTS_URL = "https://ibanking.stgeorge.com.au/ibank/viewAccountPortfolio.html"
 
+# The first line of an exported CSV.
+CSV_HEADER = b"Date,Description,Debit,Credit,Balance"
 
-class StGeorgeClient:
-    """Playwright driver for the St George internet-banking site."""
+# Resource types the flow never needs: nothing is clicked on an image, and
+# text is found by role and name, not by how it looks in a web font.
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "media", "font"})
+
+# Domains (and their subdomains) requests may go to; anything else, such as
+# analytics and marketing tags, is aborted.
+ALLOWED_DOMAINS = ("stgeorge.com.au",)
+
+
+def _is_blocked(resource_type, url, allowed_domains=ALLOWED_DOMAINS):
+    """True if a request is not needed to log in and export."""
+    if resource_type == "document":
+        return False  # Pages themselves, including the export download.
+    if resource_type in BLOCKED_RESOURCE_TYPES:
+        return True
+    host = urllib.parse.urlsplit(url).hostname or ""
+    return not any(host == domain or host.endswith("." + domain)
+                   for domain in allowed_domains)
+
+
+class LoadStats:
+    """What the browser loaded (and was stopped from loading) while measuring."""
+
+    def __init__(self):
+        self.finished = []  # Requests that completed, not yet sized.
+        self.reset()
+
+    def reset(self):
+        self.requests = 0  # Requests that completed, and were sized.
+        self.bytes = 0  # Headers and bodies received for them.
+        self.blocked = 0
+
+    def finish(self, request):
+        """Note a finished request; the client sizes it in load_summary()."""
+        self.finished.append(request)
+
+    def add(self, sizes):
+        """Count one finished request, given its Request.sizes()."""
+        self.requests += 1
+        self.bytes += (max(sizes["responseHeadersSize"], 0)
+                       + max(sizes["responseBodySize"], 0))
+
+    def summary(self):
+        """Return (requests, bytes received, requests blocked) since the last reset."""
+        return self.requests, self.bytes, self.blocked
+
+
+def _call(fn, *args, **kwargs):
+    """A flow step: call fn, a bound method of a sync or async Playwright object."""
+    return ("call", fn, args, kwargs)
+
+
+def _expect(expect, action):
+    """A flow step: run the action step inside expect(), eg: page.expect_popup.
+
+    The step's result is the value expect() waited for.
+    """
+    return ("expect", expect, action)
+
+
+class _BaseStGeorgeClient:
+    """What the sync and async clients share: settings, and the site's flows.
+
+    A flow is a generator that yields each browser action as a step (see
+    _call() and _expect()), is sent the step's result back, and returns the
+    flow's result; an action that raises is thrown back in. It does no I/O
+    itself, so the same locators and steps drive Playwright's sync API, in
+    StGeorgeClient, and its async API, in AsyncStGeorgeClient.
+    """
 
     def __init__(self, access_number, security_number, password,
                  profile_dir, headed=True, remote_debugging_port=None,
-                 slow_mo_ms=None):
+                 slow_mo_ms=None, block=False, allowed_domains=ALLOWED_DOMAINS):
+        """
+        block: abort requests the flow doesn't need (see _is_blocked()).
+        allowed_domains: domains requests may go to when blocking.
+        """
         self.access_number = access_number
         self.security_number = security_number
         self.password = password
@@ -84,17 +228,21 @@ class StGeorgeClient:
         self.headed = headed
         self.remote_debugging_port = remote_debugging_port
         self.slow_mo_ms = slow_mo_ms
+        self.block = block
+        self.allowed_domains = tuple(allowed_domains)
+        self.stats = LoadStats()
         self._playwright = None
         self._context = None
         self._page = None
+        # Account -> template of its recorded export request, for replaying.
+        self._exports = {}
 
     # Seconds to wait for the post-login accounts page. Generous so the user can
     # complete a 2FA challenge by hand on the first run with a fresh profile.
     LOGIN_TIMEOUT_MS = 180_000
 
-    def __enter__(self):
-        from playwright.sync_api import sync_playwright
-        self._playwright = sync_playwright().start()
+    def _launch_kwargs(self):
+        """Keyword arguments for chromium.launch_persistent_context()."""
         kwargs = dict(
             user_data_dir=self.profile_dir,
             headless=not self.headed,
@@ -105,17 +253,7 @@ class StGeorgeClient:
                 f"--remote-debugging-port={self.remote_debugging_port}"]
         if self.slow_mo_ms is not None:
             kwargs["slow_mo"] = self.slow_mo_ms
-        self._context = self._playwright.chromium.launch_persistent_context(
-            **kwargs)
-        self._page = (self._context.pages[0]
-                      if self._context.pages else self._context.new_page())
-        return self
-
-    def __exit__(self, *exc):
-        if self._context:
-            self._context.close()
-        if self._playwright:
-            self._playwright.stop()
+        return kwargs
 
     @classmethod
     def attached(cls, page):
@@ -127,31 +265,225 @@ class StGeorgeClient:
         """
         self = cls.__new__(cls)
         self._page = page
+        self._exports = {}
+        self.stats = LoadStats()
         return self
 
-    def login(self):
+    def _login_flow(self):
         """Navigate home -> Internet Banking popup -> submit credentials.
 
         The login form opens in a popup window, which becomes the working page
         for the rest of the session. The home-page link must be used to reach
         the login form (arriving at the login URL directly is rejected).
+        Logging in again after the bank closed that popup starts in a new tab.
         """
         page = self._page
-        page.goto("https://www.stgeorge.com.au/")
-        page.get_by_role("button", name="Logon. Hit enter to open").click()
-        with page.expect_popup() as popup_info:
-            page.get_by_role("link", name="Internet Banking").click()
-        bank = popup_info.value
-        bank.get_by_role("textbox", name="Enter your Card or Access").fill(
-            self.access_number)
-        bank.get_by_role("textbox", name="Enter your Security number").fill(
-            self.security_number)
-        bank.get_by_role("textbox", name="Enter your Internet Banking").fill(
-            self.password)
-        bank.get_by_role("button", name="Logon").click()
+        if page.is_closed():
+            page = yield _call(self._context.new_page)
+        yield _call(page.goto, "https://www.stgeorge.com.au/")
+        yield _call(page.get_by_role("button", name="Logon. Hit enter to open").click)
+        bank = yield _expect(page.expect_popup, _call(
+            page.get_by_role("link", name="Internet Banking").click))
+        yield _call(bank.get_by_role("textbox", name="Enter your Card or Access").fill,
+                    self.access_number)
+        yield _call(bank.get_by_role("textbox", name="Enter your Security number").fill,
+                    self.security_number)
+        yield _call(bank.get_by_role("textbox", name="Enter your Internet Banking").fill,
+                    self.password)
+        yield _call(bank.get_by_role("button", name="Logon").click)
         # The banking popup is where account selection and export happen.
         self._page = bank
 
+    def _open_flow(self):
+        """Route requests through the blocklist, and pick the page to drive."""
+        if self.block:
+            yield _call(self._context.route, "**/*", self._route)
+        if self._context.pages:
+            self._page = self._context.pages[0]
+        else:
+            self._page = yield _call(self._context.new_page)
+
+    def _route_flow(self, route):
+        request = route.request
+        if _is_blocked(request.resource_type, request.url, self.allowed_domains):
+            self.stats.blocked += 1
+            yield _call(route.abort)
+        else:
+            yield _call(route.continue_)
+
+    def measure(self):
+        """Start recording what the browser loads, in self.stats; see load_summary()."""
+        # Only noted here: the sync API can't wait on the browser (for
+        # Request.sizes()) inside an event handler.
+        self._context.on("requestfinished", self.stats.finish)
+        return self.stats
+
+    def _size_finished_flow(self):
+        """Add the requests finished so far to self.stats.
+
+        Run it before closing a page: a closed page's requests can't be sized,
+        and are left out.
+        """
+        from playwright.sync_api import Error  # The async API's Error too.
+        finished, self.stats.finished = self.stats.finished, []
+        for request in finished:
+            try:
+                sizes = yield _call(request.sizes)
+            except Error:
+                continue
+            self.stats.add(sizes)
+
+    def _load_summary_flow(self):
+        """Return stats.summary() since the last one, after sizing what finished."""
+        yield from self._size_finished_flow()
+        summary = self.stats.summary()
+        self.stats.reset()
+        return summary
+
+    def _is_logged_in_flow(self):
+        """Reload the account list; True if the session is still alive.
+
+        The bank sends an expired session away from the account list (to the
+        logon or timeout page), or closes the banking popup.
+        """
+        from playwright.sync_api import Error  # The async API's Error too.
+        try:
+            yield _call(self._page.goto, ACCOUNTS_URL)
+        except Error:
+            return False
+        return self._page.url.split("?", 1)[0] == ACCOUNTS_URL
+
+    def _download_flow(self, page, account, date_from, date_to):
+        """Open an account, set the date range, and return the exported CSV bytes.
+
+        The first export of each account is driven through the site, and the
+        HTTP request behind "Export Transaction History" is recorded. Later
+        exports of that account, for any range, replay the request directly
+        with the session's cookies, returning the CSV from one request.
+        """
+        raw = yield from self._replay_export_flow(page, account, date_from, date_to)
+        if raw is None:
+            raw = yield from self._ui_export_flow(page, account, date_from, date_to)
+        # The site falls back to recent rows when the range is empty; enforce
+        # the requested window so we never import out-of-range duplicates.
+        return _filter_csv_to_range(raw, date_from, date_to)
+
+    def _replay_export_flow(self, page, account, date_from, date_to):
+        """Return the CSV bytes by replaying the account's export request; or None."""
+        template = self._exports.get(account)
+        if template is None:
+            return None
+        from playwright.sync_api import Error  # The async API's Error too.
+        url, post_data = _fill_template(template, date_from, date_to)
+        try:
+            response = yield _call(
+                page.request.fetch, url, method=template["method"],
+                headers=template["headers"], data=post_data)
+            raw = yield _call(response.body)
+        except Error:
+            response = raw = None
+        if response is None or not response.ok or not raw.lstrip().startswith(CSV_HEADER):
+            # Not (or no longer) replayable, eg: a per-page token expired.
+            del self._exports[account]
+            return None
+        return raw
+
+    def _ui_export_flow(self, page, account, date_from, date_to):
+        """Export through the site's pages, recording the export request."""
+        # Wait (long) for the accounts page so a 2FA challenge can be completed
+        # by hand, then open the requested account.
+        yield _call(page.get_by_role("link", name=account).click,
+                    timeout=self.LOGIN_TIMEOUT_MS)
+        yield _call(page.get_by_role("link", name="Select a date range").click)
+        for name, iso_date in (("From:", date_from), ("To:", date_to)):
+            box = page.get_by_role("textbox", name=name)
+            yield _call(box.click)
+            yield _call(box.fill, _format_date(iso_date))
+            yield _call(box.press, "Tab")
+
+        yield _call(page.get_by_role("button", name="Search").click)
+        sent = []
+        record = sent.append
+        page.on("request", record)
+        try:
+            download = yield _expect(page.expect_download, _call(
+                page.get_by_role("link", name="Export Transaction History").click))
+        finally:
+            page.remove_listener("request", record)
+        path = yield _call(download.path)
+        with open(path, "rb") as fh:
+            raw = fh.read()
+        for request in reversed(sent):
+            if request.url == download.url:
+                template = _export_template(
+                    request.method, request.url, request.headers, request.post_data,
+                    account, date_from, date_to)
+                if template is not None:
+                    self._exports[account] = template
+                break
+        if page is self._page:
+            # Return to the account list so a second download() call in the
+            # same session (a different account) starts from where
+            # get_by_role("link", name=account) above expects to be. (A tab
+            # of its own is simply closed.)
+            yield _call(page.goto, ACCOUNTS_URL)
+        return raw
+
+
+class StGeorgeClient(_BaseStGeorgeClient):
+    """Playwright driver for the St George internet-banking site."""
+
+    def __enter__(self):
+        from playwright.sync_api import sync_playwright
+        self._playwright = sync_playwright().start()
+        self._context = self._playwright.chromium.launch_persistent_context(
+            **self._launch_kwargs())
+        self._run(self._open_flow())
+        return self
+
+    def _route(self, route):
+        self._run(self._route_flow(route))
+
+    def load_summary(self):
+        """Return (requests, bytes, blocked) since the last call; see measure()."""
+        return self._run(self._load_summary_flow())
+
+    def __exit__(self, *exc):
+        if self._context:
+            self._context.close()
+        if self._playwright:
+            self._playwright.stop()
+
+    def _run(self, flow):
+        """Run a flow (see _BaseStGeorgeClient) on the sync API; return its result."""
+        send, value = flow.send, None
+        while True:
+            try:
+                step = send(value)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                send, value = flow.send, self._step(step)
+            except Exception as exc:
+                send, value = flow.throw, exc
+
+    def _step(self, step):
+        if step[0] == "expect":
+            _, expect, action = step
+            with expect() as info:
+                self._step(action)
+            return info.value
+        _, fn, args, kwargs = step
+        return fn(*args, **kwargs)
+
+    def login(self):
+        """Log in; see _login_flow()."""
+        self._run(self._login_flow())
+
+    def is_logged_in(self):
+        """Reload the account list; True if the session is still alive."""
+        return self._run(self._is_logged_in_flow())
+
     def download(self, account, date_from, date_to):
         """Open an account, set the date range, and return the exported CSV bytes.
 
@@ -159,36 +491,124 @@ class StGeorgeClient:
             account: site-visible account name. Matched as a case-insensitive
                 substring, so "Incentive Saver" finds "Incentive Saver 486 ...".
             date_from, date_to: YYYY-MM-DD strings.
+
+        See _download_flow() for how the first and later exports differ.
         """
-        page = self._page
-        # Wait (long) for the accounts page so a 2FA challenge can be completed
-        # by hand, then open the requested account.
-        page.get_by_role("link", name=account).click(timeout=self.LOGIN_TIMEOUT_MS)
-        page.get_by_role("link", name="Select a date range").click()
-
-        from_box = page.get_by_role("textbox", name="From:")
-        from_box.click()
-        from_box.fill(_format_date(date_from))
-        from_box.press("Tab")
-
-        to_box = page.get_by_role("textbox", name="To:")
-        to_box.click()
-        to_box.fill(_format_date(date_to))
-        to_box.press("Tab")
-
-        page.get_by_role("button", name="Search").click()
-        with page.expect_download() as dl_info:
-            page.get_by_role("link", name="Export Transaction History").click()
-        download = dl_info.value
-        with open(download.path(), "rb") as fh:
-            raw = fh.read()
-        # Return to the account list so a second download() call in the same
-        # session (a different account) starts from where get_by_role("link",
-        # name=account) above expects to be.
-        page.goto(ACCOUNTS_URL)
-        # The site falls back to recent rows when the range is empty; enforce
-        # the requested window so we never import out-of-range duplicates.
-        return _filter_csv_to_range(raw, date_from, date_to)
+        return self._run(self._download_flow(self._page, account, date_from, date_to))
+
+
+class AsyncStGeorgeClient(_BaseStGeorgeClient):
+    """StGeorgeClient on Playwright's async API, to export accounts in parallel.
+
+    After one login, each export runs in its own tab of the same persistent
+    context, so the tabs share the logged-in session's cookies. Use it with
+    `async with`, and await login() and download_many().
+
+    The tabs share one session on the bank's side too, which may remember
+    the account last opened (see _export_template()). Until the site is
+    known not to, tabs only load the account list at the same time: opening
+    an account and exporting it is done by one tab at a time, so a tab can't
+    export an account another tab opened.
+    """
+
+    # Tabs open at the same time, unless told otherwise.
+    CONCURRENCY = 3
+
+    async def __aenter__(self):
+        from playwright.async_api import async_playwright
+        self._playwright = await async_playwright().start()
+        self._context = await self._playwright.chromium.launch_persistent_context(
+            **self._launch_kwargs())
+        await self._run(self._open_flow())
+        return self
+
+    async def _route(self, route):
+        await self._run(self._route_flow(route))
+
+    async def load_summary(self):
+        """Return (requests, bytes, blocked) since the last call; see measure()."""
+        return await self._run(self._load_summary_flow())
+
+    async def __aexit__(self, *exc):
+        if self._context:
+            await self._context.close()
+        if self._playwright:
+            await self._playwright.stop()
+
+    async def _run(self, flow):
+        """Run a flow (see _BaseStGeorgeClient) on the async API; return its result."""
+        send, value = flow.send, None
+        while True:
+            try:
+                step = send(value)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                send, value = flow.send, await self._step(step)
+            except Exception as exc:
+                send, value = flow.throw, exc
+
+    async def _step(self, step):
+        if step[0] == "expect":
+            _, expect, action = step
+            async with expect() as info:
+                await self._step(action)
+            return await info.value
+        _, fn, args, kwargs = step
+        result = fn(*args, **kwargs)
+        # Locator.click() and the like are coroutines here; a few calls aren't.
+        return await result if inspect.isawaitable(result) else result
+
+    async def login(self):
+        """As StGeorgeClient.login()."""
+        await self._run(self._login_flow())
+
+    async def is_logged_in(self):
+        """As StGeorgeClient.is_logged_in()."""
+        return await self._run(self._is_logged_in_flow())
+
+    async def download(self, account, date_from, date_to, page=None):
+        """As StGeorgeClient.download(), in the given tab (default: the main one)."""
+        return await self._run(
+            self._download_flow(page or self._page, account, date_from, date_to))
+
+    async def download_many(self, requests, concurrency=CONCURRENCY, on_done=None):
+        """Export several accounts at once, each in a new tab.
+
+        Args:
+            requests: (account, date_from, date_to) tuples, as for download().
+            concurrency: the most tabs open at the same time.
+            on_done: called with (index in requests, csv bytes) as each
+                export finishes, eg: to write it out straight away.
+        Returns:
+            The CSV bytes of each request, in order.
+        """
+        if not requests:
+            return []
+        # Let the login (and any 2FA) land on the accounts page before the
+        # tabs go looking for it.
+        await self._page.get_by_role("link", name=requests[0][0]).wait_for(
+            timeout=self.LOGIN_TIMEOUT_MS)
+        semaphore = asyncio.Semaphore(concurrency)
+        selecting = asyncio.Lock()  # See the class docstring.
+
+        async def export(index, request):
+            async with semaphore:
+                page = await self._context.new_page()
+                try:
+                    await page.goto(ACCOUNTS_URL)
+                    async with selecting:
+                        csv_bytes = await self.download(*request, page=page)
+                    # While the tab is still open; see _size_finished_flow().
+                    await self._run(self._size_finished_flow())
+                finally:
+                    await page.close()
+            if on_done is not None:
+                on_done(index, csv_bytes)
+            return csv_bytes
+
+        return await asyncio.gather(
+            *(export(index, request) for index, request in enumerate(requests)))
 
 
 @click.group()
@@ -206,9 +626,16 @@ class StGeorgeClient:
 @click.option("--slow-mo", "slow_mo_ms", type=int, default=None,
               help="Milliseconds to pause after each browser action "
                    "(e.g. 500), so the scripted flow is watchable.")
+@click.option("--block/--no-block", default=False, show_default=True,
+              help="Stop the browser loading images, fonts, media and other "
+                   "domains' scripts. Untried against the live login and 2FA, "
+                   "and it turns off the browser's HTTP cache: see --measure.")
+@click.option("--allow-domain", "allowed_domains", multiple=True,
+              help="Also let the browser load from this domain when blocking. "
+                   "Repeatable.")
 @click.pass_context
 def cli(ctx, access_number, security_number, password, profile_dir, headed,
-        slow_mo_ms):
+        slow_mo_ms, block, allowed_domains):
     ctx.obj = {
         "access_number": access_number,
         "security_number": security_number,
@@ -216,6 +643,8 @@ def cli(ctx, access_number, security_number, password, profile_dir, headed,
         "profile_dir": profile_dir,
         "headed": headed,
         "slow_mo_ms": slow_mo_ms,
+        "block": block,
+        "allowed_domains": ALLOWED_DOMAINS + allowed_domains,
     }
 
 
@@ -243,7 +672,8 @@ def download(ctx, account, date_from, date_to, output):
     cfg = ctx.obj
     with StGeorgeClient(cfg["access_number"], cfg["security_number"],
                         cfg["password"], cfg["profile_dir"], cfg["headed"],
-                        slow_mo_ms=cfg["slow_mo_ms"]) as client:
+                        slow_mo_ms=cfg["slow_mo_ms"], block=cfg["block"],
+                        allowed_domains=cfg["allowed_domains"]) as client:
         client.login()
         csv_bytes = client.download(account, date_from, date_to)
     if output:
@@ -263,8 +693,15 @@ def download(ctx, account, date_from, date_to, output):
 @click.option("--output", "outputs", required=True, multiple=True,
               type=click.Path(dir_okay=False),
               help="Write CSV here. Repeatable, one per --account.")
+@click.option("--parallel", type=click.IntRange(min=1), default=1, show_default=True,
+              help="Use up to this many browser tabs of the one logged-in "
+                   "session, which take turns to export.")
+@click.option("--measure", is_flag=True,
+              help="Run the batch with blocking and again without, reporting "
+                   "the time, requests and bytes of each step, and what "
+                   "blocking saved, on stderr.")
 @click.pass_context
-def download_batch(ctx, accounts, date_froms, date_tos, outputs):
+def download_batch(ctx, accounts, date_froms, date_tos, outputs, parallel, measure):
     """Download date-ranged CSVs for multiple accounts in a single login.
 
     --account/--from/--to/--output are each repeatable and paired up by
@@ -273,25 +710,112 @@ def download_batch(ctx, accounts, date_froms, date_tos, outputs):
         stgeorge download-batch \\
             --account "Complete Freedom" --from 2026-07-01 --to 2026-07-31 --output joint.csv \\
             --account "Incentive Saver" --from 2026-06-01 --to 2026-07-31 --output saver.csv
+
+    With --parallel N, up to N tabs load the account list at the same time,
+    taking turns to open an account and export it, and each CSV is written
+    as soon as its export finishes.
+
+    With --measure, the batch runs twice, with and without blocking, to
+    report what blocking saves.
     """
     if len({len(accounts), len(date_froms), len(date_tos), len(outputs)}) != 1:
         raise click.UsageError(
             "--account, --from, --to, and --output must each be given the "
             "same number of times")
     cfg = ctx.obj
+    requests = list(zip(accounts, date_froms, date_tos))
+    if not measure:
+        _download_batch(cfg, requests, outputs, parallel)
+        return
+    # Playwright turns the HTTP cache off while it routes requests, so the
+    # blocking pass loads even the bank's own scripts afresh, while the other
+    # may take them from the profile's cache: each pass runs as it would for
+    # real, and blocking can come out slower.
+    totals = {}
+    for block in (True, False):
+        meter = _Meter("blocking" if block else "not blocking")
+        _download_batch(dict(cfg, block=block), requests, outputs, parallel, meter)
+        totals[block] = meter.total()
+    _Meter.compare(totals[False], totals[True])
+
+
+def _download_batch(cfg, requests, outputs, parallel, meter=None):
+    """Download each (account, from, to) request to its output; one login."""
+    if parallel > 1:
+        asyncio.run(_download_parallel(cfg, requests, outputs, parallel, meter))
+        return
     with StGeorgeClient(cfg["access_number"], cfg["security_number"],
                         cfg["password"], cfg["profile_dir"], cfg["headed"],
-                        slow_mo_ms=cfg["slow_mo_ms"]) as client:
+                        slow_mo_ms=cfg["slow_mo_ms"], block=cfg["block"],
+                        allowed_domains=cfg["allowed_domains"]) as client:
+        if meter:
+            client.measure()
         client.login()
-        for account, date_from, date_to, output in zip(
-                accounts, date_froms, date_tos, outputs):
+        if meter:
+            meter.report("login", client.load_summary())
+        for (account, date_from, date_to), output in zip(requests, outputs):
             csv_bytes = client.download(account, date_from, date_to)
+            if meter:
+                meter.report(account, client.load_summary())
             _write_csv(csv_bytes, output)
 
 
+async def _download_parallel(cfg, requests, outputs, parallel, meter=None):
+    async with AsyncStGeorgeClient(
+            cfg["access_number"], cfg["security_number"], cfg["password"],
+            cfg["profile_dir"], cfg["headed"], slow_mo_ms=cfg["slow_mo_ms"],
+            block=cfg["block"], allowed_domains=cfg["allowed_domains"]) as client:
+        if meter:
+            client.measure()
+        await client.login()
+        if meter:
+            meter.report("login", await client.load_summary())
+        # The tabs overlap, so only the batch as a whole is measured.
+        await client.download_many(
+            requests, concurrency=parallel,
+            on_done=lambda index, csv_bytes: _write_csv(csv_bytes, outputs[index]))
+        if meter:
+            meter.report(f"{len(requests)} accounts", await client.load_summary())
+
+
+class _Meter:
+    """Times each step of one --measure'd pass, and reports it on stderr."""
+
+    def __init__(self, label):
+        self.label = label
+        self.start = self.step = time.perf_counter()
+        self.totals = [0, 0, 0]
+
+    def report(self, step, counts):
+        """Report a step, given the client's load_summary() for it."""
+        now = time.perf_counter()
+        self.totals = [total + count for total, count in zip(self.totals, counts)]
+        self._echo(f"{self.label}: {step}", now - self.step, *counts)
+        self.step = now
+
+    def total(self):
+        """Report the whole pass; return (seconds, requests, bytes, blocked)."""
+        seconds = time.perf_counter() - self.start
+        self._echo(f"{self.label}: total", seconds, *self.totals)
+        return (seconds, *self.totals)
+
+    @staticmethod
+    def compare(unblocked, blocked):
+        """Report what blocking saved, given each pass's total()."""
+        seconds = unblocked[0] - blocked[0]
+        received = unblocked[2] - blocked[2]
+        share = f" ({received / unblocked[2]:.0%})" if unblocked[2] else ""
+        click.echo(f"blocking saved: {seconds:.1f}s, "
+                   f"{received / 1024:.0f} KiB{share}", err=True)
+
+    @staticmethod
+    def _echo(label, seconds, requests, received, blocked):
+        click.echo(f"{label}: {seconds:.1f}s, {requests} requests, "
+                   f"{received / 1024:.0f} KiB, {blocked} blocked", err=True)
+
+
 def _wait_forever():
     """Block until Ctrl+C, keeping the browser process alive."""
-    import time
     try:
         while True:
             time.sleep(3600)
@@ -299,6 +823,35 @@ def _wait_forever():
         pass
 
 
+@cli.command()
+@click.option("--socket", "socket_path", default=stgeorge_daemon.default_socket_path,
+              show_default=True,
+              help="Unix socket to accept download requests on, in a directory "
+                   "only you can use (created if missing).")
+@click.option("--keepalive", type=click.IntRange(min=1), default=stgeorge_daemon.KEEPALIVE,
+              show_default=True,
+              help="Seconds between keep-alive reloads of the account list while idle.")
+@click.pass_context
+def serve(ctx, socket_path, keepalive):
+    """Log in once and serve download requests over a local socket.
+
+    The session is kept warm while idle, and logged in again only if the bank
+    ends it. Send requests with
+    `python -m aussie_bean_tools.stgeorge_daemon --account ... --output ...`.
+    Press Ctrl+C to stop.
+    """
+    cfg = ctx.obj
+    with StGeorgeClient(cfg["access_number"], cfg["security_number"],
+                        cfg["password"], cfg["profile_dir"], cfg["headed"],
+                        slow_mo_ms=cfg["slow_mo_ms"], block=cfg["block"],
+                        allowed_domains=cfg["allowed_domains"]) as client:
+        daemon = stgeorge_daemon.DownloadDaemon(client, socket_path, keepalive)
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
 @cli.command("debug-session")
 @click.option("--port", default=9222, show_default=True,
               help="Chrome remote debugging port, for connect_over_cdp().")
@@ -315,7 +868,8 @@ def debug_session(ctx, port):
     with StGeorgeClient(cfg["access_number"], cfg["security_number"],
                         cfg["password"], cfg["profile_dir"], cfg["headed"],
                         remote_debugging_port=port,
-                        slow_mo_ms=cfg["slow_mo_ms"]) as client:
+                        slow_mo_ms=cfg["slow_mo_ms"], block=cfg["block"],
+                        allowed_domains=cfg["allowed_domains"]) as client:
         client.login()
         click.echo(f"Logged in. Connect via http://localhost:{port}", err=True)
         click.echo(
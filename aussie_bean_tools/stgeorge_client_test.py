@@ -1,3 +1,6 @@
+import asyncio
+import urllib.parse
+
 import click
 from click.testing import CliRunner
 
@@ -72,6 +75,14 @@ def test_attached_wraps_existing_page_without_init():
 class _FakeContext:
     def __init__(self):
         self.pages = []
+        self.routes = []
+        self.listeners = {}
+
+    def route(self, url, handler):
+        self.routes.append((url, handler))
+
+    def on(self, event, listener):
+        self.listeners[event] = listener
 
     def new_page(self):
         return object()
@@ -86,7 +97,8 @@ class _FakeChromium:
 
     def launch_persistent_context(self, **kwargs):
         self.launch_calls.append(kwargs)
-        return _FakeContext()
+        self.context = _FakeContext()
+        return self.context
 
 
 class _FakePlaywright:
@@ -146,16 +158,26 @@ class _FakeClient:
 
     def __init__(self, access_number, security_number, password,
                  profile_dir, headed, remote_debugging_port=None,
-                 slow_mo_ms=None):
+                 slow_mo_ms=None, block=False,
+                 allowed_domains=stgeorge_client.ALLOWED_DOMAINS):
         self.kwargs = dict(
             access_number=access_number, security_number=security_number,
             password=password, profile_dir=profile_dir, headed=headed,
             remote_debugging_port=remote_debugging_port,
-            slow_mo_ms=slow_mo_ms)
+            slow_mo_ms=slow_mo_ms, block=block, allowed_domains=allowed_domains)
         self.login_count = 0
         self.download_calls = []
+        self.stats = stgeorge_client.LoadStats()
         _FakeClient.instances.append(self)
 
+    def measure(self):
+        return self.stats
+
+    def load_summary(self):
+        summary = self.stats.summary()
+        self.stats.reset()
+        return summary
+
     def __enter__(self):
         return self
 
@@ -167,9 +189,79 @@ class _FakeClient:
 
     def download(self, account, date_from, date_to):
         self.download_calls.append((account, date_from, date_to))
+        # What the export page loads, as seen by measure(): with blocking,
+        # one request and three blocked; without, all four.
+        for _ in range(1 if self.kwargs["block"] else 4):
+            self.stats.add({"responseHeadersSize": 512, "responseBodySize": 1536})
+        if self.kwargs["block"]:
+            self.stats.blocked += 3
         return b"Date,Description,Debit,Credit,Balance\n"
 
 
+def test_is_blocked_keeps_pages_and_drops_what_the_flow_never_uses():
+    bank = "https://ibanking.stgeorge.com.au/ibank/"
+    assert not stgeorge_client._is_blocked("document", bank + "loginPage.action")
+    assert not stgeorge_client._is_blocked("script", bank + "app.js")
+    assert not stgeorge_client._is_blocked("stylesheet", "https://www.stgeorge.com.au/a.css")
+    assert stgeorge_client._is_blocked("image", bank + "logo.png")
+    assert stgeorge_client._is_blocked("font", bank + "brand.woff2")
+    assert stgeorge_client._is_blocked("script", "https://www.googletagmanager.com/gtm.js")
+    # Only whole labels match: not a lookalike domain.
+    assert stgeorge_client._is_blocked("script", "https://evilstgeorge.com.au/x.js")
+    assert not stgeorge_client._is_blocked(
+        "script", "https://cdn.example.net/x.js", ("stgeorge.com.au", "example.net"))
+
+
+class _FakeRoute:
+    def __init__(self, resource_type, url):
+        self.request = type("Request", (), {"resource_type": resource_type, "url": url})()
+        self.outcome = None
+
+    def abort(self):
+        self.outcome = "aborted"
+
+    def continue_(self):
+        self.outcome = "continued"
+
+
+def test_enter_routes_requests_through_the_blocklist(monkeypatch, tmp_path):
+    fake_pw = _patch_sync_playwright(monkeypatch)
+    with stgeorge_client.StGeorgeClient("a", "s", "p", str(tmp_path), block=True) as client:
+        [(pattern, handler)] = fake_pw.chromium.context.routes
+        assert pattern == "**/*"
+        logo = _FakeRoute("image", "https://ibanking.stgeorge.com.au/logo.png")
+        page = _FakeRoute("document", "https://ibanking.stgeorge.com.au/")
+        handler(logo)
+        handler(page)
+    assert (logo.outcome, page.outcome) == ("aborted", "continued")
+    assert client.stats.summary() == (0, 0, 1)
+
+
+def test_enter_without_blocking_installs_no_route(monkeypatch, tmp_path):
+    fake_pw = _patch_sync_playwright(monkeypatch)
+    with stgeorge_client.StGeorgeClient("a", "s", "p", str(tmp_path)):
+        pass
+    assert fake_pw.chromium.context.routes == []
+
+
+def test_block_options_passed_through_to_client(monkeypatch):
+    _FakeClient.instances.clear()
+    monkeypatch.setattr(stgeorge_client, "StGeorgeClient", _FakeClient)
+    env = {"STGEORGE_ACCESS_NUMBER": "a", "STGEORGE_SECURITY_NUMBER": "s",
+           "STGEORGE_PASSWORD": "p"}
+    download = ["download", "--account", "x", "--from", "2026-01-01", "--to", "2026-01-02"]
+
+    result = CliRunner().invoke(stgeorge_client.cli, download, env=env)
+    assert result.exit_code == 0, result.output
+    result = CliRunner().invoke(
+        stgeorge_client.cli, ["--block", "--allow-domain", "example.net"] + download, env=env)
+    assert result.exit_code == 0, result.output
+    default, blocking = (client.kwargs for client in _FakeClient.instances)
+    assert default["block"] is False  # Until tried against the live site.
+    assert blocking["block"] is True
+    assert blocking["allowed_domains"] == ("stgeorge.com.au", "example.net")
+
+
 def test_debug_session_logs_in_and_passes_port(monkeypatch):
     _FakeClient.instances.clear()
     monkeypatch.setattr(stgeorge_client, "StGeorgeClient", _FakeClient)
@@ -267,6 +359,53 @@ def test_download_batch_logs_in_once_for_multiple_accounts(monkeypatch, tmp_path
     assert saver_out.exists()
 
 
+def test_download_batch_measure_reports_each_step(monkeypatch, tmp_path):
+    _FakeClient.instances.clear()
+    monkeypatch.setattr(stgeorge_client, "StGeorgeClient", _FakeClient)
+
+    result = CliRunner().invoke(
+        stgeorge_client.cli,
+        ["download-batch", "--measure",
+         "--account", "Complete Freedom", "--from", "2026-01-01",
+         "--to", "2026-01-31", "--output", str(tmp_path / "joint.csv"),
+         "--account", "Incentive Saver", "--from", "2026-02-01",
+         "--to", "2026-02-28", "--output", str(tmp_path / "saver.csv")],
+        env={"STGEORGE_ACCESS_NUMBER": "a", "STGEORGE_SECURITY_NUMBER": "s",
+             "STGEORGE_PASSWORD": "p"},
+    )
+    assert result.exit_code == 0, result.stderr
+    assert [client.kwargs["block"] for client in _FakeClient.instances] == [True, False]
+    lines = [line for line in result.stderr.splitlines() if not line.startswith("Wrote")]
+    assert [line.rsplit(":", 1)[0] for line in lines] == [
+        "blocking: login", "blocking: Complete Freedom", "blocking: Incentive Saver",
+        "blocking: total",
+        "not blocking: login", "not blocking: Complete Freedom",
+        "not blocking: Incentive Saver", "not blocking: total",
+        "blocking saved"]
+    assert lines[0].endswith("0 requests, 0 KiB, 0 blocked")
+    assert lines[1].endswith("1 requests, 2 KiB, 3 blocked")
+    assert lines[3].endswith("2 requests, 4 KiB, 6 blocked")
+    assert lines[7].endswith("8 requests, 16 KiB, 0 blocked")
+    assert lines[8].endswith("s, 12 KiB (75%)")
+
+
+def test_measure_sizes_requests_after_they_finish(monkeypatch, tmp_path):
+    fake_pw = _patch_sync_playwright(monkeypatch)
+    sized = []
+
+    class Request:
+        def sizes(self):
+            sized.append(self)
+            return {"responseHeadersSize": 100, "responseBodySize": -1}
+    with stgeorge_client.StGeorgeClient("a", "s", "p", str(tmp_path)) as client:
+        client.measure()
+        fake_pw.chromium.context.listeners["requestfinished"](Request())
+        fake_pw.chromium.context.listeners["requestfinished"](Request())
+        assert sized == []
+        assert client.load_summary() == (2, 200, 0)
+        assert client.load_summary() == (0, 0, 0)
+
+
 def test_cli_download_requires_access_number():
     runner = CliRunner()
     result = runner.invoke(
@@ -275,3 +414,409 @@ def test_cli_download_requires_access_number():
         env={"STGEORGE_ACCESS_NUMBER": "", "STGEORGE_SECURITY_NUMBER": ""},
     )
     assert result.exit_code != 0
+
+
+class _FakeAsyncPage:
+    def __init__(self, context=None):
+        self.context = context
+        self.visited = []
+
+    def get_by_role(self, role, name):
+        async def wait_for(timeout):
+            pass
+        return type("Locator", (), {"wait_for": staticmethod(wait_for)})()
+
+    async def goto(self, url):
+        self.visited.append(url)
+
+    closed = False
+
+    async def close(self):
+        self.closed = True
+        self.context.open_tabs -= 1
+
+
+class _FakeAsyncContext:
+    def __init__(self):
+        self.open_tabs = 0
+        self.most_tabs = 0
+
+    async def new_page(self):
+        self.open_tabs += 1
+        self.most_tabs = max(self.most_tabs, self.open_tabs)
+        return _FakeAsyncPage(self)
+
+
+class _TabbedClient(stgeorge_client.AsyncStGeorgeClient):
+    exporting = most_exporting = 0
+
+    async def download(self, account, date_from, date_to, page=None):
+        assert page.visited == [stgeorge_client.ACCOUNTS_URL]
+        self.exporting += 1
+        self.most_exporting = max(self.most_exporting, self.exporting)
+        # The saver is slowest, so it finishes last.
+        await asyncio.sleep(0.05 if account == "Incentive Saver" else 0.01)
+        self.exporting -= 1
+        return account.encode()
+
+
+class _TabRequest:
+    """A finished request, which can only be sized while its tab is open."""
+
+    def __init__(self, page):
+        self.page = page
+
+    async def sizes(self):
+        from playwright.async_api import Error
+        if self.page.closed:
+            raise Error("Target page, context or browser has been closed")
+        return {"responseHeadersSize": 100, "responseBodySize": 924}
+
+
+class _MeasuredTabbedClient(stgeorge_client.AsyncStGeorgeClient):
+    async def download(self, account, date_from, date_to, page=None):
+        self.stats.finish(_TabRequest(page))
+        await asyncio.sleep(0.01)
+        return account.encode()
+
+
+def test_download_many_sizes_requests_before_closing_their_tabs():
+    client = _MeasuredTabbedClient.attached(_FakeAsyncPage())
+    client._context = _FakeAsyncContext()
+    requests = [(f"Account {i}", "2026-01-01", "2026-01-31") for i in range(3)]
+    closed = _FakeAsyncPage(client._context)
+    closed.closed = True
+    client.stats.finish(_TabRequest(closed))  # Its tab closed first: left out.
+    asyncio.run(client.download_many(requests, concurrency=2))
+    assert asyncio.run(client.load_summary()) == (3, 3072, 0)
+
+
+def test_download_many_caps_tabs_and_reports_each_as_it_finishes():
+    client = _TabbedClient.attached(_FakeAsyncPage())
+    client._context = _FakeAsyncContext()
+    requests = [("Incentive Saver", "2026-01-01", "2026-01-31")] + [
+        (f"Account {i}", "2026-01-01", "2026-01-31") for i in range(4)]
+    finished = []
+    results = asyncio.run(client.download_many(
+        requests, concurrency=2, on_done=lambda i, csv: finished.append(i)))
+    assert results == [account.encode() for account, _, _ in requests]
+    assert client._context.most_tabs == 2
+    assert client._context.open_tabs == 0
+    # One tab at a time opens an account and exports it.
+    assert client.most_exporting == 1
+    assert finished == [0, 1, 2, 3, 4]
+
+
+class _ScriptPage:
+    """A sync or async Page that records each action of a flow in a shared log."""
+
+    def __init__(self, log, is_async, name="home"):
+        self.log, self.is_async, self.name = log, is_async, name
+        self.url = stgeorge_client.ACCOUNTS_URL
+
+    def is_closed(self):
+        return False
+
+    def _done(self, value=None):
+        if not self.is_async:
+            return value
+
+        async def done():
+            return value
+        return done()
+
+    def _act(self, *action):
+        self.log.append((self.name,) + action)
+        return self._done()
+
+    def goto(self, url):
+        return self._act("goto", url)
+
+    def get_by_role(self, role, name):
+        page = self
+        return type("Locator", (), {
+            "click": lambda _, **kw: page._act("click", name),
+            "fill": lambda _, value: page._act("fill", name, value),
+            "press": lambda _, key: page._act("press", name, key),
+        })()
+
+    def expect_popup(self):
+        popup = _ScriptPage(self.log, self.is_async, name="bank")
+        page = self
+
+        class Expect:
+            value = page._done(popup) if page.is_async else popup
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                pass
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                pass
+        return Expect()
+
+
+def test_sync_and_async_clients_share_one_login_flow():
+    sync_log, async_log = [], []
+    sync_client = stgeorge_client.StGeorgeClient("a", "s", "p", "/tmp/profile")
+    sync_client._page = _ScriptPage(sync_log, is_async=False)
+    sync_client.login()
+    async_client = stgeorge_client.AsyncStGeorgeClient("a", "s", "p", "/tmp/profile")
+    async_client._page = _ScriptPage(async_log, is_async=True)
+    asyncio.run(async_client.login())
+    assert sync_log == async_log
+    assert ("bank", "fill", "Enter your Internet Banking", "p") in sync_log
+    assert (sync_client._page.name, async_client._page.name) == ("bank", "bank")
+    assert asyncio.run(async_client.is_logged_in()) is True
+
+
+def test_login_after_the_banking_popup_closed_opens_a_new_tab():
+    log = []
+    closed = _ScriptPage(log, is_async=False, name="closed")
+    closed.is_closed = lambda: True
+    client = stgeorge_client.StGeorgeClient("a", "s", "p", "/tmp/profile")
+    client._page = closed
+    client._context = type("Context", (), {
+        "new_page": lambda _: _ScriptPage(log, is_async=False, name="new")})()
+    client.login()
+    assert log[0] == ("new", "goto", "https://www.stgeorge.com.au/")
+    assert not [action for action in log if action[0] == "closed"]
+    assert client._page.name == "bank"
+
+
+def test_async_client_has_no_sync_interface():
+    assert not issubclass(stgeorge_client.AsyncStGeorgeClient, stgeorge_client.StGeorgeClient)
+    assert not hasattr(stgeorge_client.AsyncStGeorgeClient, "__enter__")
+
+
+class _FakeAsyncClient(_FakeClient):
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def login(self):
+        self.login_count += 1
+
+    async def load_summary(self):
+        return _FakeClient.load_summary(self)
+
+    async def download_many(self, requests, concurrency, on_done):
+        self.concurrency = concurrency
+        for index, request in enumerate(requests):
+            self.download_calls.append(request)
+            on_done(index, b"Date,Description,Debit,Credit,Balance\n")
+
+
+def test_download_batch_parallel_uses_tabs_in_one_login(monkeypatch, tmp_path):
+    _FakeClient.instances.clear()
+    monkeypatch.setattr(stgeorge_client, "AsyncStGeorgeClient", _FakeAsyncClient)
+
+    outputs = [tmp_path / "joint.csv", tmp_path / "saver.csv"]
+    result = CliRunner().invoke(
+        stgeorge_client.cli,
+        ["download-batch", "--parallel", "2",
+         "--account", "Complete Freedom", "--from", "2026-01-01",
+         "--to", "2026-01-31", "--output", str(outputs[0]),
+         "--account", "Incentive Saver", "--from", "2026-02-01",
+         "--to", "2026-02-28", "--output", str(outputs[1])],
+        env={"STGEORGE_ACCESS_NUMBER": "a", "STGEORGE_SECURITY_NUMBER": "s",
+             "STGEORGE_PASSWORD": "p"},
+    )
+    assert result.exit_code == 0, result.output
+    client = _FakeClient.instances[0]
+    assert client.login_count == 1
+    assert client.concurrency == 2
+    assert len(client.download_calls) == 2
+    assert all(output.exists() for output in outputs)
+
+
+def test_serve_runs_the_daemon_until_interrupted(monkeypatch, tmp_path):
+    _FakeClient.instances.clear()
+    monkeypatch.setattr(stgeorge_client, "StGeorgeClient", _FakeClient)
+    daemons = []
+
+    class _FakeDaemon:
+        def __init__(self, client, socket_path, keepalive):
+            daemons.append((client, socket_path, keepalive))
+
+        def serve_forever(self):
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(stgeorge_client.stgeorge_daemon, "DownloadDaemon", _FakeDaemon)
+    socket_path = str(tmp_path / "s.sock")
+    result = CliRunner().invoke(
+        stgeorge_client.cli, ["serve", "--socket", socket_path, "--keepalive", "60"],
+        env={"STGEORGE_ACCESS_NUMBER": "a", "STGEORGE_SECURITY_NUMBER": "s",
+             "STGEORGE_PASSWORD": "p"},
+    )
+    assert result.exit_code == 0, result.output
+    assert daemons == [(_FakeClient.instances[0], socket_path, 60)]
+
+
+def test_export_template_replays_for_another_range():
+    template = stgeorge_client._export_template(
+        "POST", "https://ibanking.example/export?from=1%2F05%2F2026&to=11%2F05%2F2026",
+        {"Content-Type": "application/x-www-form-urlencoded", "Cookie": "x", ":path": "/"},
+        "fromDate=1%2F05%2F2026&toDate=11/05/2026&acct=Incentive+Saver",
+        "Incentive Saver", "2026-05-01", "2026-05-11")
+    assert template["headers"] == {"Content-Type": "application/x-www-form-urlencoded"}
+    url, post_data = stgeorge_client._fill_template(template, "2026-06-02", "2026-06-30")
+    assert url == "https://ibanking.example/export?from=2%2F06%2F2026&to=30%2F06%2F2026"
+    assert post_data == "fromDate=2%2F06%2F2026&toDate=30/06/2026&acct=Incentive+Saver"
+
+
+def test_export_template_needs_distinct_dates_in_the_request():
+    assert stgeorge_client._export_template(
+        "GET", "https://x/export?a=Saver", {}, None, "Saver", "2026-05-01", "2026-05-11") is None
+    assert stgeorge_client._export_template(
+        "GET", "https://x/export?a=Saver&d=1%2F05%2F2026", {}, None,
+        "Saver", "2026-05-01", "2026-05-01") is None
+
+
+def test_export_template_needs_the_account_in_the_request():
+    # Otherwise it may export whichever account the server has "selected".
+    assert stgeorge_client._export_template(
+        "GET", "https://x/export?from=1%2F05%2F2026&to=11%2F05%2F2026", {}, None,
+        "Incentive Saver", "2026-05-01", "2026-05-11") is None
+
+
+class _Response:
+    def __init__(self, body, ok=True):
+        self._body, self.ok = body, ok
+
+    def body(self):
+        return self._body
+
+
+class _Request:
+    def __init__(self, url, method="GET", post_data=None):
+        self.url, self.method, self.post_data, self.headers = url, method, post_data, {}
+
+
+class _UiPage:
+    """Just enough of a sync Page for download() through the site."""
+
+    EXPORT_URL = "https://ibanking.example/export?acct={}&from={}&to={}"
+
+    def __init__(self, tmp_path, replies=()):
+        self.tmp_path = tmp_path
+        self.clicks = []
+        self.fetches = []
+        self.replies = list(replies)
+        self.listeners = []
+        self.filled = []
+        page = self
+        self.request = type("APIRequest", (), {
+            "fetch": lambda _, url, **kw: page._fetch(url, kw)})()
+
+    def _fetch(self, url, kwargs):
+        self.fetches.append((url, kwargs))
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def get_by_role(self, role, name):
+        page = self
+
+        class Locator:
+            def click(self, timeout=None):
+                page.clicks.append(name)
+
+            def fill(self, value):
+                page.filled.append(value)
+
+            def press(self, key):
+                pass
+        return Locator()
+
+    def on(self, event, listener):
+        self.listeners.append(listener)
+
+    def remove_listener(self, event, listener):
+        self.listeners.remove(listener)
+
+    def goto(self, url):
+        pass
+
+    def expect_download(self):
+        page = self
+        path = self.tmp_path / "export.csv"
+        path.write_bytes(SAMPLE_CSV)
+        url = self.EXPORT_URL.format(*(urllib.parse.quote(d, safe="") for d in (
+            self.clicks[-5], *self.filled[-2:])))
+
+        class Download:
+            value = type("Download", (), {"url": url, "path": lambda _: str(path)})()
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                for listener in page.listeners:
+                    listener(_Request("https://ibanking.example/style.css"))
+                    listener(_Request(url))
+        return Download()
+
+
+def test_download_records_the_export_then_replays_it(tmp_path):
+    replayed = SAMPLE_CSV.replace(b"Red Energy", b"Replayed")
+    page = _UiPage(tmp_path, replies=[_Response(replayed), _Response(b"<html>", ok=False)])
+    client = stgeorge_client.StGeorgeClient.attached(page)
+
+    first = client.download("Incentive Saver", "2026-05-01", "2026-05-31")
+    assert b"Red Energy" in first
+    assert "Export Transaction History" in page.clicks
+    assert page.listeners == []
+
+    page.clicks.clear()
+    second = client.download("Incentive Saver", "2026-05-02", "2026-05-30")
+    assert b"Replayed" in second
+    assert page.clicks == []
+    assert page.fetches[0][0] == _UiPage.EXPORT_URL.format(
+        "Incentive%20Saver", "2%2F05%2F2026", "30%2F05%2F2026")
+
+    # A failed replay falls back to the site, and records afresh.
+    third = client.download("Incentive Saver", "2026-05-01", "2026-05-31")
+    assert b"Red Energy" in third
+    assert "Export Transaction History" in page.clicks
+    assert "Incentive Saver" in client._exports
+
+
+def test_replay_that_cannot_connect_falls_back_to_the_site(tmp_path):
+    from playwright.sync_api import Error
+    page = _UiPage(tmp_path, replies=[Error("net::ERR_CONNECTION_RESET")])
+    client = stgeorge_client.StGeorgeClient.attached(page)
+    client.download("Incentive Saver", "2026-05-01", "2026-05-31")
+
+    page.clicks.clear()
+    assert b"Red Energy" in client.download("Incentive Saver", "2026-05-02", "2026-05-30")
+    assert len(page.fetches) == 1
+    assert "Export Transaction History" in page.clicks
+
+
+def test_download_batch_parallel_measure_reports_the_batch(monkeypatch, tmp_path):
+    _FakeClient.instances.clear()
+    monkeypatch.setattr(stgeorge_client, "AsyncStGeorgeClient", _FakeAsyncClient)
+
+    result = CliRunner().invoke(
+        stgeorge_client.cli,
+        ["download-batch", "--parallel", "2", "--measure",
+         "--account", "Complete Freedom", "--from", "2026-01-01",
+         "--to", "2026-01-31", "--output", str(tmp_path / "joint.csv")],
+        env={"STGEORGE_ACCESS_NUMBER": "a", "STGEORGE_SECURITY_NUMBER": "s",
+             "STGEORGE_PASSWORD": "p"},
+    )
+    assert result.exit_code == 0, result.stderr
+    lines = [line for line in result.stderr.splitlines() if not line.startswith("Wrote")]
+    assert [line.rsplit(":", 1)[0] for line in lines] == [
+        "blocking: login", "blocking: 1 accounts", "blocking: total",
+        "not blocking: login", "not blocking: 1 accounts", "not blocking: total",
+        "blocking saved"]
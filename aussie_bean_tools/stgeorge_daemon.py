@@ -0,0 +1,250 @@
+"""Resident St George session, serving downloads over a local socket.
+
+`stgeorge serve` launches the browser and logs in once, then waits on a Unix
+socket for download requests, so a scheduled import pays for neither a
+Chromium launch nor the login flow. While idle it reloads the account list
+every so often to keep the session warm; it logs in again only if the bank
+has ended the session, as found by a keep-alive or a failed download.
+
+A request is one line of JSON, answered by one line of JSON:
+
+    {"account": "Incentive Saver", "from": "2026-06-01", "to": "2026-06-30",
+     "output": "/home/me/saver.csv"}
+    {"ok": true, "output": "/home/me/saver.csv", "rows": 12}
+
+Send one with request_download(), or from the shell:
+
+    python -m aussie_bean_tools.stgeorge_daemon --account "Incentive Saver" \\
+        --from 2026-06-01 --to 2026-06-30 --output saver.csv
+"""
+import json
+import os
+import socket
+import stat
+
+import click
+
+# Seconds between keep-alive reloads of the account list while idle.
+KEEPALIVE = 240
+
+# Seconds a client has to send its request line, so one that connects and
+# says nothing can't hold the daemon (and its keep-alives) up.
+REQUEST_TIMEOUT = 10
+
+
+def default_socket_path():
+    # In a directory of its own, which serve_forever() keeps private.
+    return os.path.join(click.get_app_dir("aussie-bean-tools"), "run", "stgeorge.sock")
+
+
+def _private_dir(directory):
+    """Create directory for only this user; or check an existing one is so.
+
+    An existing directory is never changed: it may be the current or home
+    directory, or /tmp.
+    """
+    try:
+        os.makedirs(directory, mode=0o700)
+    except FileExistsError:
+        pass
+    else:
+        os.chmod(directory, 0o700)  # makedirs()' mode is masked by the umask.
+        return
+    info = os.stat(directory)
+    if info.st_uid != os.getuid() or stat.S_IMODE(info.st_mode) & 0o077:
+        raise click.ClickException(
+            f"{directory} is open to other users; put the socket in a directory "
+            "only you can use (the default is one)")
+
+
+def _is_listening(socket_path):
+    """True if something accepts connections on socket_path."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            return False
+    return True
+
+
+def _count_rows(csv_bytes):
+    return max(0, len([line for line in csv_bytes.decode("utf-8").splitlines()
+                       if line.strip()]) - 1)
+
+
+class DownloadDaemon:
+    """Serves download requests from one logged-in StGeorgeClient.
+
+    Requests are handled one at a time on the calling thread, as Playwright's
+    sync API requires; keep-alives run between them.
+    """
+
+    def __init__(self, client, socket_path, keepalive=KEEPALIVE, echo=None):
+        """
+        client: a StGeorgeClient, entered but not necessarily logged in.
+        socket_path: Unix socket to listen on; a stale one is replaced.
+        keepalive: seconds idle between keep-alive reloads.
+        echo: function to report activity with; default click.echo to stderr.
+        """
+        self.client = client
+        self.socket_path = socket_path
+        self.keepalive = keepalive
+        self.echo = echo or (lambda message: click.echo(message, err=True))
+        self.logins = 0
+        self._running = False
+
+    def ensure_logged_in(self):
+        """Log in if the session is not (or no longer) alive.
+
+        Checking reloads the account list, so this is only done at start up
+        and on keep-alives; a download is simply tried (see _download()).
+        """
+        if self.logins == 0 or not self.client.is_logged_in():
+            if self.logins:
+                self.echo("Session expired; logging in again.")
+            self._login()
+
+    def _login(self):
+        self.client.login()
+        self.logins += 1
+
+    def _download(self, account, date_from, date_to):
+        """Download, logging in again and retrying once if the session has ended."""
+        try:
+            return self.client.download(account, date_from, date_to)
+        except Exception:
+            if self.client.is_logged_in():
+                raise  # Not the session: eg, no such account.
+        self.echo("Session expired; logging in again.")
+        self._login()
+        return self.client.download(account, date_from, date_to)
+
+    def handle(self, request):
+        """Run one request (a dict) and return the reply (a dict)."""
+        try:
+            account = request["account"]
+            date_from, date_to = request["from"], request["to"]
+            output = request["output"]
+        except (KeyError, TypeError) as exc:
+            return {"ok": False, "error": f"Bad request: missing {exc}"}
+        try:
+            if self.logins == 0:
+                self._login()
+            csv_bytes = self._download(account, date_from, date_to)
+            with open(output, "wb") as fh:
+                fh.write(csv_bytes)
+        except Exception as exc:  # Reported to the requester; the daemon carries on.
+            self.echo(f"{account}: {exc}")
+            return {"ok": False, "error": str(exc)}
+        rows = _count_rows(csv_bytes)
+        self.echo(f"Wrote {output} ({rows} transactions in range)")
+        return {"ok": True, "output": output, "rows": rows}
+
+    def serve_forever(self):
+        """Log in, then serve requests until stop() (or Ctrl+C)."""
+        # Anyone who can connect can download the statements.
+        _private_dir(os.path.dirname(self.socket_path) or ".")
+        if _is_listening(self.socket_path):
+            raise click.ClickException(
+                f"Another `stgeorge serve` is already listening on {self.socket_path}")
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # Left behind by one that didn't stop cleanly.
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            # Created 0600: never, even briefly, open to others.
+            umask = os.umask(0o177)
+            try:
+                server.bind(self.socket_path)
+            finally:
+                os.umask(umask)
+            server.listen()
+            server.settimeout(self.keepalive)
+            self.ensure_logged_in()
+            self.echo(f"Logged in. Serving downloads on {self.socket_path}")
+            self._running = True
+            while self._running:
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    if self._running:
+                        self._keep_alive()
+                    continue
+                with conn:
+                    self._serve(conn)
+        finally:
+            server.close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def _keep_alive(self):
+        """Reload the account list, logging in again if need be; never raises.
+
+        A failure (eg: the bank's site is down) is reported, and tried again
+        at the next keep-alive or request, rather than stopping the daemon.
+        """
+        try:
+            self.ensure_logged_in()
+        except Exception as exc:
+            self.echo(f"Keep-alive failed: {exc}")
+
+    def _serve(self, conn):
+        conn.settimeout(REQUEST_TIMEOUT)
+        with conn.makefile("rwb") as stream:
+            try:
+                line = stream.readline()
+            except socket.timeout:
+                self.echo("Dropped a connection that sent no request.")
+                return
+            if not line:
+                return  # Connected and hung up: another daemon checking for us.
+            try:
+                request = json.loads(line)
+            except ValueError:
+                reply = {"ok": False, "error": "Bad request: not JSON"}
+            else:
+                reply = self.handle(request)
+            stream.write(json.dumps(reply).encode() + b"\n")
+
+    def stop(self):
+        """Stop serving after the current request or keep-alive wait."""
+        self._running = False
+
+
+def request_download(account, date_from, date_to, output, socket_path=None):
+    """Ask a running `stgeorge serve` for a download, and wait for it.
+
+    Returns:
+        The daemon's reply, a dict with "ok", and "rows" or "error".
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.connect(socket_path or default_socket_path())
+        with conn.makefile("rwb") as stream:
+            stream.write(json.dumps({
+                "account": account, "from": date_from, "to": date_to,
+                "output": os.path.abspath(output),
+            }).encode() + b"\n")
+            stream.flush()
+            return json.loads(stream.readline())
+
+
+@click.command()
+@click.option("--account", required=True, help="Site-visible account identifier to export.")
+@click.option("--from", "date_from", required=True, help="From date, YYYY-MM-DD.")
+@click.option("--to", "date_to", required=True, help="To date, YYYY-MM-DD.")
+@click.option("--output", required=True, type=click.Path(dir_okay=False),
+              help="Write CSV here.")
+@click.option("--socket", "socket_path", default=default_socket_path, show_default=True,
+              help="Socket of the running `stgeorge serve`.")
+def cli(account, date_from, date_to, output, socket_path):
+    """Download a CSV through a running `stgeorge serve`."""
+    try:
+        reply = request_download(account, date_from, date_to, output, socket_path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        raise click.ClickException(f"No `stgeorge serve` listening on {socket_path}")
+    if not reply["ok"]:
+        raise click.ClickException(reply["error"])
+    click.echo(f"Wrote {reply['output']} ({reply['rows']} transactions in range)", err=True)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,187 @@
+import os
+import socket
+import stat
+import threading
+import time
+
+import click
+import pytest
+from click.testing import CliRunner
+
+from aussie_bean_tools import stgeorge_daemon
+
+CSV = b"Date,Description,Debit,Credit,Balance\n06/05/2026,Red Energy,261.76,,13125.60,\n"
+
+
+class _FakeClient:
+    def __init__(self):
+        self.logins = 0
+        self.checks = 0
+        self.expired = False
+        self.downloads = []
+
+    def login(self):
+        self.logins += 1
+        self.expired = False
+
+    def is_logged_in(self):
+        self.checks += 1
+        return not self.expired
+
+    def download(self, account, date_from, date_to):
+        if self.expired:
+            raise RuntimeError("Page closed")
+        if account == "Missing":
+            raise RuntimeError("No such account")
+        self.downloads.append((account, date_from, date_to))
+        return CSV
+
+
+def _start(client, socket_path, keepalive):
+    daemon = stgeorge_daemon.DownloadDaemon(
+        client, socket_path, keepalive=keepalive, echo=lambda message: None)
+    daemon.thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+    daemon.thread.start()
+    while not daemon._running:
+        time.sleep(0.01)
+    return daemon
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    daemon = _start(_FakeClient(), str(tmp_path / "run" / "stgeorge.sock"), keepalive=0.05)
+    yield daemon
+    daemon.stop()
+    daemon.thread.join(5)
+    assert not os.path.exists(daemon.socket_path)
+
+
+def test_serves_downloads_from_one_login(daemon, tmp_path):
+    assert stat.S_IMODE(os.stat(daemon.socket_path).st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(tmp_path / "run").st_mode) == 0o700
+    for name in ("joint", "saver"):
+        reply = stgeorge_daemon.request_download(
+            name, "2026-05-01", "2026-05-31", str(tmp_path / f"{name}.csv"),
+            daemon.socket_path)
+        assert reply == {"ok": True, "output": str(tmp_path / f"{name}.csv"), "rows": 1}
+        assert (tmp_path / f"{name}.csv").read_bytes() == CSV
+    assert daemon.client.logins == 1
+    assert daemon.client.downloads == [
+        ("joint", "2026-05-01", "2026-05-31"), ("saver", "2026-05-01", "2026-05-31")]
+
+
+def test_keeps_alive_and_logs_in_again_only_when_expired(daemon, tmp_path):
+    time.sleep(0.2)
+    assert daemon.client.checks >= 2  # Keep-alives while idle.
+    assert daemon.client.logins == 1
+    daemon.client.expired = True
+    reply = stgeorge_daemon.request_download(
+        "joint", "2026-05-01", "2026-05-31", str(tmp_path / "joint.csv"),
+        daemon.socket_path)
+    assert reply["ok"]
+    assert daemon.client.logins == 2
+
+
+def test_downloads_do_not_reload_the_account_list_first(tmp_path):
+    client = _FakeClient()
+    daemon = _start(client, str(tmp_path / "stgeorge.sock"), keepalive=1)
+    try:
+        checks = client.checks
+        for _ in range(3):
+            assert stgeorge_daemon.request_download(
+                "joint", "2026-05-01", "2026-05-31", str(tmp_path / "joint.csv"),
+                daemon.socket_path)["ok"]
+        assert client.checks == checks
+    finally:
+        daemon.stop()
+        daemon.thread.join(5)
+
+
+class _ClosingClient(_FakeClient):
+    """The bank closes the popup; until logged in again, everything fails."""
+
+    def is_logged_in(self):
+        if self.expired:
+            raise RuntimeError("Target page has been closed")
+        return super().is_logged_in()
+
+
+def test_keep_alive_failure_is_reported_and_daemon_carries_on(tmp_path):
+    client = _ClosingClient()
+    daemon = _start(client, str(tmp_path / "stgeorge.sock"), keepalive=0.05)
+    messages = []
+    daemon.echo = messages.append
+    try:
+        client.expired = True
+        time.sleep(0.2)
+        assert daemon._running and daemon.thread.is_alive()
+        assert any("Keep-alive failed" in message for message in messages)
+    finally:
+        daemon.stop()
+        daemon.thread.join(5)
+
+
+def test_refuses_to_take_over_a_running_daemons_socket(daemon, tmp_path):
+    second = stgeorge_daemon.DownloadDaemon(
+        _FakeClient(), daemon.socket_path, echo=lambda message: None)
+    with pytest.raises(click.ClickException, match="already listening"):
+        second.serve_forever()
+    assert second.client.logins == 0
+    assert os.path.exists(daemon.socket_path)
+
+
+def test_replaces_a_stale_socket(tmp_path):
+    run = tmp_path / "run"
+    run.mkdir(mode=0o700)
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(str(run / "stgeorge.sock"))
+    stale.close()  # Bound, never listening: what a killed daemon leaves.
+    daemon = _start(_FakeClient(), str(run / "stgeorge.sock"), keepalive=0.05)
+    daemon.stop()
+    daemon.thread.join(5)
+    assert not os.path.exists(run / "stgeorge.sock")
+
+
+def test_refuses_an_existing_directory_others_can_use(tmp_path):
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    os.chmod(shared, 0o755)
+    daemon = stgeorge_daemon.DownloadDaemon(
+        _FakeClient(), str(shared / "stgeorge.sock"), echo=lambda message: None)
+    with pytest.raises(click.ClickException, match="open to other users"):
+        daemon.serve_forever()
+    assert stat.S_IMODE(os.stat(shared).st_mode) == 0o755  # Left as it was.
+    assert daemon.client.logins == 0
+
+
+def test_a_silent_client_does_not_hold_the_daemon_up(monkeypatch, tmp_path):
+    monkeypatch.setattr(stgeorge_daemon, "REQUEST_TIMEOUT", 0.1)
+    daemon = _start(_FakeClient(), str(tmp_path / "stgeorge.sock"), keepalive=1)
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as silent:
+            silent.connect(daemon.socket_path)
+            assert stgeorge_daemon.request_download(
+                "joint", "2026-05-01", "2026-05-31", str(tmp_path / "joint.csv"),
+                daemon.socket_path)["ok"]
+    finally:
+        daemon.stop()
+        daemon.thread.join(5)
+
+
+def test_failed_download_is_reported_and_daemon_carries_on(daemon, tmp_path):
+    reply = stgeorge_daemon.request_download(
+        "Missing", "2026-05-01", "2026-05-31", str(tmp_path / "x.csv"), daemon.socket_path)
+    assert reply == {"ok": False, "error": "No such account"}
+    result = CliRunner().invoke(stgeorge_daemon.cli, [
+        "--account", "joint", "--from", "2026-05-01", "--to", "2026-05-31",
+        "--output", str(tmp_path / "joint.csv"), "--socket", daemon.socket_path])
+    assert result.exit_code == 0, result.output
+    assert "1 transactions in range" in result.output
+
+
+def test_cli_without_daemon_says_so(tmp_path):
+    result = CliRunner().invoke(stgeorge_daemon.cli, [
+        "--account", "joint", "--from", "2026-05-01", "--to", "2026-05-31",
+        "--output", str(tmp_path / "joint.csv"), "--socket", str(tmp_path / "none.sock")])
+    assert result.exit_code != 0
+    assert "No `stgeorge serve` listening" in result.output
@@ -7,11 +7,12 @@ the Playwright Inspector:
 
     PWDEBUG=1 python aussie_bean_tools/stgeorge_manual_download.py
 
-Re-run as many times as needed after editing download() in
-stgeorge_client.py -- login is never repeated, since this connects to the
-already-authenticated browser debug-session started. If download() left
-the tab on the export/download view, navigate back to the accounts page by
-hand before re-running.
+Re-run as many times as needed after editing the download flow
+(_download_flow() and the steps it calls) in stgeorge_client.py -- login
+is never repeated, since this connects to the already-authenticated
+browser debug-session started. If download() left the tab on the
+export/download view, navigate back to the accounts page by hand before
+re-running.
 """
 from playwright.sync_api import sync_playwright
 
@@ -5,7 +5,10 @@ from decimal import Decimal
 
 from beancount.core.data import Balance
 
-from .stgeorge import StGeorgeImporter, StGeorgeTransaction
+from beangulp import cache
+
+from . import stgeorge_bench
+from .stgeorge import StGeorgeImporter, StGeorgeTransaction, merge_rows
 
 HEADER = "Date,Description,Debit,Credit,Balance"
 FIELDNAMES = HEADER.split(",")
@@ -89,3 +92,184 @@ def test_final_balance_dated_day_after_most_recent_transaction():
     assert bal.date == datetime.date(2026, 5, 16)
     assert bal.amount.number == Decimal("250")
     assert bal.amount.currency == "AUD"
+
+
+def test_row_without_an_amount_posts_zero():
+    entries = _extract_from_csv(
+        "Date,Description,Debit,Credit,Balance\n"
+        "15/05/2026,Interest Rate Change,,,250\n"
+        "14/05/2026,Nil Credit,,0.00,250\n"
+    )
+    amounts = [e.postings[0].units.number for e in entries if not isinstance(e, Balance)]
+    assert amounts == [Decimal("0.00"), Decimal("0.00")]
+
+
+def test_extract_and_date_parse_the_file_once(tmp_path, monkeypatch):
+    path = tmp_path / "stgeorge.csv"
+    path.write_text(
+        "Date,Description,Debit,Credit,Balance\n"
+        "15/05/2026,May Purchase,100,,250\n"
+    )
+    parsed = []
+    real_reader = StGeorgeTransaction.csv_reader
+    monkeypatch.setattr(StGeorgeTransaction, "csv_reader", staticmethod(
+        lambda file: parsed.append(file.name) or real_reader(file)))
+    importer = StGeorgeImporter("Assets:Bank:Test")
+    entries = importer.extract(str(path))
+    assert importer.date(str(path)) == datetime.date(2026, 5, 16)
+    assert importer.extract(str(path)) == entries
+    assert len(parsed) == 1
+
+    # Rewritten in place: parsed again.
+    path.write_text(
+        "Date,Description,Debit,Credit,Balance\n"
+        "20/05/2026,Later Purchase,100,,150\n"
+        "15/05/2026,May Purchase,100,,250\n"
+    )
+    assert importer.date(str(path)) == datetime.date(2026, 5, 21)
+    assert len(parsed) == 2
+
+
+def test_csv_reader_keeps_values_not_row_dicts(tmp_path):
+    path = tmp_path / "stgeorge.csv"
+    path.write_text(
+        "Date,Description,Debit,Credit,Balance\n"
+        "15/05/2026,Visa Purchase                 12May David Jones Limited  Artarmon,10.5,,250,\n"
+        "\n"
+        "15/05/2026,Su Australia 1479342325,,2089.84\n"
+    )
+    visa, short = StGeorgeTransaction.csv_reader(cache.get_file(str(path)))
+    assert not hasattr(visa, "__dict__")
+    assert visa.payee == "David Jones Limited"
+    assert visa.debit == Decimal("10.5")
+    assert visa.date is short.date  # Parsed once.
+    assert short.balance is None
+    assert str(short) == "15/05/2026,Su Australia 1479342325,,2089.84,"
+
+
+def test_benchmark_parsers_agree(tmp_path):
+    path = str(tmp_path / "bench.csv")
+    stgeorge_bench.write_csv(path, 200)
+    results = {parser: stgeorge_bench.run(path, parser) for parser in stgeorge_bench.PARSERS}
+    assert results["baseline"]["items"] == results["fast"]["items"] == 200
+    rows = list(StGeorgeTransaction.csv_reader(cache.get_file(path)))
+    # The synthetic balance runs on from each row to the next newer one.
+    for older, newer in zip(rows[1:], rows):
+        change = newer.credit or -newer.debit
+        assert Decimal(older.balance) + change == Decimal(newer.balance)
+
+
+MERGE_ROWS = [
+    "20/05/2026,Coffee,5,,190",
+    "20/05/2026,Coffee,5,,195",  # Two coffees: same but for the balance.
+    "18/05/2026,Pay,,100,200",
+    "15/05/2026,May Purchase,100,,100",
+    "12/05/2026,Coffee,5,,200",
+    "10/05/2026,April Credit,,5,205",
+]
+
+
+def _write_rows(path, rows):
+    path.write_text(HEADER + "\n" + "".join(row + "\n" for row in rows))
+    return str(path)
+
+
+def test_merge_rows_drops_overlaps_but_not_repeats(tmp_path):
+    newer = _write_rows(tmp_path / "newer.csv", MERGE_ROWS[:4])
+    older = _write_rows(tmp_path / "older.csv", MERGE_ROWS[1:])
+    middle = _write_rows(tmp_path / "middle.csv", MERGE_ROWS[2:5])
+    merged = list(merge_rows([older, middle, newer]))
+    assert [str(row) for _, _, row in merged] == MERGE_ROWS
+    # Each day's rows come from the export with the most of them that day.
+    assert [(path, lineno) for path, lineno, _ in merged][:3] == [
+        (newer, 2), (newer, 3), (older, 3)]
+
+
+def test_merge_rows_orders_a_split_day_by_running_balance(tmp_path, caplog):
+    day = [
+        "20/05/2026,Lunch,15,,170",
+        "20/05/2026,Coffee,5,,185",
+        "20/05/2026,Coffee,5,,190",
+    ]
+    # The evening export has only lunch; the morning one, both coffees.
+    evening = _write_rows(tmp_path / "evening.csv", day[:1])
+    morning = _write_rows(tmp_path / "morning.csv", day[1:] + MERGE_ROWS[1:])
+    merged = list(merge_rows([morning, evening]))
+    assert [str(row) for _, _, row in merged] == day + MERGE_ROWS[1:]
+    StGeorgeImporter("Assets:Bank:Test").extract_merged([morning, evening])
+    assert caplog.text == ""
+
+
+def test_merge_rows_orders_a_refund_back_to_an_earlier_balance(tmp_path, caplog):
+    # The refund takes the balance back to 100, where the coffee starts from.
+    a = _write_rows(tmp_path / "a.csv", ["20/05/2026,Coffee,5,,95"])
+    b = _write_rows(tmp_path / "b.csv", [
+        "20/05/2026,Refund,,10,100",
+        "20/05/2026,Purchase,10,,90",
+        "19/05/2026,Pay,,100,100",
+    ])
+    merged = list(merge_rows([a, b]))
+    assert [row.raw for _, _, row in merged] == ["Coffee", "Refund", "Purchase", "Pay"]
+    entries = StGeorgeImporter("Assets:Bank:Test").extract_merged([a, b])
+    assert caplog.text == ""
+    assert entries[-1].date == datetime.date(2026, 5, 21)
+    assert entries[-1].amount.number == Decimal("95")
+
+
+def test_merge_mode_extracts_the_exports_once_as_one(tmp_path):
+    full = StGeorgeImporter("Assets:Bank:Test").extract(
+        _write_rows(tmp_path / "full.txt", MERGE_ROWS))
+    a = _write_rows(tmp_path / "joint-a.csv", MERGE_ROWS[:3])
+    b = _write_rows(tmp_path / "joint-b.csv", MERGE_ROWS[1:])
+    other = _write_rows(tmp_path / "other.csv", MERGE_ROWS)
+    importer = StGeorgeImporter("Assets:Bank:Test", merge=str(tmp_path / "joint-*.csv"))
+    assert importer.identify(a) and importer.identify(b)
+    assert not importer.identify(other)
+    # Each file returns its share: together, the whole, once.
+    merged = importer.extract(a) + importer.extract(b)
+    assert (sorted(repr(e._replace(meta=None)) for e in merged)
+            == sorted(repr(e._replace(meta=None)) for e in full))
+    assert importer.extract(b)  # Not just the first file's.
+    # Each file's date is that of its last entry in the merged extraction.
+    assert importer.date(a) == datetime.date(2026, 5, 21)
+    assert importer.date(b) == datetime.date(2026, 5, 15)
+
+
+def test_merge_mode_uses_the_extract_cache(tmp_path, monkeypatch):
+    paths = [_write_rows(tmp_path / "joint-a.csv", MERGE_ROWS[:3]),
+             _write_rows(tmp_path / "joint-b.csv", MERGE_ROWS[1:])]
+    cache_dir = str(tmp_path / "cache")
+    pattern = str(tmp_path / "joint-*.csv")
+    merged = StGeorgeImporter("Assets:Bank:Test", cache_dir=cache_dir, merge=pattern).extract(
+        paths[0])
+    monkeypatch.setattr(StGeorgeTransaction, "csv_reader", None)  # Parsing would fail.
+    importer = StGeorgeImporter("Assets:Bank:Test", cache_dir=cache_dir, merge=pattern)
+    assert importer.extract(paths[0]) == merged
+    assert importer.date(paths[1]) == datetime.date(2026, 5, 15)
+
+
+def test_running_balance_gaps_are_reported_with_line_numbers(tmp_path, caplog):
+    rows = list(MERGE_ROWS)
+    del rows[2]  # The 18/05 pay of 100.
+    path = _write_rows(tmp_path / "gap.csv", rows)
+    importer = StGeorgeImporter("Assets:Bank:Test")
+    entries = importer.extract(path)
+    assert f"{path}:4: running balance is out by 100.00 AUD before {path}:3" in caplog.text
+    # Logged, but kept out of the ledger.
+    assert not any("balance_gap" in e.meta or "balance_gap_before" in e.meta for e in entries)
+
+    # Blank lines are skipped, but still counted.
+    spaced = tmp_path / "spaced.csv"
+    spaced.write_text(HEADER + "\n" + rows[0] + "\n\n" + "".join(r + "\n" for r in rows[1:]))
+    caplog.clear()
+    StGeorgeImporter("Assets:Bank:Test").extract(str(spaced))
+    assert f"{spaced}:5: running balance is out by 100.00 AUD before {spaced}:4" in caplog.text
+
+    caplog.clear()
+    importer.extract(path)  # Memoized: still reported.
+    assert "running balance is out by 100.00 AUD" in caplog.text
+
+    caplog.clear()
+    complete = _write_rows(tmp_path / "complete.csv", MERGE_ROWS)
+    StGeorgeImporter("Assets:Bank:Test").extract(complete)
+    assert caplog.text == ""
@@ -0,0 +1,98 @@
+"""Resumable month-by-month download of Up Bank history.
+
+Each month is written to its own file, and recorded with its checksum in a
+manifest as soon as it is complete. Re-running after a failure (a crash, a
+revoked token, a rate limit) skips the months already done.
+"""
+import datetime
+import hashlib
+import json
+import os
+
+MANIFEST = "manifest.json"
+
+
+def parse_month(value: str):
+    """Return (year, month) from a "YYYY-MM" string."""
+    parsed = datetime.datetime.strptime(value, "%Y-%m")
+    return parsed.year, parsed.month
+
+
+def months(start, end):
+    """Yield each (year, month) from start to end inclusive."""
+    year, month = start
+    while (year, month) <= end:
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fileobj:
+        for chunk in iter(lambda: fileobj.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_atomic(path, text):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as fileobj:
+        fileobj.write(text)
+    os.replace(tmp_path, path)
+
+
+def load_manifest(output_dir):
+    """Return the manifest of completed months in output_dir; empty if none."""
+    try:
+        with open(os.path.join(output_dir, MANIFEST)) as fileobj:
+            return json.load(fileobj)
+    except FileNotFoundError:
+        return {"months": {}}
+
+
+def is_complete(output_dir, manifest, key):
+    """True if month key ("YYYY-MM") was finished and its file is unchanged."""
+    done = manifest["months"].get(key)
+    if done is None:
+        return False
+    path = os.path.join(output_dir, done["file"])
+    return os.path.exists(path) and _sha256(path) == done["sha256"]
+
+
+def backfill(client, start, end, output_dir, transform=None, echo=print):
+    """Download each month from start to end into output_dir, resuming.
+
+    Args:
+        client: UpbankClient to fetch with.
+        start, end: (year, month) tuples, inclusive.
+        output_dir: directory for the YYYY-MM.json files and the manifest.
+        transform: optional function applied to each transaction (eg: compact).
+        echo: function to report progress with.
+
+    Returns:
+        int: the number of months fetched (not skipped).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    fetched = 0
+    for year, month in months(start, end):
+        key = f"{year:04d}-{month:02d}"
+        if is_complete(output_dir, manifest, key):
+            echo(f"{key}: already complete, skipped")
+            continue
+        transactions = client.get_month(year, month)
+        if transform is not None:
+            transactions = [transform(trans) for trans in transactions]
+        filename = f"{key}.json"
+        path = os.path.join(output_dir, filename)
+        _write_atomic(path, json.dumps(transactions, indent=3))
+        manifest["months"][key] = {
+            "file": filename,
+            "sha256": _sha256(path),
+            "transactions": len(transactions),
+        }
+        # Record each month as it completes, so a failure loses at most one.
+        _write_atomic(os.path.join(output_dir, MANIFEST), json.dumps(manifest, indent=2))
+        echo(f"{key}: {len(transactions)} transactions")
+        fetched += 1
+    return fetched
@@ -0,0 +1,60 @@
+import json
+
+import click
+import pytest
+
+from aussie_bean_tools import upbank_backfill
+
+
+class _FakeClient:
+    """Returns one transaction per month, failing on the months in fail."""
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.calls = []
+
+    def get_month(self, year, month):
+        self.calls.append((year, month))
+        if (year, month) in self.fail:
+            raise click.ClickException("HTTP 429")
+        return [{"id": f"{year}-{month}"}]
+
+
+def _quiet(message):
+    pass
+
+
+def test_months_crosses_year_end():
+    assert list(upbank_backfill.months((2025, 11), (2026, 2))) == [
+        (2025, 11), (2025, 12), (2026, 1), (2026, 2)]
+
+
+def test_backfill_writes_month_files_and_manifest(tmp_path):
+    fetched = upbank_backfill.backfill(
+        _FakeClient(), (2025, 12), (2026, 1), str(tmp_path), echo=_quiet)
+    assert fetched == 2
+    assert json.loads((tmp_path / "2026-01.json").read_text()) == [{"id": "2026-1"}]
+    manifest = json.loads((tmp_path / "manifest.json").read_text())
+    assert sorted(manifest["months"]) == ["2025-12", "2026-01"]
+    assert manifest["months"]["2025-12"]["transactions"] == 1
+
+
+def test_backfill_resumes_after_failure(tmp_path):
+    with pytest.raises(click.ClickException):
+        upbank_backfill.backfill(
+            _FakeClient(fail={(2026, 2)}), (2025, 12), (2026, 3), str(tmp_path),
+            echo=_quiet)
+    client = _FakeClient()
+    fetched = upbank_backfill.backfill(
+        client, (2025, 12), (2026, 3), str(tmp_path), echo=_quiet)
+    assert client.calls == [(2026, 2), (2026, 3)]
+    assert fetched == 2
+
+
+def test_backfill_refetches_month_whose_file_changed(tmp_path):
+    upbank_backfill.backfill(_FakeClient(), (2026, 1), (2026, 2), str(tmp_path), echo=_quiet)
+    (tmp_path / "2026-01.json").write_text("[]")  # truncated / edited
+    client = _FakeClient()
+    upbank_backfill.backfill(client, (2026, 1), (2026, 2), str(tmp_path), echo=_quiet)
+    assert client.calls == [(2026, 1)]
+    assert json.loads((tmp_path / "2026-01.json").read_text()) == [{"id": "2026-1"}]
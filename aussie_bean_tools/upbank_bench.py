@@ -0,0 +1,115 @@
+"""Throughput benchmark for UpbankClient, against a local MockUpServer.
+
+Measures pages/sec, wall time and (optionally) peak memory of get_recent()
+and get_month() over synthetic histories, for a few client configurations,
+so pooling, prefetching and parallel windows can be compared without the
+real API.
+
+    python -m aussie_bean_tools.upbank_bench --transactions 1000 --transactions 100000
+    python -m aussie_bean_tools.upbank_bench -n 1000000 --latency 0.05 --memory
+"""
+import datetime
+import time
+import tracemalloc
+
+import click
+
+from .upbank_client import UpbankClient, month_range
+from .upbank_mock import MockUpServer
+
+# name -> (UpbankClient keyword arguments, get_recent workers)
+CONFIGS = {
+    "serial": ({"prefetch": 0}, 1),
+    "prefetch": ({"prefetch": 1}, 1),
+    "windowed": ({"prefetch": 1}, UpbankClient.WORKERS),
+}
+
+SPAN = datetime.timedelta(days=365)
+
+
+def _last_month(latest):
+    first = latest.replace(day=1)
+    previous = first - datetime.timedelta(days=1)
+    return previous.year, previous.month
+
+
+def run(server, method, config, memory=False):
+    """Run one benchmark against server.
+
+    Args:
+        server: a started MockUpServer.
+        method: "recent" or "month".
+        config: a key of CONFIGS.
+        memory: also trace peak memory; slows the run down.
+
+    Returns:
+        dict of transactions, pages, seconds, pages_per_sec and peak_bytes (or None).
+    """
+    kwargs, workers = CONFIGS[config]
+    client = UpbankClient(server.token, url=server.url, **kwargs)
+    requests_before = server.requests
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        if method == "recent":
+            result = client.get_recent(SPAN.days + 1, workers=workers)
+        elif workers > 1:
+            year, month = _last_month(server.latest)
+            result = client.transactions_windowed(
+                *month_range(year, month), workers=workers,
+                window=datetime.timedelta(days=7))
+        else:
+            result = client.get_month(*_last_month(server.latest))
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if memory else None
+    finally:
+        if memory:
+            tracemalloc.stop()
+        client.close()
+    pages = server.requests - requests_before
+    return {
+        "transactions": len(result),
+        "pages": pages,
+        "seconds": seconds,
+        "pages_per_sec": pages / seconds if seconds else float("inf"),
+        "peak_bytes": peak,
+    }
+
+
+@click.command()
+@click.option("-n", "--transactions", "sizes", type=int, multiple=True,
+              default=[1000, 10_000, 100_000], show_default=True,
+              help="Size of the synthetic history. Repeatable; 1k to 1M is sensible.")
+@click.option("--method", "methods", type=click.Choice(["recent", "month"]),
+              multiple=True, default=["recent", "month"], show_default=True,
+              help="Client method to time. Repeatable.")
+@click.option("--config", "configs", type=click.Choice(list(CONFIGS)),
+              multiple=True, default=list(CONFIGS), show_default=True,
+              help="Client configuration to time. Repeatable.")
+@click.option("--latency", type=float, default=0.0, show_default=True,
+              help="Seconds the mock server waits before each response.")
+@click.option("--rate-limit-every", type=int, default=0,
+              help="Answer every Nth request 429.")
+@click.option("--memory/--no-memory", default=False, show_default=True,
+              help="Trace peak memory with tracemalloc (slower).")
+def cli(sizes, methods, configs, latency, rate_limit_every, memory):
+    """Benchmark UpbankClient against a local mock Up API."""
+    click.echo(f"{'size':>9} {'method':<7} {'config':<9} {'trans':>9} {'pages':>7} "
+               f"{'seconds':>8} {'pages/s':>8} {'peak MiB':>9}")
+    for size in sizes:
+        with MockUpServer(transactions=size, span=SPAN, latency=latency,
+                          rate_limit_every=rate_limit_every) as server:
+            for method in methods:
+                for config in configs:
+                    result = run(server, method, config, memory)
+                    peak = ("-" if result["peak_bytes"] is None
+                            else f"{result['peak_bytes'] / 2 ** 20:.1f}")
+                    click.echo(
+                        f"{size:>9} {method:<7} {config:<9} {result['transactions']:>9} "
+                        f"{result['pages']:>7} {result['seconds']:>8.2f} "
+                        f"{result['pages_per_sec']:>8.1f} {peak:>9}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -2,11 +2,29 @@
 
 Use the Up Bank API to retrieve transactions.
 """
+import collections
+import concurrent.futures
 import datetime
+import email.utils
+import hashlib
+import itertools
+import os
+import queue
+import random
+import re
+import tempfile
+import threading
+import time
+
 import click
 import json
 import pprint
 import requests
+import requests.adapters
+
+from . import upbank_backfill
+from .upbank_store import UpbankStore
+from .upbank_webhook import NdjsonSpool, WebhookServer
 
 
 URL = "https://api.up.com.au/api/v1"
@@ -20,11 +38,74 @@ SETTLED = "SETTLED"
 
 
 class UpbankClient:
-    def __init__(self, token: str):
+    # Seconds to wait for a connection, and then for each response.
+    TIMEOUT = (10, 30)
+
+    # Times to retry a request that failed with a transient error.
+    RETRIES = 5
+
+    # Up rate-limits with 429, and occasionally fails with a 5xx; both are
+    # worth retrying. Anything else (eg: 401 bad token) is final.
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+    # Methods safe to send again when a first try may have got through. Any
+    # other (POST: registering a webhook twice doubles every event) is only
+    # retried after a 429, which Up sends without acting on the request.
+    IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+    # Seconds of exponential backoff: a random delay up to BACKOFF * 2**attempt,
+    # capped at MAX_BACKOFF, unless Up says how long to wait with Retry-After
+    # (which is capped at MAX_BACKOFF too).
+    BACKOFF = 0.5
+    MAX_BACKOFF = 60
+
+    # Keep-alive connections to hold open to Up.
+    POOL_SIZE = 10
+
+    # Date windows to fetch at the same time in transactions_windowed().
+    WORKERS = 4
+
+    # Pages to fetch ahead, on a background thread, while the caller is busy
+    # with the current one; 0 fetches each page only when it is asked for.
+    PREFETCH = 1
+
+    # Seconds a cached response is used without asking Up. Categories hardly
+    # ever change; accounts carry the balance, so are always revalidated.
+    CATEGORIES_TTL = 24 * 60 * 60
+    ACCOUNTS_TTL = 0
+
+    def __init__(self, token: str, timeout=TIMEOUT, retries: int = RETRIES,
+                 backoff: float = BACKOFF, url: str = URL, prefetch: int = PREFETCH,
+                 cache_dir: str = None):
         """
         token: str: upbank "personal access token" from https://api.up.com.au/getting_started
+        timeout: seconds to wait per request; or a (connect, read) tuple.
+        retries: times to retry a 429, 5xx or dropped connection.
+        backoff: base seconds of the exponential backoff between retries.
+        url: base URL of the API.
+        prefetch: pages to fetch ahead of the caller; 0 for none.
+        cache_dir: directory to cache accounts and categories in; or None.
         """
         self.token = token
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.url = url
+        self.prefetch = prefetch
+        # Kept per token, so a different token never sees another's cache.
+        self.cache_dir = (
+            None if cache_dir is None else os.path.join(cache_dir, token_digest(token)))
+        # One pooled session, so every page reuses the same TLS connection.
+        self.session = requests.Session()
+        self.session.headers.update(self._headers())
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=self.POOL_SIZE, pool_maxsize=self.POOL_SIZE)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def close(self):
+        """Close the pooled connections."""
+        self.session.close()
 
     def get_month(self, year: int, month: int) -> []:
         """Get settled transactions for the given month.
@@ -35,25 +116,20 @@ class UpbankClient:
         Returns:
               A list of settled transactions as a dict.
         """
-        local_tz = datetime.datetime.utcnow().astimezone().tzinfo
-        since = datetime.datetime(year=year, month=month, day=1, tzinfo=local_tz)
-        if month == 12:
-            month = 0
-            year += 1
-        until = datetime.datetime(year=year, month=month + 1, day=1, tzinfo=local_tz)
-        return self.transactions(since, until)
+        return self.transactions(*month_range(year, month))
 
-    def get_recent(self, days: int) -> []:
+    def get_recent(self, days: int, workers: int = 1) -> []:
         """Get all recent transactions.
 
         days: int: commencing this many days ago
+        workers: int: fetch this many monthly windows at the same time
 
         Returns:
               A list of transactions as a dict.
         """
-        local_tz = datetime.datetime.utcnow().astimezone().tzinfo
-        now = datetime.datetime.utcnow().replace(tzinfo=local_tz)
-        since = now - datetime.timedelta(days=days)
+        since, now = recent_range(days)
+        if workers > 1:
+            return self.transactions_windowed(since, now, workers=workers)
         return self.transactions(since)
 
     def transactions(
@@ -62,24 +138,96 @@ class UpbankClient:
         """Fetch a list of transactions.
 
         Args:
-            since: tzaware datetime to start from
+            since: tzaware datetime to start from; or None for all.
             until: tzaware datetime to stop at; or None for all.
             status: "HELD" or "SETTLED"
 
         Returns:
             list of "SETTLED" transactions in dict format.
         """
+        return list(self.iter_transactions(since, until, status))
+
+    def iter_transactions(
+        self, since: datetime.datetime, until: datetime.date = None, status: str = None,
+        account_id: str = None,
+    ):
+        """Fetch transactions like transactions(), yielding each as its page arrives.
+
+        Args:
+            account_id: only fetch this account's transactions; or None for all.
+
+        Returns:
+            generator of transactions in dict format, newest first.
+        """
+        path = "/transactions" if account_id is None else f"/accounts/{account_id}/transactions"
         params = dict()
 
         # Upbank only return PAGE_SIZE transactions per request, so we need to
         params.update({"page[size]": PAGE_SIZE})
-        params.update({"filter[since]": since})
+        if since is not None:
+            params.update({"filter[since]": since})
         if until is not None:
             params.update({"filter[until]": until})
         if status is not None:
             params.update({"filter[status]": status})
-        response = self.get("/transactions", params=params)
-        return response
+        for page in self.iter_pages(path, params=params):
+            yield from page
+
+    def account_transactions(
+        self, since: datetime.datetime, until: datetime.datetime = None,
+        status: str = None, workers: int = WORKERS,
+    ) -> list:
+        """Fetch each account's transactions separately, several at the same time.
+
+        Args:
+            since, until, status: as for transactions().
+            workers: accounts to fetch at the same time.
+
+        Returns:
+            list of (account, transactions) tuples, in the order Up lists the
+            accounts; account is the dict from accounts().
+        """
+        accounts = self.accounts()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(
+                lambda a: list(self.iter_transactions(since, until, status, a["id"])),
+                accounts)
+            return list(zip(accounts, results))
+
+    def transactions_windowed(
+        self, since: datetime.datetime, until: datetime.datetime = None,
+        status: str = None, workers: int = WORKERS, window: datetime.timedelta = None,
+    ) -> list:
+        """Fetch transactions like transactions(), splitting the range into windows.
+
+        Each window is paginated separately, on a pool of worker threads, so a
+        multi-year range is fetched several cursor chains at a time.
+
+        Args:
+            since: tzaware datetime to start from
+            until: tzaware datetime to stop at; or None for now.
+            status: "HELD" or "SETTLED"
+            workers: windows to fetch at the same time.
+            window: length of each window; or None for calendar months.
+
+        Returns:
+            list of transactions in dict format, newest first as Up returns
+            them, without the duplicates that straddle window edges.
+        """
+        if until is None:
+            until = datetime.datetime.now(since.tzinfo)
+        windows = _windows(since, until, window)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            pages = executor.map(
+                lambda w: self.transactions(w[0], w[1], status=status), windows)
+            result = []
+            seen = set()
+            for page in pages:
+                for trans in page:
+                    if trans["id"] not in seen:
+                        seen.add(trans["id"])
+                        result.append(trans)
+        return result
 
     def get(self, path, params: dict = None) -> list:
         """Send a GET request to Up.
@@ -91,34 +239,49 @@ class UpbankClient:
         Returns:
             list of data; probably dicts.
         """
-        result = []
-        uri = f"{URL}{path}"
+        # Nothing is done between pages here, so there is nothing to gain
+        # from fetching ahead on another thread.
+        return [item for page in self._fetch_pages(path, params) for item in page]
+
+    def iter_pages(self, path, params: dict = None):
+        """Send a GET request to Up, yielding each page of data as it arrives.
+
+        Args:
+            path: includes the preceding slash.
+            params: request parameters.
+
+        Returns:
+            generator of lists of data; probably dicts.
+        """
+        if self.prefetch <= 0:
+            yield from self._fetch_pages(path, params)
+            return
+        page, next_uri = self._fetch_page(f"{self.url}{path}", path, params)
+        if next_uri is None:
+            yield page  # The only page: no thread needed.
+            return
+        # One worker thread for the rest of this iteration.
+        yield from _prefetch(
+            itertools.chain([page], self._fetch_pages(path, uri=next_uri)),
+            self.prefetch)
+
+    def _fetch_pages(self, path, params: dict = None, uri: str = None):
+        """Yield each page of data from path, following links.next.
+
+        uri: start here (eg: a links.next) instead of at the start of path.
+        """
+        if uri is None:
+            uri = f"{self.url}{path}"
         while uri is not None:
-            response = requests.get(uri, headers=self._headers(), params=params)
-            data = response.json()
-            if "data" not in data:
-                # Up returns {"errors": [...]} on failure (e.g. 401 for an
-                # invalid/revoked token). Surface a clear message instead of
-                # crashing with KeyError: 'data'.
-                errors = data.get("errors") or [{}]
-                detail = "; ".join(
-                    " ".join(
-                        part for part in (
-                            e.get("status"), e.get("title"), e.get("detail")
-                        ) if part
-                    )
-                    for e in errors
-                )
-                raise click.ClickException(
-                    f"Up API request to {path} failed "
-                    f"(HTTP {response.status_code}): {detail or response.text}"
-                )
-            result.extend(data["data"])
-            try:
-                uri = data["links"]["next"]
-            except KeyError:
-                break
-        return result
+            page, uri = self._fetch_page(uri, path, params)
+            # The links.next URI already carries the query.
+            params = None
+            yield page
+
+    def _fetch_page(self, uri, path, params: dict = None):
+        """Return (the page of data at uri, its links.next or None)."""
+        data = _data(self._request(uri, params=params), path)
+        return data["data"], (data.get("links") or {}).get("next")
 
     def ping(self):
         """Verify the access token is working.
@@ -126,23 +289,399 @@ class UpbankClient:
         Returns:
             requests.Response
         """
-        return requests.get(f"{URL}/util/ping", headers=self._headers())
+        return self._request(f"{self.url}/util/ping")
 
-    def accounts(self):
-        """Fetch a list of accounts."""
-        return self.get("/accounts")
+    def accounts(self, fresh: bool = False):
+        """Fetch a list of accounts.
+
+        fresh: ask Up, bypassing the cache, eg: for an up-to-date balance.
+        """
+        if fresh:
+            return self.get("/accounts")
+        return self._get_cached("/accounts", self.ACCOUNTS_TTL)
+
+    def transaction(self, transaction_id: str, missing_ok: bool = False) -> dict:
+        """Fetch a single transaction by id.
+
+        missing_ok: return None, instead of raising, if Up has no such
+            transaction (eg: a HELD transaction that was reversed).
+        """
+        path = f"/transactions/{transaction_id}"
+        response = self._request(f"{self.url}{path}")
+        if missing_ok and response.status_code == 404:
+            return None
+        return _data(response, path)["data"]
+
+    def webhooks(self):
+        """Fetch a list of the webhooks registered for this token."""
+        return self.get("/webhooks")
+
+    def register_webhook(self, url: str, description: str = None) -> dict:
+        """Ask Up to POST transaction events to url.
+
+        Returns:
+            The new webhook as a dict. Its attributes.secretKey signs every
+            event, and is only ever given out here.
+        """
+        attributes = {"url": url}
+        if description:
+            attributes["description"] = description
+        response = self._request(
+            f"{self.url}/webhooks", method="POST",
+            json={"data": {"attributes": attributes}})
+        return _data(response, "/webhooks")["data"]
+
+    def unregister_webhook(self, webhook_id: str):
+        """Delete a webhook, so Up stops sending it events."""
+        path = f"/webhooks/{webhook_id}"
+        response = self._request(f"{self.url}{path}", method="DELETE")
+        if response.status_code != 204:
+            _data(response, path)
 
     def categories(self):
         """Fetch a list of categories."""
-        return self.get("/categories")
+        return self._get_cached("/categories", self.CATEGORIES_TTL)
+
+    def _get_cached(self, path, ttl: float) -> list:
+        """Like get(), but cached on disk in self.cache_dir.
+
+        A cached response younger than ttl seconds is returned as is. An older
+        one is revalidated with its ETag/Last-Modified: if Up answers 304 Not
+        Modified it is used again, otherwise the fresh response replaces it.
+        """
+        if self.cache_dir is None:
+            return self.get(path)
+        cache_file = os.path.join(self.cache_dir, path.strip("/").replace("/", "-") + ".json")
+        try:
+            with open(cache_file) as fileobj:
+                entry = json.load(fileobj)
+        except (OSError, ValueError):
+            entry = None
+        now = time.time()
+        if entry is not None and now - entry["fetched"] < ttl:
+            return entry["data"]
+
+        headers = {}
+        if entry is not None and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry is not None and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        response = self._request(f"{self.url}{path}", headers=headers)
+        if entry is not None and response.status_code == 304:
+            entry["fetched"] = now
+        else:
+            data = _data(response, path)
+            result = list(data["data"])
+            next_uri = (data.get("links") or {}).get("next")
+            if next_uri is not None:
+                for page in self._fetch_pages(path, uri=next_uri):
+                    result.extend(page)
+            entry = {
+                "fetched": now,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "data": result,
+            }
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # A unique name, so threads of one process don't write the same file.
+        with tempfile.NamedTemporaryFile(
+                "w", dir=self.cache_dir, suffix=".tmp", delete=False) as fileobj:
+            json.dump(entry, fileobj)
+        os.replace(fileobj.name, cache_file)
+        return entry["data"]
 
     def _headers(self):
         return {"Authorization": f"Bearer {self.token}"}
 
+    def _request(self, uri, params: dict = None, method: str = "GET",
+                 json: dict = None, headers: dict = None) -> requests.Response:
+        """Send a request (GET by default) on the pooled session, with retries.
+
+        A 429 or 5xx response, a dropped connection or a timeout is retried up
+        to self.retries times, waiting as long as the Retry-After header says
+        (up to MAX_BACKOFF), or else an exponential backoff with jitter. A
+        method not in IDEMPOTENT_METHODS is only retried after a 429.
+
+        Returns:
+            requests.Response: the first non-transient response, or the last
+            response once the retries are exhausted.
+        """
+        idempotent = method.upper() in self.IDEMPOTENT_METHODS
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.request(
+                    method, uri, params=params, json=json, headers=headers,
+                    timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                if attempt == self.retries or not idempotent:
+                    raise click.ClickException(
+                        f"Up API request to {uri} failed: {exc}") from exc
+                delay = self._backoff(attempt)
+            else:
+                retry = (response.status_code == 429 if not idempotent
+                         else response.status_code in self.RETRY_STATUSES)
+                if not retry or attempt == self.retries:
+                    return response
+                delay = _retry_after(response)
+                if delay is None:
+                    delay = self._backoff(attempt)
+                else:
+                    # Never hang on a bogus (or hostile) Retry-After.
+                    delay = min(delay, self.MAX_BACKOFF)
+            time.sleep(delay)
+
+    def _backoff(self, attempt: int) -> float:
+        """Seconds to wait before retry number attempt (from 0), with full jitter."""
+        return random.uniform(0, min(self.MAX_BACKOFF, self.backoff * 2 ** attempt))
+
+
+def month_range(year: int, month: int):
+    """Return the (since, until) tzaware datetimes spanning a local calendar month."""
+    local_tz = datetime.datetime.utcnow().astimezone().tzinfo
+    since = datetime.datetime(year=year, month=month, day=1, tzinfo=local_tz)
+    if month == 12:
+        month = 0
+        year += 1
+    until = datetime.datetime(year=year, month=month + 1, day=1, tzinfo=local_tz)
+    return since, until
+
+
+def compact(trans: dict) -> dict:
+    """Project a transaction onto just the fields UpbankImporter uses.
+
+    The attributes are flattened to the top level, and the account and
+    category relationships reduced to their ids (or None); the links,
+    deepLinkURL, performingCustomer and the rest are dropped.
+    """
+    attributes = trans["attributes"]
+    relationships = trans.get("relationships", {})
+
+    def related_id(name):
+        return ((relationships.get(name) or {}).get("data") or {}).get("id")
+
+    return {
+        "id": trans["id"],
+        "createdAt": attributes["createdAt"],
+        "status": attributes.get("status"),
+        "rawText": attributes.get("rawText"),
+        "description": attributes.get("description"),
+        "message": attributes.get("message"),
+        "amount": {
+            "value": attributes["amount"]["value"],
+            "valueInBaseUnits": attributes["amount"].get("valueInBaseUnits"),
+        },
+        "account": related_id("account"),
+        "category": related_id("category"),
+    }
+
+
+def account_filename(account: dict) -> str:
+    """A filename for an account's transactions, from its display name.
+
+    eg: "Spending" -> "Spending.json"; "🏠 Home Deposit" -> "Home-Deposit.json"
+    """
+    name = re.sub(r"[^A-Za-z0-9]+", "-", account["attributes"]["displayName"]).strip("-")
+    return f"{name or account['id']}.json"
+
+
+def account_filenames(accounts) -> list:
+    """account_filename() of each account, with its id added where two clash.
+
+    eg: two savers named "🏠 Home" and "Home" -> "Home-<id>.json" each.
+    """
+    names = [account_filename(account) for account in accounts]
+    clashes = {name for name, count in collections.Counter(names).items() if count > 1}
+    return [f"{name[:-len('.json')]}-{account['id']}.json" if name in clashes else name
+            for name, account in zip(names, accounts)]
+
+
+def recent_range(days: int):
+    """Return the (since, now) tzaware datetimes spanning the last days."""
+    local_tz = datetime.datetime.utcnow().astimezone().tzinfo
+    now = datetime.datetime.utcnow().replace(tzinfo=local_tz)
+    return now - datetime.timedelta(days=days), now
+
+
+def _windows(since, until, window=None):
+    """Split [since, until) into consecutive windows, newest first.
+
+    Args:
+        since, until: tzaware datetimes.
+        window: timedelta length of each window; or None to break at the
+            start of each calendar month (in since's timezone).
+
+    Returns:
+        list of (since, until) datetime tuples.
+    """
+    windows = []
+    start = since
+    while start < until:
+        if window is not None:
+            end = start + window
+        elif start.month == 12:
+            end = start.replace(year=start.year + 1, month=1, day=1,
+                                hour=0, minute=0, second=0, microsecond=0)
+        else:
+            end = start.replace(month=start.month + 1, day=1,
+                                hour=0, minute=0, second=0, microsecond=0)
+        end = min(end, until)
+        windows.append((start, end))
+        start = end
+    windows.reverse()
+    return windows
+
+
+# Marks the end of the pages passed through _prefetch()'s queue.
+_DONE = object()
+
+
+def _prefetch(iterable, depth: int):
+    """Iterate over iterable on a background thread, up to depth items ahead.
+
+    The queue between the threads is bounded, so at most depth items wait to
+    be consumed. An exception raised by iterable is re-raised to the caller.
+    Closing the generator early stops the background thread at its next item.
+    """
+    items = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def worker():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+        except BaseException as exc:
+            put((_DONE, exc))
+        else:
+            put((_DONE, None))
+
+    threading.Thread(target=worker, daemon=True).start()
+    try:
+        while True:
+            item, exc = items.get()
+            if item is _DONE:
+                if exc is not None:
+                    raise exc
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def _data(response, path):
+    """Return the parsed JSON body of a successful response from Up.
+
+    Up returns {"errors": [...]} on failure (e.g. 401 for an invalid/revoked
+    token). Surface a clear message instead of crashing with KeyError: 'data'.
+    """
+    try:
+        data = response.json()
+    except ValueError:
+        data = {}
+    if "data" not in data:
+        errors = data.get("errors") or [{}]
+        detail = "; ".join(
+            " ".join(
+                part for part in (
+                    e.get("status"), e.get("title"), e.get("detail")
+                ) if part
+            )
+            for e in errors
+        )
+        raise click.ClickException(
+            f"Up API request to {path} failed "
+            f"(HTTP {response.status_code}): {detail or response.text}"
+        )
+    return data
+
+
+def _retry_after(response):
+    """Return the seconds to wait given by a Retry-After header; or None.
+
+    The header is either a number of seconds or an HTTP date.
+    """
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return max(0.0, (when - now).total_seconds())
+
+
+def token_digest(token: str) -> str:
+    """A short, stable name for a token that doesn't give the token away."""
+    return hashlib.sha256(token.encode()).hexdigest()[:12]
+
+
+def profile_token(profile: str) -> str:
+    """Return the token for a named profile, from $UPBANK_TOKEN_<PROFILE>."""
+    envvar = "UPBANK_TOKEN_" + profile.upper().replace("-", "_")
+    token = os.environ.get(envvar)
+    if not token:
+        raise click.UsageError(f"No Upbank token for profile {profile!r}: set {envvar}.")
+    return token
+
+
+def fetch_profiles(clients: dict, since: datetime.datetime,
+                   until: datetime.datetime = None, status: str = None):
+    """Fetch transactions for several tokens at the same time.
+
+    Each profile has its own UpbankClient, and so its own connections and
+    retry backoff: a 429 on one token slows only that profile's fetch.
+
+    Args:
+        clients: dict of profile name -> UpbankClient.
+        since, until, status: as for UpbankClient.transactions().
+
+    Returns:
+        generator of (profile name, list of transactions), in the order the
+        fetches finish.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(clients)) as executor:
+        futures = {
+            executor.submit(c.transactions, since, until, status): name
+            for name, c in clients.items()
+        }
+        for future in concurrent.futures.as_completed(futures):
+            yield futures[future], future.result()
+
 
 # Global Upbank client
 client = None
 
+# Global options for constructing an UpbankClient
+client_options = {}
+
+# Global path to the local transaction store
+store_path = None
+
+
+def _default_store_path(token):
+    """A store per token, so each person's transactions are kept apart."""
+    return os.path.join(
+        click.get_app_dir("aussie-bean-tools"), f"upbank-{token_digest(token)}.sqlite")
+
+
+def _open_store():
+    os.makedirs(os.path.dirname(os.path.abspath(store_path)), exist_ok=True)
+    return UpbankStore(store_path)
+
 
 @click.group()
 @click.option(
@@ -151,14 +690,54 @@ client = None
     help="Upbank personal access token. Prefer the UPBANK_TOKEN environment "
          "variable so the secret never appears on the command line or in logs.",
 )
-def cli(token):
-    global client
+@click.option(
+    "--timeout",
+    type=float,
+    default=30.0,
+    show_default=True,
+    help="Seconds to wait for each response from Up.",
+)
+@click.option(
+    "--retries",
+    type=int,
+    default=UpbankClient.RETRIES,
+    show_default=True,
+    help="Times to retry a rate-limited (429) or failed (5xx) request.",
+)
+@click.option(
+    "--store",
+    envvar="UPBANK_STORE",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="SQLite file of synced transactions (env UPBANK_STORE). "
+         "Default: one per token in the app config directory.",
+)
+@click.option(
+    "--cache/--no-cache",
+    default=True,
+    show_default=True,
+    help="Cache accounts and categories in the app config directory, "
+         "revalidating with Up instead of refetching them. 'balance' always "
+         "asks Up.",
+)
+@click.pass_context
+def cli(ctx, token, timeout, retries, store, cache):
+    global client, client_options, store_path
+    client_options = dict(
+        timeout=(UpbankClient.TIMEOUT[0], timeout),
+        retries=retries,
+        cache_dir=(os.path.join(click.get_app_dir("aussie-bean-tools"), "upbank-cache")
+                   if cache else None),
+    )
+    if not token and ctx.invoked_subcommand == "household":
+        return  # Each profile brings its own token.
     if not token:
         raise click.UsageError(
             "No Upbank token supplied. Set the UPBANK_TOKEN environment variable "
             "(preferred, keeps the secret off the command line) or pass --token."
         )
-    client = UpbankClient(token)
+    client = UpbankClient(token, **client_options)
+    store_path = store or _default_store_path(token)
 
 
 @cli.command()
@@ -183,44 +762,307 @@ def categories():
 def balance(account):
     """Fetch the current balance of the account."""
     global client
-    response = client.accounts()
+    # Never a cached balance, however recently revalidated.
+    response = client.accounts(fresh=True)
     today = datetime.datetime.today().date()
     balance = float(response[0]['attributes']['balance']['value'])
     click.echo(f"{today} balance Assets:Bank:{account}-Upbank \t\t {balance} AUD\n")
 
 
+format_option = click.option(
+    "--format", "format_",
+    type=click.Choice(["json", "ndjson"]),
+    default="json",
+    show_default=True,
+    help="A JSON list, or newline-delimited JSON: one transaction per line, "
+         "written as soon as its page arrives.",
+)
+
+
+compact_option = click.option(
+    "--compact", "compact_", is_flag=True,
+    help="Keep only the fields the importer uses, several times smaller.",
+)
+
+
+def _echo_transactions(transactions, format_, compact_=False):
+    """Write transactions (any iterable) to stdout in the given format."""
+    if compact_:
+        transactions = map(compact, transactions)
+    if format_ == "ndjson":
+        for trans in transactions:
+            click.echo(json.dumps(trans))
+    else:
+        click.echo(json.dumps(list(transactions), indent=3))
+
+
+by_account_option = click.option(
+    "--by-account", "output_dir",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="Fetch each Up account separately, at the same time, and write one "
+         "<account>.json per account into this directory.",
+)
+
+
+def _write_by_account(since, until, output_dir, format_="json", compact_=False,
+                      from_store=False, workers=None):
+    """Fetch and write each account's transactions to its own file.
+
+    workers is the accounts to fetch at the same time; None for the default.
+    """
+    global client
+    if from_store:
+        raise click.UsageError("--by-account fetches from Up; it can't be used with --from-store.")
+    os.makedirs(output_dir, exist_ok=True)
+    results = client.account_transactions(
+        since, until, workers=workers or UpbankClient.WORKERS)
+    filenames = account_filenames([account for account, _ in results])
+    for (account, transactions), filename in zip(results, filenames):
+        if compact_:
+            transactions = [compact(trans) for trans in transactions]
+        path = os.path.join(output_dir, filename)
+        with open(path, "w") as fileobj:
+            if format_ == "ndjson":
+                fileobj.writelines(json.dumps(trans) + "\n" for trans in transactions)
+            else:
+                json.dump(transactions, fileobj, indent=3)
+        click.echo(f"Wrote {path} ({len(transactions)} transactions)", err=True)
+
+
 @cli.command()
 @click.argument("year", type=click.types.INT)
 @click.argument("month", type=click.types.INT)
-def month(year, month):
+@click.option("--from-store", is_flag=True,
+              help="Read from the local store (see 'sync') instead of Up.")
+@format_option
+@compact_option
+@by_account_option
+def month(year, month, from_store, format_, compact_, output_dir):
     """Download a sequence of transactions.
     """
     global client
-    transactions = client.get_month(year, month)
-    click.echo(json.dumps(transactions, indent=3))
+    if output_dir:
+        return _write_by_account(
+            *month_range(year, month), output_dir, format_, compact_, from_store)
+    if from_store:
+        with _open_store() as store:
+            transactions = store.transactions(*month_range(year, month))
+    else:
+        transactions = client.iter_transactions(*month_range(year, month))
+    _echo_transactions(transactions, format_, compact_)
 
 
 @cli.command()
 @click.argument("days", type=click.types.INT, default=60)
-def recent(days):
+@click.option("--workers", type=click.types.INT, default=None,
+              help="Fetch this many monthly windows (or, with --by-account, "
+                   "accounts) at the same time. [default: 1; with --by-account, 4]")
+@click.option("--from-store", is_flag=True,
+              help="Read from the local store (see 'sync') instead of Up.")
+@format_option
+@compact_option
+@by_account_option
+def recent(days, workers, from_store, format_, compact_, output_dir):
     """Download a sequence of transactions.
     """
     global client
-    transactions = client.get_recent(days)
-    click.echo(json.dumps(transactions, indent=3))
+    if output_dir:
+        return _write_by_account(
+            recent_range(days)[0], None, output_dir, format_, compact_, from_store, workers)
+    if from_store:
+        with _open_store() as store:
+            transactions = store.transactions(*recent_range(days))
+    elif workers and workers > 1:
+        transactions = client.get_recent(days, workers=workers)
+    else:
+        transactions = client.iter_transactions(recent_range(days)[0])
+    _echo_transactions(transactions, format_, compact_)
 
 
 @cli.command()
 @click.argument("days", type=click.types.INT, default=60)
-def held(days):
+@format_option
+@compact_option
+@click.option("--reconcile", is_flag=True,
+              help="Instead, output the transactions that have settled since "
+                   "they were last seen held, and report any that disappeared.")
+def held(days, format_, compact_, reconcile):
     """Download held transactions.
     """
     global client
-    local_tz = datetime.datetime.utcnow().astimezone().tzinfo
-    now = datetime.datetime.utcnow().replace(tzinfo=local_tz)
-    since = now - datetime.timedelta(days=days)
-    transactions = client.transactions(since, status=HELD)
-    click.echo(json.dumps(transactions, indent=3))
+    since, _ = recent_range(days)
+    if not reconcile:
+        transactions = client.iter_transactions(since, status=HELD)
+        return _echo_transactions(transactions, format_, compact_)
+    with _open_store() as store:
+        settled, disappeared, still_held = store.reconcile_held(client, since)
+    for trans in settled:
+        attributes = trans["attributes"]
+        click.echo(f"Settled: {attributes['createdAt'][:10]} {attributes['description']} "
+                   f"{attributes['amount']['value']}", err=True)
+    for transaction_id in disappeared:
+        click.echo(f"Disappeared: {transaction_id}", err=True)
+    click.echo(f"{len(settled)} settled, {len(disappeared)} disappeared, "
+               f"{still_held} still held", err=True)
+    _echo_transactions(settled, format_, compact_)
+
+
+@cli.command()
+@click.argument("days", type=click.types.INT, default=60)
+@click.option("--profile", "profiles", required=True, multiple=True,
+              help="Profile to fetch, with its token in $UPBANK_TOKEN_<PROFILE>. "
+                   "Repeatable.")
+@click.option("--output-dir", type=click.Path(file_okay=False), default=None,
+              help="Write <profile>.json here for each profile (default: a "
+                   "merged NDJSON stream on stdout, tagged with \"profile\").")
+def household(days, profiles, output_dir):
+    """Download recent transactions for several profiles at once.
+
+    \b
+    Example:
+        UPBANK_TOKEN_JOHN=... UPBANK_TOKEN_FIONA=... UPBANK_TOKEN_JOINT=... \\
+            upbank household --profile john --profile fiona --profile joint \\
+            --output-dir /tmp/upbank 60
+    """
+    clients = {
+        profile: UpbankClient(profile_token(profile), **client_options)
+        for profile in profiles
+    }
+    since, _ = recent_range(days)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    for profile, transactions in fetch_profiles(clients, since):
+        if output_dir:
+            path = os.path.join(output_dir, f"{profile}.json")
+            with open(path, "w") as fileobj:
+                json.dump(transactions, fileobj, indent=3)
+            click.echo(f"Wrote {path} ({len(transactions)} transactions)", err=True)
+        else:
+            for trans in transactions:
+                click.echo(json.dumps(dict(trans, profile=profile)))
+
+
+def _month_option(ctx, param, value):
+    if value is None:
+        return None
+    try:
+        return upbank_backfill.parse_month(value)
+    except ValueError:
+        raise click.BadParameter("expected YYYY-MM")
+
+
+@cli.command()
+@click.option("--from", "start", required=True, callback=_month_option,
+              help="First month to download, YYYY-MM.")
+@click.option("--to", "end", default=None, callback=_month_option,
+              help="Last month to download, YYYY-MM. Default: last month.")
+@click.option("--output-dir", required=True, type=click.Path(file_okay=False),
+              help="Directory for the YYYY-MM.json files and their manifest.")
+@compact_option
+def backfill(start, end, output_dir, compact_):
+    """Download history month by month, resuming where it left off.
+
+    Each month is written to its own YYYY-MM.json and recorded, with its
+    checksum, in the directory's manifest.json. Re-running (eg: after a
+    crash, 401 or rate limit) skips every month already complete.
+    """
+    global client
+    if end is None:
+        today = datetime.date.today()
+        end = (today.year - 1, 12) if today.month == 1 else (today.year, today.month - 1)
+    try:
+        fetched = upbank_backfill.backfill(
+            client, start, end, output_dir,
+            transform=compact if compact_ else None,
+            echo=lambda message: click.echo(message, err=True))
+    except click.ClickException as exc:
+        exc.message += "\nRe-run the same command to resume from the failed month."
+        raise
+    click.echo(f"Backfilled {fetched} months into {output_dir}", err=True)
+
+
+@cli.group()
+def webhook():
+    """Receive new transactions pushed by Up, instead of polling."""
+
+
+@webhook.command()
+@click.argument("url")
+@click.option("--description", default=None, help="A note to remember it by.")
+def register(url, description):
+    """Ask Up to send transaction events to URL.
+
+    Prints the webhook's secret key, which Up shows only once: give it to
+    'webhook serve' via UPBANK_WEBHOOK_SECRET.
+    """
+    global client
+    hook = client.register_webhook(url, description)
+    click.echo(f"Registered webhook {hook['id']} -> {url}", err=True)
+    click.echo(hook["attributes"]["secretKey"])
+
+
+@webhook.command()
+@click.argument("webhook_id")
+def unregister(webhook_id):
+    """Stop Up sending events to webhook WEBHOOK_ID."""
+    global client
+    client.unregister_webhook(webhook_id)
+    click.echo(f"Unregistered webhook {webhook_id}", err=True)
+
+
+@webhook.command("list")
+def list_webhooks():
+    """List the webhooks registered for this token."""
+    global client
+    for hook in client.webhooks():
+        click.echo(f"{hook['id']}  {hook['attributes']['url']}")
+
+
+@webhook.command()
+@click.option("--host", default="127.0.0.1", show_default=True,
+              help="Address to listen on.")
+@click.option("--port", default=8765, show_default=True, help="Port to listen on.")
+@click.option("--secret", envvar="UPBANK_WEBHOOK_SECRET", required=True,
+              help="The webhook's secret key (env UPBANK_WEBHOOK_SECRET).")
+@click.option("--spool", type=click.Path(dir_okay=False), default=None,
+              help="Append transactions to this NDJSON file, instead of the store.")
+def serve(host, port, secret, spool):
+    """Receive webhook events, saving each new or settled transaction.
+
+    Every event's signature is checked, and the transaction it refers to is
+    fetched from Up once and saved to the local store (see 'sync'), or
+    appended to --spool. Run it behind whatever exposes the registered URL.
+    """
+    global client
+    store = None if spool else _open_store()
+    sink = NdjsonSpool(spool) if spool else store
+    server = WebhookServer((host, port), secret, client, sink)
+    click.echo(f"Listening on http://{host}:{server.server_port}", err=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if store is not None:
+            store.close()
+
+
+@cli.command()
+def sync():
+    """Fetch new transactions into the local store.
+
+    The first sync downloads the whole history; later ones fetch only what is
+    new since the last, plus a few days' overlap to catch transactions that
+    have since changed. 'month' and 'recent' can then read the store with
+    --from-store, without asking Up.
+    """
+    global client
+    with _open_store() as store:
+        count = store.sync(client)
+        mark = store.high_water_mark()
+    click.echo(f"Synced {count} transactions to {store_path} (newest {mark})", err=True)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,474 @@
+import concurrent.futures
+import datetime
+import http.server
+import json
+import threading
+import time
+
+import click
+from click.testing import CliRunner
+import pytest
+
+from aussie_bean_tools import upbank_client
+from aussie_bean_tools.upbank_client import UpbankClient
+
+
+class _StubHandler(http.server.BaseHTTPRequestHandler):
+    """Serve the next scripted (status, headers, body) for every GET.
+
+    body may be a callable of (server, request path) returning the body, or
+    None for an empty body.
+    """
+
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(self.path)
+        server.peers.add(self.client_address)
+        server.authorizations.append(self.headers.get("Authorization"))
+        server.conditions.append(self.headers.get("If-None-Match"))
+        status, headers, body = server.script.pop(0)
+        if callable(body):
+            body = body(server, self.path)
+        payload = b"" if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    """A local HTTP server standing in for api.up.com.au."""
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.script = []
+    server.requests = []
+    server.authorizations = []
+    server.peers = set()
+    server.conditions = []
+    server.url = f"http://127.0.0.1:{server.server_port}/api/v1"
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record retry delays instead of sleeping through them."""
+    delays = []
+    monkeypatch.setattr(upbank_client.time, "sleep", delays.append)
+    return delays
+
+
+def _page(ids, next_url=None):
+    return {"data": [{"id": i} for i in ids], "links": {"prev": None, "next": next_url}}
+
+
+def _client(stub, **kwargs):
+    return UpbankClient("secret", url=stub.url, **kwargs)
+
+
+def test_get_follows_next_links_on_one_connection(stub, sleeps):
+    stub.script = [
+        (200, {}, lambda s, path: _page(["a", "b"], f"{s.url}/transactions?page[after]=b")),
+        (200, {}, _page(["c"])),
+    ]
+    client = _client(stub)
+    assert [t["id"] for t in client.get("/transactions")] == ["a", "b", "c"]
+    assert stub.authorizations == ["Bearer secret", "Bearer secret"]
+    assert len(stub.peers) == 1, "expected both pages over one kept-alive connection"
+    assert sleeps == []
+
+
+def test_429_honours_retry_after_seconds(stub, sleeps):
+    stub.script = [
+        (429, {"Retry-After": "7"}, {"errors": [{"status": "429"}]}),
+        (200, {}, _page(["a"])),
+    ]
+    assert [t["id"] for t in _client(stub).get("/transactions")] == ["a"]
+    assert sleeps == [7.0]
+
+
+def test_retry_after_is_capped_at_max_backoff(stub, sleeps):
+    stub.script = [
+        (429, {"Retry-After": "86400"}, {"errors": [{"status": "429"}]}),
+        (200, {}, _page(["a"])),
+    ]
+    assert [t["id"] for t in _client(stub).get("/transactions")] == ["a"]
+    assert sleeps == [UpbankClient.MAX_BACKOFF]
+
+
+def test_5xx_retries_with_capped_jittered_backoff(stub, sleeps):
+    stub.script = [
+        (503, {}, {"errors": []}),
+        (502, {}, {"errors": []}),
+        (500, {}, {"errors": []}),
+        (200, {}, _page(["a"])),
+    ]
+    assert [t["id"] for t in _client(stub, backoff=1).get("/transactions")] == ["a"]
+    assert len(sleeps) == 3
+    for attempt, delay in enumerate(sleeps):
+        assert 0 <= delay <= 2 ** attempt
+
+
+def test_gives_up_after_retries_with_click_exception(stub, sleeps):
+    stub.script = [(503, {}, {"errors": [{"status": "503", "title": "Down"}]})] * 3
+    with pytest.raises(click.ClickException, match="HTTP 503"):
+        _client(stub, retries=2).get("/transactions")
+    assert len(stub.requests) == 3
+    assert len(sleeps) == 2
+
+
+def test_401_is_not_retried(stub, sleeps):
+    stub.script = [(401, {}, {"errors": [{"status": "401", "title": "Not Authorized"}]})]
+    with pytest.raises(click.ClickException, match="401 Not Authorized"):
+        _client(stub).get("/transactions")
+    assert sleeps == []
+
+
+def test_connection_failure_is_retried_then_reported(sleeps):
+    # Nothing listens on port 9 (discard) locally; every attempt is refused.
+    client = UpbankClient("secret", url="http://127.0.0.1:9/api/v1", retries=1)
+    with pytest.raises(click.ClickException, match="failed"):
+        client.ping()
+    assert len(sleeps) == 1
+
+
+def test_post_is_retried_after_429_but_not_5xx(stub, sleeps):
+    # A 503 may come after Up registered the webhook: again would make two.
+    stub.script = [(503, {}, {"errors": [{"status": "503", "title": "Down"}]})]
+    with pytest.raises(click.ClickException, match="HTTP 503"):
+        _client(stub).register_webhook("https://example.net/hook")
+    assert len(stub.requests) == 1 and sleeps == []
+
+    stub.script = [
+        (429, {"Retry-After": "2"}, {"errors": [{"status": "429"}]}),
+        (201, {}, {"data": {"id": "w1"}}),
+    ]
+    assert _client(stub).register_webhook("https://example.net/hook") == {"id": "w1"}
+    assert sleeps == [2.0]
+
+
+def test_post_connection_failure_is_not_retried(sleeps):
+    client = UpbankClient("secret", url="http://127.0.0.1:9/api/v1", retries=1)
+    with pytest.raises(click.ClickException, match="failed"):
+        client.register_webhook("https://example.net/hook")
+    assert sleeps == []
+
+
+def test_retry_after_http_date():
+    response = type("Response", (), {"headers": {
+        "Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}})()
+    assert upbank_client._retry_after(response) == 0.0
+
+
+AEST = datetime.timezone(datetime.timedelta(hours=10))
+
+
+def _dt(*args):
+    return datetime.datetime(*args, tzinfo=AEST)
+
+
+def test_windows_split_on_month_starts_newest_first():
+    assert upbank_client._windows(_dt(2025, 11, 15), _dt(2026, 2, 10)) == [
+        (_dt(2026, 2, 1), _dt(2026, 2, 10)),
+        (_dt(2026, 1, 1), _dt(2026, 2, 1)),
+        (_dt(2025, 12, 1), _dt(2026, 1, 1)),
+        (_dt(2025, 11, 15), _dt(2025, 12, 1)),
+    ]
+
+
+def test_windows_of_fixed_length():
+    windows = upbank_client._windows(
+        _dt(2026, 1, 1), _dt(2026, 1, 15), datetime.timedelta(days=7))
+    assert windows == [
+        (_dt(2026, 1, 8), _dt(2026, 1, 15)),
+        (_dt(2026, 1, 1), _dt(2026, 1, 8)),
+    ]
+
+
+def test_transactions_windowed_keeps_order_and_drops_edge_duplicates(monkeypatch):
+    # Each window returns its transactions newest first, and the transaction
+    # created exactly on 1 Feb is returned by both windows either side of it.
+    by_window = {
+        _dt(2026, 2, 1): [{"id": "feb-2"}, {"id": "feb-1"}],
+        _dt(2026, 1, 1): [{"id": "feb-1"}, {"id": "jan-2"}, {"id": "jan-1"}],
+        _dt(2025, 12, 20): [{"id": "dec-1"}],
+    }
+    client = UpbankClient("secret")
+    calls = []
+
+    def fake_transactions(since, until=None, status=None):
+        calls.append((since, until, status))
+        return by_window[since]
+
+    monkeypatch.setattr(client, "transactions", fake_transactions)
+    result = client.transactions_windowed(
+        _dt(2025, 12, 20), _dt(2026, 2, 15), status=upbank_client.SETTLED)
+    assert [t["id"] for t in result] == [
+        "feb-2", "feb-1", "jan-2", "jan-1", "dec-1"]
+    assert sorted(calls) == [
+        (_dt(2025, 12, 20), _dt(2026, 1, 1), "SETTLED"),
+        (_dt(2026, 1, 1), _dt(2026, 2, 1), "SETTLED"),
+        (_dt(2026, 2, 1), _dt(2026, 2, 15), "SETTLED"),
+    ]
+
+
+def test_iter_transactions_yields_first_page_before_fetching_next(stub, sleeps):
+    stub.script = [
+        (200, {}, lambda s, path: _page(["a"], f"{s.url}/transactions?page[after]=a")),
+        (200, {}, _page(["b"])),
+    ]
+    transactions = _client(stub, prefetch=0).iter_transactions(None)
+    assert next(transactions)["id"] == "a"
+    assert len(stub.requests) == 1
+    assert [t["id"] for t in transactions] == ["b"]
+    # The next link carries the query; it is not repeated.
+    assert "size" in stub.requests[0]
+    assert "size" not in stub.requests[1]
+
+
+def test_cli_ndjson_writes_one_transaction_per_line(stub, sleeps, monkeypatch):
+    stub.script = [(200, {}, _page(["a", "b"]))]
+
+    class StubClient(UpbankClient):
+        def __init__(self, token, **kwargs):
+            super().__init__(token, url=stub.url, **kwargs)
+
+    monkeypatch.setattr(upbank_client, "UpbankClient", StubClient)
+    result = CliRunner().invoke(
+        upbank_client.cli, ["held", "--format", "ndjson"],
+        env={"UPBANK_TOKEN": "secret"})
+    assert result.exit_code == 0, result.output
+    assert [json.loads(line)["id"] for line in result.output.splitlines()] == ["a", "b"]
+
+
+def _wait_for(condition, timeout=5):
+    """Poll condition until it is true, or timeout seconds pass."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_prefetch_fetches_next_page_while_caller_holds_current(stub):
+    stub.script = [
+        (200, {}, lambda s, path: _page(["a"], f"{s.url}/t?page=2")),
+        (200, {}, lambda s, path: _page(["b"], f"{s.url}/t?page=3")),
+        (200, {}, lambda s, path: _page(["c"], f"{s.url}/t?page=4")),
+        (200, {}, _page(["d"])),
+    ]
+    pages = _client(stub, prefetch=1).iter_pages("/t")
+    assert next(pages) == [{"id": "a"}]
+    # While we hold page one, page two is fetched and queued, and page three
+    # is fetched but blocks on the full queue; page four must wait.
+    assert _wait_for(lambda: len(stub.requests) == 3)
+    assert not _wait_for(lambda: len(stub.requests) > 3, timeout=0.2)
+    assert [page[0]["id"] for page in pages] == ["b", "c", "d"]
+
+
+def test_prefetch_starts_no_thread_for_a_single_page_or_get(stub, monkeypatch):
+    def no_thread(*args, **kwargs):
+        raise AssertionError("started a prefetch thread")
+    monkeypatch.setattr(upbank_client, "_prefetch", no_thread)
+    stub.script = [
+        (200, {}, _page(["a"])),
+        (200, {}, lambda s, path: _page(["b"], f"{s.url}/t?page=2")),
+        (200, {}, _page(["c"])),
+    ]
+    client = _client(stub, prefetch=1)
+    assert list(client.iter_pages("/t")) == [[{"id": "a"}]]
+    assert [t["id"] for t in client.get("/t")] == ["b", "c"]
+
+
+def test_prefetch_reraises_errors_from_background_fetch(stub, sleeps):
+    stub.script = [
+        (200, {}, lambda s, path: _page(["a"], f"{s.url}/t?page=2")),
+        (401, {}, {"errors": [{"status": "401", "title": "Not Authorized"}]}),
+    ]
+    pages = _client(stub, prefetch=1).iter_pages("/t")
+    assert next(pages) == [{"id": "a"}]
+    with pytest.raises(click.ClickException, match="401"):
+        next(pages)
+
+
+class _ProfileClient(UpbankClient):
+    """Stands in for UpbankClient, returning a transaction tagged by token."""
+
+    def __init__(self, token, **kwargs):
+        self.token = token
+
+    def transactions(self, since, until=None, status=None):
+        return [{"id": f"{self.token}-1"}, {"id": f"{self.token}-2"}]
+
+
+def test_fetch_profiles_fetches_each_token():
+    clients = {"john": _ProfileClient("j"), "fiona": _ProfileClient("f")}
+    result = dict(upbank_client.fetch_profiles(clients, _dt(2026, 1, 1)))
+    assert result == {
+        "john": [{"id": "j-1"}, {"id": "j-2"}],
+        "fiona": [{"id": "f-1"}, {"id": "f-2"}],
+    }
+
+
+def test_cli_household_writes_one_file_per_profile(monkeypatch, tmp_path):
+    monkeypatch.setattr(upbank_client, "UpbankClient", _ProfileClient)
+    result = CliRunner().invoke(
+        upbank_client.cli,
+        ["household", "--profile", "john", "--profile", "joint-acct",
+         "--output-dir", str(tmp_path)],
+        env={"UPBANK_TOKEN": "", "UPBANK_TOKEN_JOHN": "j",
+             "UPBANK_TOKEN_JOINT_ACCT": "x"},
+    )
+    assert result.exit_code == 0, result.output
+    assert json.loads((tmp_path / "john.json").read_text())[0]["id"] == "j-1"
+    assert json.loads((tmp_path / "joint-acct.json").read_text())[0]["id"] == "x-1"
+
+
+def test_cli_household_merged_stream_is_tagged_by_profile(monkeypatch):
+    monkeypatch.setattr(upbank_client, "UpbankClient", _ProfileClient)
+    result = CliRunner().invoke(
+        upbank_client.cli, ["household", "--profile", "john", "--profile", "fiona"],
+        env={"UPBANK_TOKEN_JOHN": "j", "UPBANK_TOKEN_FIONA": "f"},
+    )
+    assert result.exit_code == 0, result.output
+    lines = [json.loads(line) for line in result.output.splitlines()]
+    assert sorted((t["profile"], t["id"]) for t in lines) == [
+        ("fiona", "f-1"), ("fiona", "f-2"), ("john", "j-1"), ("john", "j-2")]
+
+
+def test_cli_household_requires_profile_token(monkeypatch):
+    monkeypatch.setattr(upbank_client, "UpbankClient", _ProfileClient)
+    result = CliRunner().invoke(
+        upbank_client.cli, ["household", "--profile", "nobody"], env={})
+    assert result.exit_code != 0
+    assert "UPBANK_TOKEN_NOBODY" in result.output
+
+
+def _account(id_, name):
+    return {"type": "accounts", "id": id_, "attributes": {"displayName": name}}
+
+
+def test_account_transactions_fetches_each_account_endpoint(stub, sleeps):
+    stub.script = [
+        (200, {}, {"data": [_account("spend", "Spending"), _account("save", "🏠 Home")],
+                   "links": {"next": None}}),
+        (200, {}, lambda s, path: _page([path.split("/")[4]])),
+        (200, {}, lambda s, path: _page([path.split("/")[4]])),
+    ]
+    result = _client(stub, prefetch=0).account_transactions(_dt(2026, 1, 1))
+    assert [(a["id"], [t["id"] for t in ts]) for a, ts in result] == [
+        ("spend", ["spend"]), ("save", ["save"])]
+    assert sorted(r.split("?")[0] for r in stub.requests[1:]) == [
+        "/api/v1/accounts/save/transactions", "/api/v1/accounts/spend/transactions"]
+
+
+def test_account_filename_is_filesystem_safe():
+    assert upbank_client.account_filename(_account("x", "Spending")) == "Spending.json"
+    assert upbank_client.account_filename(_account("x", "🏠 Home Deposit")) == (
+        "Home-Deposit.json")
+    assert upbank_client.account_filename(_account("x", "🏠")) == "x.json"
+
+
+def test_account_filenames_add_the_id_where_names_clash():
+    accounts = [_account("a1", "🏠 Home"), _account("a2", "Home"), _account("a3", "Spending")]
+    assert upbank_client.account_filenames(accounts) == [
+        "Home-a1.json", "Home-a2.json", "Spending.json"]
+
+
+def test_cli_by_account_honours_format_and_workers(tmp_path, monkeypatch):
+    calls = []
+
+    def account_transactions(self, since, until=None, status=None, workers=4):
+        calls.append(workers)
+        return [(_account("a1", "Home"), [{"id": "t1"}, {"id": "t2"}]),
+                (_account("a2", "🏠 Home"), [])]
+
+    monkeypatch.setattr(UpbankClient, "account_transactions", account_transactions)
+    out = tmp_path / "out"
+    result = CliRunner().invoke(
+        upbank_client.cli,
+        ["recent", "30", "--by-account", str(out), "--format", "ndjson", "--workers", "2"],
+        env={"UPBANK_TOKEN": "secret"},
+    )
+    assert result.exit_code == 0, result.output
+    assert calls == [2]
+    assert (out / "Home-a1.json").read_text() == '{"id": "t1"}\n{"id": "t2"}\n'
+    assert (out / "Home-a2.json").read_text() == ""
+
+    result = CliRunner().invoke(
+        upbank_client.cli, ["month", "2026", "5", "--by-account", str(out)],
+        env={"UPBANK_TOKEN": "secret"})
+    assert result.exit_code == 0, result.output
+    assert calls == [2, UpbankClient.WORKERS]
+    assert json.loads((out / "Home-a1.json").read_text()) == [{"id": "t1"}, {"id": "t2"}]
+
+
+def test_categories_cached_within_ttl(stub, sleeps, tmp_path):
+    stub.script = [(200, {}, {"data": [{"id": "groceries"}], "links": {"next": None}})]
+    client = _client(stub, cache_dir=str(tmp_path))
+    assert client.categories() == [{"id": "groceries"}]
+    assert _client(stub, cache_dir=str(tmp_path)).categories() == [{"id": "groceries"}]
+    assert len(stub.requests) == 1
+
+
+def test_accounts_revalidated_with_etag(stub, sleeps, tmp_path):
+    stub.script = [
+        (200, {"ETag": '"v1"'}, {"data": [_account("spend", "Spending")],
+                                  "links": {"next": None}}),
+        (304, {"ETag": '"v1"'}, None),
+    ]
+    client = _client(stub, cache_dir=str(tmp_path))
+    first = client.accounts()
+    assert client.accounts() == first == [_account("spend", "Spending")]
+    assert stub.conditions == [None, '"v1"']
+
+
+def test_fresh_accounts_bypass_the_cache(stub, sleeps, tmp_path):
+    stub.script = [
+        (200, {"ETag": '"v1"'}, {"data": [_account("spend", "Spending")],
+                                  "links": {"next": None}}),
+        (200, {}, {"data": [_account("spend", "Spent")], "links": {"next": None}}),
+    ]
+    client = _client(stub, cache_dir=str(tmp_path))
+    client.accounts()
+    assert client.accounts(fresh=True) == [_account("spend", "Spent")]
+    assert stub.conditions == [None, None]
+
+
+def test_cache_writes_from_threads_do_not_collide(stub, sleeps, tmp_path):
+    stub.script = [(200, {}, {"data": [{"id": "groceries"}], "links": {"next": None}})] * 8
+    client = _client(stub, cache_dir=str(tmp_path))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: client._get_cached("/categories", 0), range(8)))
+    assert results == [[{"id": "groceries"}]] * 8
+    assert [p.suffix for p in (tmp_path / upbank_client.token_digest("secret")).iterdir()] == [
+        ".json"]
+
+
+def test_cache_is_kept_per_token(stub, sleeps, tmp_path):
+    stub.script = [
+        (200, {}, {"data": [{"id": "mine"}], "links": {"next": None}}),
+        (200, {}, {"data": [{"id": "theirs"}], "links": {"next": None}}),
+    ]
+    mine = UpbankClient("mine", url=stub.url, cache_dir=str(tmp_path))
+    theirs = UpbankClient("theirs", url=stub.url, cache_dir=str(tmp_path))
+    assert mine.categories() == [{"id": "mine"}]
+    assert theirs.categories() == [{"id": "theirs"}]
+    assert len(stub.requests) == 2
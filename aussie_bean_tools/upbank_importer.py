@@ -10,11 +10,157 @@ import beangulp
 from beangulp import cache
 
 from .dedup import exact_amount_comparator
+from .extract_cache import ExtractMemo, code_version
 
 # Upbank (up.com.au–Bendigo Bank) only operates in AUD, afaik.
 CURRENCY = "AUD"
 
 
+# The fields of a transaction in the compact format (`upbank --compact`):
+# just the attributes this importer uses, flattened, plus account and
+# category ids in place of the "relationships".
+COMPACT_FIELDS = frozenset({
+    "id", "createdAt", "status", "rawText", "description", "message", "amount",
+    "account", "category",
+})
+
+
+def _check_transaction(trans):
+    """Assert trans looks like a transaction from the Up API, or a compact one."""
+    assert isinstance(trans, dict), "JSON list contains a non-dictionary item."
+    if "attributes" not in trans:
+        assert COMPACT_FIELDS.issubset(trans), "Not a compact transaction."
+        return
+    assert "type" in trans
+    assert "id" in trans
+    assert "attributes" in trans
+    assert "relationships" in trans
+    assert "links" in trans
+
+
+def _account_id(trans):
+    """The id of the Up account the transaction belongs to."""
+    if "attributes" not in trans:
+        return trans["account"]
+    return trans["relationships"]["account"]["data"]["id"]
+
+
+def _first_char(file):
+    """The first non-blank character of the file; "" if there is none.
+
+    Raises:
+        UnicodeDecodeError: if the file does not start as UTF-8 text.
+    """
+    try:
+        return file.head(1024, encoding="utf-8").lstrip()[:1]
+    except StopIteration:
+        # beangulp's head() raises this for an empty file; left to escape,
+        # it would end _read_transactions() with a RuntimeError.
+        return ""
+
+
+def _is_ndjson(file):
+    """True if the file holds one JSON object per line, as `upbank --format ndjson` writes."""
+    return _first_char(file) == "{"
+
+
+# Characters read from a JSON list at a time; only this much, plus the
+# transaction being decoded, is held in memory.
+CHUNK_SIZE = 1 << 16
+
+_DECODER = json.JSONDecoder()
+
+
+class _JsonListReader:
+    """Reads the items of a JSON list from a text file, a chunk at a time."""
+
+    def __init__(self, fileobj, chunk_size):
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+        self.buf, self.pos, self.eof = "", 0, False
+
+    def _fill(self):
+        more = self.fileobj.read(self.chunk_size)
+        self.eof = not more
+        self.buf = self.buf[self.pos:] + more
+        self.pos = 0
+
+    def peek(self):
+        """Skip whitespace; return the next character ("" at the end)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf) or self.eof:
+                return self.buf[self.pos:self.pos + 1]
+            self._fill()
+
+    def take(self, expected):
+        """Consume the next character, which must be one of expected."""
+        char = self.peek()
+        if not char or char not in expected:
+            raise json.JSONDecodeError(f"Expecting one of {expected!r}", self.buf, self.pos)
+        self.pos += 1
+        return char
+
+    def item(self):
+        """Decode the next JSON value."""
+        self.peek()
+        while True:
+            try:
+                item, end = _DECODER.raw_decode(self.buf, self.pos)
+                # Unless it ends before the buffer does, a chunk boundary may
+                # have cut it short (eg: a number).
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return item
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+
+def _iter_json_list(fileobj, chunk_size=CHUNK_SIZE):
+    """Yield each item of the JSON list in fileobj, reading a chunk at a time.
+
+    Raises:
+        json.JSONDecodeError: if the file is not a JSON list.
+    """
+    reader = _JsonListReader(fileobj, chunk_size)
+    reader.take("[")
+    if reader.peek() == "]":
+        return
+    while True:
+        yield reader.item()
+        if reader.take(",]") == "]":
+            return
+
+
+def _read_transactions(file):
+    """Yield the transactions in the file, newest first as downloaded.
+
+    Both a JSON list and NDJSON are read incrementally, so memory use does
+    not grow with the size of the file.
+    """
+    if _first_char(file) == "":
+        return  # Eg: an NDJSON download of a period with no transactions.
+    with open(file.name, encoding="utf-8") as fileobj:
+        if _is_ndjson(file):
+            for line in fileobj:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from _iter_json_list(fileobj)
+
+
+def _amount_number(amount_):
+    """The Decimal of an Up amount, from its integer cents when given."""
+    cents = amount_.get("valueInBaseUnits")
+    if cents is None:
+        return number.D(amount_["value"])
+    # Exact, and already at the currency's two decimal places: 35000 -> 350.00.
+    return number.D(cents).scaleb(-2)
+
+
 class UpbankImporter(beangulp.Importer):
     """Interface that all source importers need to comply with.
     """
@@ -22,14 +168,28 @@ class UpbankImporter(beangulp.Importer):
     # A flag to use on new transaction. Override this flag as you prefer.
     FLAG = beancount.core.flags.FLAG_OKAY
 
-    def __init__(self, account_name="Assets:Bank:Upbank", tags=data.EMPTY_SET):
+    def __init__(self, account_name="Assets:Bank:Upbank", tags=data.EMPTY_SET,
+                 account_id=None, cache_dir=None):
         """
         Args:
             account_name: beancount account name for the upbank account.
             tags: set of tags to apply to every transaction.
+            account_id: Up's id for the account; if given, only files of that
+                account's transactions are identified, and only its rows are
+                extracted (eg: from `upbank recent --by-account DIR`).
+            cache_dir: directory to keep extracted entries in between runs, so
+                unchanged files are not parsed again; or None.
         """
         self.account_name = account_name
         self.tags = tags
+        self.account_id = account_id
+        # Entries already extracted, per file, for date() and repeat calls.
+        self._memo = ExtractMemo(cache_dir, config=(
+            type(self).__name__, account_name, sorted(tags), account_id,
+            code_version(type(self))))
+
+    def _owns(self, trans):
+        return self.account_id is None or _account_id(trans) == self.account_id
 
     # Upbank posts exact amounts, so only exactly-equal amounts are duplicates
     # (see dedup.exact_amount_comparator); a percentage tolerance would falsely
@@ -50,19 +210,14 @@ class UpbankImporter(beangulp.Importer):
         """
         file = cache.get_file(filepath)
         try:
-            # Is a json file with specific structure and attributes.
-            transactions = json.loads(file.contents())
-            assert isinstance(transactions, list), "JSON file is not a list of transactions."
-            assert len(transactions) > 0, "JSON list of transactions is empty"
-            for trans in transactions:
-                assert isinstance(trans, dict), "JSON list contains a non-dictionary item."
-                assert "type" in trans
-                assert "id" in trans
-                assert "attributes" in trans
-                assert "relationships" in trans
-                assert "links" in trans
-            return True
-        except json.JSONDecodeError:
+            # Sniff the first bytes, then decode only the first transaction:
+            # beangulp asks every importer about every file in the directory.
+            if _first_char(file) not in ("[", "{"):
+                return False
+            first = next(_read_transactions(file))
+            _check_transaction(first)
+            return self._owns(first)
+        except (json.JSONDecodeError, UnicodeDecodeError, StopIteration):
             pass
         except AssertionError:
             pass
@@ -81,26 +236,28 @@ class UpbankImporter(beangulp.Importer):
           A list of new, imported directives (usually mostly Transactions)
           extracted from the file.
         """
+        return self._memo.get(filepath, self._extract)
+
+    def _extract(self, filepath):
         file = cache.get_file(filepath)
-        # Open the file as json
-        transactions = json.loads(file.contents())
         entries = []
 
-        for trans in reversed(transactions):
+        for trans in _read_transactions(file):
+            if not self._owns(trans):
+                continue
             trans_id = trans['id']   # Could be used to flag "__duplicate__"s.
-            date_ = date.fromisoformat(trans['attributes']['createdAt'][:10])
-            raw_text = trans['attributes']['rawText']
-            description = trans['attributes']['description']
-            message = trans['attributes']['message']
+            # Compact transactions hold the attributes at the top level.
+            attributes = trans.get('attributes', trans)
+            date_ = date.fromisoformat(attributes['createdAt'][:10])
+            raw_text = attributes['rawText']
+            description = attributes['description']
+            message = attributes['message']
             if message is not None and len(message):
                 if raw_text is None or raw_text == description:
                     raw_text = message
                 else:
                     raw_text += " " + message
-            value = amount.Amount(
-                beancount.core.number.D(trans['attributes']['amount']['value']),
-                CURRENCY
-            )
+            value = amount.Amount(_amount_number(attributes['amount']), CURRENCY)
             posting = data.Posting(self.account_name, value, None, None, None, None)
             txn = data.Transaction(
                 meta=data.new_metadata(file.name, trans_id),
@@ -114,6 +271,9 @@ class UpbankImporter(beangulp.Importer):
             )
             entries.append(txn)
 
+        # Up lists the newest first; put them in date order.
+        entries.reverse()
+
         # I'd like to insert a balance line somehow but 'balance' is a vague concept
         # to upbank... does it include settled, pending, and cleared amounts?
         # The api-fetch can only snapshot a 'balance' at the moment of asking.
@@ -164,5 +324,6 @@ class UpbankImporter(beangulp.Importer):
           (If no date is returned, the file creation time is used. This is the
           default.)
         """
-        # Date of last transaction in the file.
-        return self.extract(filepath)[-1].date
+        # Date of last transaction in the file, from the memoized extraction.
+        entries = self._memo.get(filepath, self._extract)
+        return entries[-1].date if entries else None
@@ -0,0 +1,283 @@
+"""A local stand-in for the Up Bank API.
+
+Serves a synthetic transaction history with Up's pagination (links.next),
+filters, errors and rate limiting, so UpbankClient can be tested and
+benchmarked without the real API or a real token.
+
+Transactions are generated from their index on demand, newest first, so a
+history of a million costs no more memory than one of a thousand.
+
+    with MockUpServer(transactions=10_000, latency=0.02) as server:
+        client = UpbankClient(server.token, url=server.url)
+        client.get_recent(365)
+"""
+import datetime
+import http.server
+import json
+import random
+import threading
+import time
+import urllib.parse
+
+ACCOUNTS = [
+    ("mock-spending", "Spending", "TRANSACTIONAL"),
+    ("mock-saver", "Rainy Day", "SAVER"),
+]
+
+CATEGORIES = ["groceries", "restaurants-and-cafes", "fuel", "utilities"]
+
+# Up's page size when page[size] is not given.
+DEFAULT_PAGE_SIZE = 10
+
+
+class MockUpServer(http.server.ThreadingHTTPServer):
+    """An HTTP server on localhost pretending to be api.up.com.au."""
+
+    daemon_threads = True
+
+    def __init__(self, transactions: int = 1000, span: datetime.timedelta = None,
+                 latest: datetime.datetime = None, held: int = 0, latency: float = 0,
+                 rate_limit_every: int = 0, error_rate: float = 0,
+                 token: str = "mock-token", seed: int = 0, port: int = 0):
+        """
+        transactions: size of the synthetic history.
+        span: time from the oldest to the newest transaction; default a year.
+        latest: createdAt of the newest transaction; default now.
+        held: how many of the newest transactions are HELD; the rest SETTLED.
+        latency: seconds to wait before answering each request.
+        rate_limit_every: answer every Nth request 429 (with Retry-After: 0).
+        error_rate: fraction of requests to answer 503 at random.
+        token: the only token accepted; anything else is 401.
+        seed: for the random errors.
+        port: to listen on; 0 picks a free one.
+        """
+        super().__init__(("127.0.0.1", port), MockUpHandler)
+        self.count = transactions
+        span = span or datetime.timedelta(days=365)
+        self.step = span / max(transactions - 1, 1)
+        self.latest = latest or datetime.datetime.now(
+            datetime.timezone(datetime.timedelta(hours=10))).replace(microsecond=0)
+        self.held = held
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.error_rate = error_rate
+        self.token = token
+        self.random = random.Random(seed)
+        self.url = f"http://127.0.0.1:{self.server_port}/api/v1"
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(
+            target=self.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+    def created_at(self, index: int) -> datetime.datetime:
+        return self.latest - index * self.step
+
+    def transaction(self, index: int) -> dict:
+        """The synthetic transaction at index (0 is the newest)."""
+        account_id = ACCOUNTS[index % len(ACCOUNTS)][0]
+        transaction_id = f"mock-{index:08d}"
+        created_at = self.created_at(index).isoformat()
+        cents = -((index * 7919) % 20000 + 1)
+        status = "HELD" if index < self.held else "SETTLED"
+        return {
+            "type": "transactions",
+            "id": transaction_id,
+            "attributes": {
+                "status": status,
+                "rawText": f"MOCK MERCHANT {index % 97}",
+                "description": f"Mock Merchant {index % 97}",
+                "message": None,
+                "isCategorizable": True,
+                "holdInfo": None,
+                "roundUp": None,
+                "cashback": None,
+                "amount": {
+                    "currencyCode": "AUD",
+                    "value": f"{cents / 100:.2f}",
+                    "valueInBaseUnits": cents,
+                },
+                "foreignAmount": None,
+                "cardPurchaseMethod": None,
+                "settledAt": None if status == "HELD" else created_at,
+                "createdAt": created_at,
+                "transactionType": "Purchase",
+                "note": None,
+                "performingCustomer": {"displayName": "Mock"},
+                "deepLinkURL": f"up://transaction/{transaction_id}",
+            },
+            "relationships": {
+                "account": {
+                    "data": {"type": "accounts", "id": account_id},
+                    "links": {"related": f"{self.url}/accounts/{account_id}"},
+                },
+                "transferAccount": {"data": None},
+                "category": {
+                    "data": {"type": "categories",
+                             "id": CATEGORIES[index % len(CATEGORIES)]},
+                    "links": {"self": f"{self.url}/transactions/{transaction_id}"
+                                      f"/relationships/category"},
+                },
+                "parentCategory": {"data": None},
+                "tags": {"data": [], "links": {
+                    "self": f"{self.url}/transactions/{transaction_id}/relationships/tags"}},
+            },
+            "links": {"self": f"{self.url}/transactions/{transaction_id}"},
+        }
+
+    def index_range(self, since=None, until=None, status=None):
+        """The [lo, hi) indexes of the transactions matching the filters."""
+        lo, hi = 0, self.count
+        if until is not None:
+            # createdAt < until
+            lo = max(lo, _ceil_div(self.latest - until, self.step))
+            if self.created_at(lo) >= until:
+                lo += 1
+        if since is not None:
+            # createdAt >= since
+            hi = min(hi, (self.latest - since) // self.step + 1)
+        if status == "HELD":
+            hi = min(hi, self.held)
+        elif status == "SETTLED":
+            lo = max(lo, self.held)
+        return max(lo, 0), max(hi, 0)
+
+
+def _ceil_div(a, b):
+    return -(-a // b)
+
+
+class MockUpHandler(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"  # keep-alive
+    # Headers and body go out in separate writes; without this, Nagle's
+    # algorithm holds the body back for the client's delayed ACK (~40ms).
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        server = self.server
+        with server._lock:
+            server.requests += 1
+            number = server.requests
+            failing = server.error_rate and server.random.random() < server.error_rate
+        if server.latency:
+            time.sleep(server.latency)
+        if self.headers.get("Authorization") != f"Bearer {server.token}":
+            return self._error(401, "Not Authorized", "The request was not authenticated.")
+        if server.rate_limit_every and number % server.rate_limit_every == 0:
+            return self._error(429, "Too Many Requests", "Slow down.",
+                               headers={"Retry-After": "0"})
+        if failing:
+            return self._error(503, "Service Unavailable", "Mock outage.")
+
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        parts = url.path.rstrip("/").split("/")[3:]  # after /api/v1
+        if parts == ["util", "ping"]:
+            return self._send(200, {"meta": {"id": "mock", "statusEmoji": "⚡️"}})
+        if parts == ["accounts"]:
+            return self._send(200, {"data": [_account(*a) for a in ACCOUNTS],
+                                    "links": {"prev": None, "next": None}})
+        if parts == ["categories"]:
+            return self._send(200, {"data": [
+                {"type": "categories", "id": c, "attributes": {"name": c}}
+                for c in CATEGORIES]})
+        if parts == ["transactions"]:
+            return self._transactions(url.path, query)
+        if len(parts) == 3 and parts[0] == "accounts" and parts[2] == "transactions":
+            account_ids = [account_id for account_id, _, _ in ACCOUNTS]
+            if parts[1] not in account_ids:
+                return self._error(404, "Not Found", "No such account.")
+            return self._transactions(url.path, query, account_ids.index(parts[1]))
+        if len(parts) == 2 and parts[0] == "transactions":
+            index = _index(parts[1])
+            if index is None or not 0 <= index < server.count:
+                return self._error(404, "Not Found", "No such transaction.")
+            return self._send(200, {"data": server.transaction(index)})
+        return self._error(404, "Not Found", f"No route for {url.path}.")
+
+    def _transactions(self, path, query, account=None):
+        server = self.server
+        try:
+            size = int(query.get("page[size]", DEFAULT_PAGE_SIZE))
+            since = _parse_time(query.get("filter[since]"))
+            until = _parse_time(query.get("filter[until]"))
+        except ValueError as exc:
+            return self._error(400, "Invalid Parameter", str(exc))
+        lo, hi = server.index_range(since, until, query.get("filter[status]"))
+        after = _index(query.get("page[after]", ""))
+        start = lo if after is None else max(lo, after + 1)
+        indexes = []
+        for index in range(start, hi):
+            if account is None or index % len(ACCOUNTS) == account:
+                indexes.append(index)
+                if len(indexes) == size:
+                    break
+        next_url = None
+        if indexes and any(
+                account is None or i % len(ACCOUNTS) == account
+                for i in range(indexes[-1] + 1, min(hi, indexes[-1] + 1 + len(ACCOUNTS)))):
+            next_query = dict(query, **{"page[after]": f"mock-{indexes[-1]:08d}"})
+            next_url = (f"http://127.0.0.1:{server.server_port}{path}?"
+                        + urllib.parse.urlencode(next_query))
+        self._send(200, {
+            "data": [server.transaction(i) for i in indexes],
+            "links": {"prev": None, "next": next_url},
+        })
+
+    def _error(self, status, title, detail, headers=None):
+        self._send(status, {"errors": [
+            {"status": str(status), "title": title, "detail": detail}]}, headers)
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def _account(account_id, name, account_type):
+    return {
+        "type": "accounts",
+        "id": account_id,
+        "attributes": {
+            "displayName": name,
+            "accountType": account_type,
+            "ownershipType": "INDIVIDUAL",
+            "balance": {"currencyCode": "AUD", "value": "1234.56",
+                        "valueInBaseUnits": 123456},
+            "createdAt": "2020-01-01T00:00:00+10:00",
+        },
+    }
+
+
+def _index(transaction_id):
+    """The index of a synthetic transaction id ("mock-00000042"); or None."""
+    if not transaction_id.startswith("mock-"):
+        return None
+    try:
+        return int(transaction_id[5:])
+    except ValueError:
+        return None
+
+
+def _parse_time(value):
+    """Parse an RFC 3339 filter value; requests sends datetimes with a space."""
+    if value is None:
+        return None
+    return datetime.datetime.fromisoformat(value)
@@ -0,0 +1,84 @@
+import datetime
+
+import click
+import pytest
+
+from . import upbank_bench
+from .upbank_client import UpbankClient
+from .upbank_mock import ACCOUNTS, MockUpServer
+
+AEST = datetime.timezone(datetime.timedelta(hours=10))
+LATEST = datetime.datetime(2026, 6, 30, 12, 0, tzinfo=AEST)
+
+
+@pytest.fixture
+def server():
+    with MockUpServer(transactions=250, span=datetime.timedelta(days=249),
+                      latest=LATEST, held=3) as server:
+        yield server
+
+
+def _client(server, **kwargs):
+    return UpbankClient(server.token, url=server.url, backoff=0, **kwargs)
+
+
+def test_follows_links_next_through_every_page(server):
+    transactions = _client(server).transactions(LATEST - datetime.timedelta(days=365))
+    assert [t["id"] for t in transactions] == [f"mock-{i:08d}" for i in range(250)]
+    assert server.requests == 3  # 100 a page
+
+
+def test_since_and_until_filters(server):
+    since = datetime.datetime(2026, 6, 1, tzinfo=AEST)
+    until = datetime.datetime(2026, 6, 10, tzinfo=AEST)
+    transactions = _client(server).transactions(since, until)
+    created = [datetime.datetime.fromisoformat(t["attributes"]["createdAt"])
+               for t in transactions]
+    assert len(created) == 9  # One a day.
+    assert all(since <= c < until for c in created)
+    assert created == sorted(created, reverse=True)
+
+
+def test_status_filter(server):
+    client = _client(server)
+    since = LATEST - datetime.timedelta(days=365)
+    assert [t["id"] for t in client.transactions(since, status="HELD")] == [
+        "mock-00000000", "mock-00000001", "mock-00000002"]
+    assert len(client.transactions(since, status="SETTLED")) == 247
+
+
+def test_account_transactions(server):
+    client = _client(server)
+    since = LATEST - datetime.timedelta(days=365)
+    (spending, spent), (saver, saved) = client.account_transactions(since)
+    assert [spending["id"], saver["id"]] == [a[0] for a in ACCOUNTS]
+    assert len(spent) == len(saved) == 125
+    assert {t["relationships"]["account"]["data"]["id"] for t in saved} == {"mock-saver"}
+
+
+def test_single_transaction(server):
+    client = _client(server)
+    assert client.transaction("mock-00000007")["id"] == "mock-00000007"
+    assert client.transaction("mock-99999999", missing_ok=True) is None
+
+
+def test_retries_rate_limited_requests():
+    with MockUpServer(transactions=500, latest=LATEST, rate_limit_every=2) as server:
+        transactions = _client(server).transactions(LATEST - datetime.timedelta(days=366))
+        assert len(transactions) == 500
+        assert server.requests == 9  # 5 pages, and a 429 between each.
+
+
+def test_wrong_token_is_unauthorised(server):
+    assert UpbankClient("wrong", url=server.url).ping().status_code == 401
+    with pytest.raises(click.ClickException, match="401"):
+        UpbankClient("wrong", url=server.url).accounts()
+
+
+def test_benchmark_run_reports_pages_and_memory():
+    with MockUpServer(transactions=300, span=upbank_bench.SPAN) as server:
+        result = upbank_bench.run(server, "recent", "serial", memory=True)
+    assert result["transactions"] == 300
+    assert result["pages"] == 3
+    assert result["pages_per_sec"] > 0
+    assert result["peak_bytes"] > 0
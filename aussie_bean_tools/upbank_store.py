@@ -0,0 +1,192 @@
+"""Local store of Up Bank transactions.
+
+Keeps every transaction fetched from Up in a SQLite file, keyed by id, so
+routine downloads only need to ask Up for what is new since the last sync.
+"""
+import datetime
+import json
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,  -- UTC ISO 8601, so it sorts as text
+    status TEXT,
+    json TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transactions_created_at ON transactions (created_at);
+CREATE TABLE IF NOT EXISTS held (
+    id TEXT PRIMARY KEY  -- HELD transactions waiting to settle
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Re-fetch this far behind the high-water mark on each sync, to pick up
+# transactions that changed after we last saw them (eg: HELD -> SETTLED).
+OVERLAP = datetime.timedelta(days=7)
+
+
+def _utc(value):
+    """Return an ISO 8601 timestamp (or tzaware datetime) as a UTC ISO string."""
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    return value.astimezone(datetime.timezone.utc).isoformat()
+
+
+class UpbankStore:
+    def __init__(self, path: str):
+        """
+        path: str: SQLite file to keep the transactions in; created if missing.
+        """
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def save(self, transactions: list) -> int:
+        """Insert or replace transactions (dicts, as Up returns them).
+
+        Returns:
+            int: the number of transactions saved.
+        """
+        rows = [
+            (
+                trans["id"],
+                _utc(trans["attributes"]["createdAt"]),
+                trans["attributes"].get("status"),
+                json.dumps(trans),
+            )
+            for trans in transactions
+        ]
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO transactions (id, created_at, status, json) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def delete(self, transaction_ids: list) -> int:
+        """Remove transactions (eg: ones Up has deleted) by id.
+
+        Returns:
+            int: the number of transactions removed.
+        """
+        ids = [(i,) for i in transaction_ids]
+        with self.db:
+            before = self.db.total_changes
+            self.db.executemany("DELETE FROM transactions WHERE id = ?", ids)
+            removed = self.db.total_changes - before
+            self.db.executemany("DELETE FROM held WHERE id = ?", ids)
+        return removed
+
+    def high_water_mark(self):
+        """Return the tzaware createdAt of the newest synced transaction; or None."""
+        row = self.db.execute(
+            "SELECT value FROM meta WHERE key = 'high_water_mark'").fetchone()
+        return datetime.datetime.fromisoformat(row[0]) if row else None
+
+    def _set_high_water_mark(self):
+        row = self.db.execute("SELECT MAX(created_at) FROM transactions").fetchone()
+        if row[0] is not None:
+            with self.db:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) "
+                    "VALUES ('high_water_mark', ?)",
+                    (row[0],),
+                )
+
+    def sync(self, client, overlap: datetime.timedelta = OVERLAP) -> int:
+        """Fetch transactions from Up that are new since the last sync.
+
+        The first sync fetches the whole history. Later syncs fetch from the
+        high-water mark, less overlap, and replace any that changed.
+
+        Args:
+            client: UpbankClient to fetch with.
+            overlap: how far behind the high-water mark to re-fetch.
+
+        Returns:
+            int: the number of transactions fetched.
+        """
+        mark = self.high_water_mark()
+        since = None if mark is None else mark - overlap
+        count = self.save(client.transactions(since))
+        self._set_high_water_mark()
+        return count
+
+    def held_ids(self) -> set:
+        """Return the ids of the transactions last seen HELD."""
+        return {row[0] for row in self.db.execute("SELECT id FROM held")}
+
+    def reconcile_held(self, client, since: datetime.datetime):
+        """Find which of the HELD transactions seen before have settled.
+
+        Fetches the currently HELD transactions since `since`, and then only
+        those previously held ones that are no longer in that list, one by
+        one, to see whether they settled or disappeared. The settled and
+        newly held transactions are saved to the store.
+
+        Args:
+            client: UpbankClient to fetch with.
+            since: tzaware datetime to look for HELD transactions from.
+
+        Returns:
+            (settled transactions, disappeared ids, number still held)
+        """
+        held = client.transactions(since, status="HELD")
+        held_now = {trans["id"] for trans in held}
+        settled = []
+        disappeared = []
+        for transaction_id in sorted(self.held_ids() - held_now):
+            trans = client.transaction(transaction_id, missing_ok=True)
+            if trans is None:
+                disappeared.append(transaction_id)
+            elif trans["attributes"]["status"] == "HELD":
+                held_now.add(transaction_id)  # Still held, but older than since.
+            else:
+                settled.append(trans)
+        self.save(held + settled)
+        with self.db:
+            self.db.executemany(
+                "DELETE FROM transactions WHERE id = ?", [(i,) for i in disappeared])
+            self.db.execute("DELETE FROM held")
+            self.db.executemany(
+                "INSERT INTO held (id) VALUES (?)", [(i,) for i in held_now])
+        return settled, disappeared, len(held_now)
+
+    def transactions(
+        self, since: datetime.datetime, until: datetime.datetime = None,
+        status: str = None,
+    ) -> list:
+        """Return stored transactions, like UpbankClient.transactions().
+
+        Args:
+            since: tzaware datetime to start from
+            until: tzaware datetime to stop at; or None for all.
+            status: "HELD" or "SETTLED"
+
+        Returns:
+            list of transactions in dict format, newest first.
+        """
+        sql = "SELECT json FROM transactions WHERE created_at >= ?"
+        params = [_utc(since)]
+        if until is not None:
+            sql += " AND created_at < ?"
+            params.append(_utc(until))
+        if status is not None:
+            sql += " AND status = ?"
+            params.append(status)
+        sql += " ORDER BY created_at DESC, id DESC"
+        return [json.loads(row[0]) for row in self.db.execute(sql, params)]
@@ -0,0 +1,157 @@
+import datetime
+import json
+
+from click.testing import CliRunner
+
+from aussie_bean_tools import upbank_client
+from aussie_bean_tools.upbank_store import OVERLAP, UpbankStore
+
+AEST = datetime.timezone(datetime.timedelta(hours=10))
+
+
+def _trans(id_, created_at, status="SETTLED", value="-1.00"):
+    return {
+        "type": "transactions",
+        "id": id_,
+        "attributes": {
+            "status": status,
+            "createdAt": created_at,
+            "amount": {"value": value},
+        },
+    }
+
+
+class _FakeClient:
+    def __init__(self, *batches):
+        self.batches = list(batches)
+        self.calls = []
+
+    def transactions(self, since=None, until=None, status=None):
+        self.calls.append(since)
+        return self.batches.pop(0)
+
+
+def test_first_sync_fetches_everything_and_records_high_water_mark(tmp_path):
+    client = _FakeClient([
+        _trans("b", "2026-05-02T09:00:00+10:00"),
+        _trans("a", "2026-05-01T09:00:00+10:00"),
+    ])
+    with UpbankStore(str(tmp_path / "up.sqlite")) as store:
+        assert store.sync(client) == 2
+        assert client.calls == [None]
+        assert store.high_water_mark() == datetime.datetime(
+            2026, 5, 2, 9, tzinfo=AEST)
+
+
+def test_later_sync_fetches_from_high_water_mark_less_overlap(tmp_path):
+    client = _FakeClient(
+        [_trans("a", "2026-05-01T09:00:00+10:00", status="HELD")],
+        [_trans("b", "2026-05-03T09:00:00+10:00"),
+         _trans("a", "2026-05-01T09:00:00+10:00", status="SETTLED")],
+    )
+    with UpbankStore(str(tmp_path / "up.sqlite")) as store:
+        store.sync(client)
+        store.sync(client)
+        assert client.calls[1] == datetime.datetime(
+            2026, 5, 1, 9, tzinfo=AEST) - OVERLAP
+        since = datetime.datetime(2026, 5, 1, tzinfo=AEST)
+        stored = store.transactions(since)
+        assert [t["id"] for t in stored] == ["b", "a"]
+        assert stored[1]["attributes"]["status"] == "SETTLED"
+
+
+def test_transactions_filters_range_and_status_across_utc_offsets(tmp_path):
+    with UpbankStore(str(tmp_path / "up.sqlite")) as store:
+        store.save([
+            _trans("apr", "2026-04-30T22:00:00+10:00"),
+            _trans("may-held", "2026-05-10T12:00:00+10:00", status="HELD"),
+            # 1 May 00:30 in +11:00 is 30 April 13:30 UTC; still in May locally.
+            _trans("may", "2026-05-01T00:30:00+11:00"),
+            _trans("jun", "2026-06-01T00:00:00+10:00"),
+        ])
+        since = datetime.datetime(2026, 5, 1, tzinfo=datetime.timezone(
+            datetime.timedelta(hours=11)))
+        until = datetime.datetime(2026, 6, 1, tzinfo=AEST)
+        assert [t["id"] for t in store.transactions(since, until)] == [
+            "may-held", "may"]
+        assert [t["id"] for t in store.transactions(since, until, "SETTLED")] == [
+            "may"]
+
+
+def test_cli_month_from_store_makes_no_network_calls(tmp_path, monkeypatch):
+    path = str(tmp_path / "up.sqlite")
+    with UpbankStore(path) as store:
+        store.save([_trans("a", "2026-05-15T12:00:00+10:00")])
+
+    def no_network(*args, **kwargs):
+        raise AssertionError("should not call Up")
+
+    monkeypatch.setattr(upbank_client.UpbankClient, "_request", no_network)
+    result = CliRunner().invoke(
+        upbank_client.cli,
+        ["--store", path, "month", "--from-store", "2026", "5"],
+        env={"UPBANK_TOKEN": "secret"},
+    )
+    assert result.exit_code == 0, result.output
+    assert [t["id"] for t in json.loads(result.output)] == ["a"]
+
+
+def test_cli_by_account_rejects_from_store(tmp_path, monkeypatch):
+    def no_network(*args, **kwargs):
+        raise AssertionError("should not call Up")
+
+    monkeypatch.setattr(upbank_client.UpbankClient, "_request", no_network)
+    for command in (["month", "2026", "5"], ["recent", "30"]):
+        result = CliRunner().invoke(
+            upbank_client.cli,
+            ["--store", str(tmp_path / "up.sqlite")] + command
+            + ["--from-store", "--by-account", str(tmp_path / "out")],
+            env={"UPBANK_TOKEN": "secret"},
+        )
+        assert result.exit_code == 2, result.output
+        assert "can't be used with --from-store" in result.output
+    assert not (tmp_path / "out").exists()
+
+
+class _HeldClient:
+    """Serves a current HELD list, and single transactions by id."""
+
+    def __init__(self, held, by_id=None):
+        self.held = held
+        self.by_id = by_id or {}
+        self.fetched = []
+
+    def transactions(self, since=None, until=None, status=None):
+        assert status == "HELD"
+        return self.held
+
+    def transaction(self, transaction_id, missing_ok=False):
+        self.fetched.append(transaction_id)
+        return self.by_id.get(transaction_id)
+
+
+def test_reconcile_held_reports_settled_and_disappeared(tmp_path):
+    since = datetime.datetime(2026, 5, 1, tzinfo=AEST)
+    with UpbankStore(str(tmp_path / "up.sqlite")) as store:
+        first = _HeldClient([
+            _trans("coffee", "2026-05-02T09:00:00+10:00", status="HELD"),
+            _trans("hotel", "2026-05-02T10:00:00+10:00", status="HELD"),
+            _trans("fuel", "2026-05-02T11:00:00+10:00", status="HELD"),
+        ])
+        assert store.reconcile_held(first, since) == ([], [], 3)
+        assert first.fetched == []
+
+        settled_coffee = _trans("coffee", "2026-05-02T09:00:00+10:00", status="SETTLED")
+        second = _HeldClient(
+            [_trans("fuel", "2026-05-02T11:00:00+10:00", status="HELD")],
+            by_id={"coffee": settled_coffee},  # hotel's hold was released
+        )
+        settled, disappeared, still_held = store.reconcile_held(second, since)
+        assert settled == [settled_coffee]
+        assert disappeared == ["hotel"]
+        assert still_held == 1
+        # Only the transactions that left the HELD list were fetched.
+        assert sorted(second.fetched) == ["coffee", "hotel"]
+        assert store.held_ids() == {"fuel"}
+        assert {t["id"]: t["attributes"]["status"] for t in store.transactions(since)} == {
+            "coffee": "SETTLED", "fuel": "HELD"}
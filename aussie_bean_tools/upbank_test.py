@@ -1,8 +1,12 @@
+import io
+import json
 import logging
 import os
 
 import pytest
 from aussie_bean_tools import UpbankImporter
+from aussie_bean_tools.upbank_client import compact
+from aussie_bean_tools.upbank_importer import _iter_json_list
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -18,3 +22,142 @@ def test_identify(importer):
     test_file = os.path.join(os.path.dirname(__file__), 'testdata/upbank.json')
     result = importer.identify(test_file)
     assert result is True
+
+
+def _write_ndjson(tmp_path):
+    """Rewrite the json test file as NDJSON, as `upbank --format ndjson` does."""
+    with open(os.path.join(os.path.dirname(__file__), 'testdata/upbank.json')) as f:
+        transactions = json.load(f)
+    path = tmp_path / 'upbank.ndjson'
+    path.write_text(''.join(json.dumps(t) + '\n' for t in transactions))
+    return str(path)
+
+
+def test_identify_ndjson(importer, tmp_path):
+    assert importer.identify(_write_ndjson(tmp_path)) is True
+
+
+def test_extract_ndjson_matches_json(importer, tmp_path):
+    test_file = os.path.join(os.path.dirname(__file__), 'testdata/upbank.json')
+    from_json = importer.extract(test_file)
+    from_ndjson = importer.extract(_write_ndjson(tmp_path))
+    assert len(from_ndjson) == len(from_json) > 0
+    for a, b in zip(from_json, from_ndjson):
+        assert a._replace(meta=None) == b._replace(meta=None)
+    assert [e.date for e in from_ndjson] == sorted(e.date for e in from_ndjson)
+
+
+def test_identify_rejects_other_ndjson(importer, tmp_path):
+    path = tmp_path / 'other.ndjson'
+    path.write_text('{"hello": "world"}\n')
+    assert importer.identify(str(path)) is False
+
+
+def test_account_id_identifies_only_own_account(tmp_path):
+    test_file = os.path.join(os.path.dirname(__file__), 'testdata/upbank.json')
+    owner = UpbankImporter(account_id='20d89043-9d06-48cd-bb8c-b03d3f32423f')
+    other = UpbankImporter(account_id='some-saver')
+    assert owner.identify(test_file) is True
+    assert other.identify(test_file) is False
+    assert len(owner.extract(test_file)) > 0
+    assert other.extract(test_file) == []
+
+
+def test_compact_export_identifies_and_extracts_the_same(importer, tmp_path):
+    test_file = os.path.join(os.path.dirname(__file__), 'testdata/upbank.json')
+    with open(test_file) as f:
+        transactions = json.load(f)
+    path = tmp_path / 'upbank-compact.json'
+    path.write_text(json.dumps([compact(t) for t in transactions]))
+    assert path.stat().st_size * 3 < os.path.getsize(test_file)
+    assert importer.identify(str(path)) is True
+    owner = UpbankImporter(account_id='20d89043-9d06-48cd-bb8c-b03d3f32423f')
+    assert owner.identify(str(path)) is True
+    from_full = importer.extract(test_file)
+    from_compact = importer.extract(str(path))
+    assert [e._replace(meta=None) for e in from_full] == [
+        e._replace(meta=None) for e in from_compact]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 7, 64, 1 << 16])
+def test_iter_json_list_matches_json_loads(chunk_size):
+    text = json.dumps([{'a': 1, 's': 'x, ] }'}, 12345, [1, [2]], 'é', None, {}]) + '\n'
+    items = list(_iter_json_list(io.StringIO(text), chunk_size))
+    assert items == json.loads(text)
+    assert list(_iter_json_list(io.StringIO(' [ ] '), chunk_size)) == []
+
+
+@pytest.mark.parametrize('text', ['', '{}', '[1 2]', '[{"a": 1}', '[1,'])
+def test_iter_json_list_rejects_other_json(text):
+    with pytest.raises(json.JSONDecodeError):
+        list(_iter_json_list(io.StringIO(text), 2))
+
+
+def test_identify_reads_only_the_first_transaction(importer, tmp_path):
+    test_file = os.path.join(os.path.dirname(__file__), 'testdata/upbank.json')
+    with open(test_file) as f:
+        first = json.load(f)[0]
+    path = tmp_path / 'truncated.json'
+    # A huge download, cut off: identify never gets as far as the end.
+    path.write_text('[' + json.dumps(first) + ', ' + 'x' * 200_000)
+    assert importer.identify(str(path)) is True
+    assert importer.identify(os.path.join(os.path.dirname(__file__),
+                                          'testdata/training.beancount')) is False
+
+
+def test_empty_file_is_not_identified_and_extracts_nothing(importer, tmp_path):
+    path = tmp_path / 'empty.ndjson'
+    path.write_text('')
+    assert importer.identify(str(path)) is False
+    assert importer.extract(str(path)) == []
+
+
+def test_amounts_come_from_integer_base_units(importer, tmp_path):
+    test_file = os.path.join(os.path.dirname(__file__), 'testdata/upbank.json')
+    with open(test_file) as f:
+        trans = compact(json.load(f)[0])
+    trans['amount'] = {'value': '-6.95', 'valueInBaseUnits': -695}
+    without_base_units = dict(trans, id='other', amount={'value': '-7.08'})
+    path = tmp_path / 'upbank.json'
+    path.write_text(json.dumps([trans, without_base_units]))
+    amounts = [e.postings[0].units.number for e in importer.extract(str(path))]
+    assert [str(a) for a in amounts] == ['-7.08', '-6.95']
+
+
+def test_extraction_is_memoized_per_file_content(importer, tmp_path, monkeypatch):
+    path = _write_ndjson(tmp_path)
+    calls = []
+    real_extract = UpbankImporter._extract
+    monkeypatch.setattr(UpbankImporter, '_extract',
+                        lambda self, f: calls.append(f) or real_extract(self, f))
+    entries = importer.extract(path)
+    assert importer.date(path) == entries[-1].date
+    os.utime(path)  # Touched, but unchanged.
+    assert importer.extract(path) == entries
+    assert len(calls) == 1
+
+    # Marking duplicates in one result does not leak into the next.
+    entries[0].meta['__duplicate__'] = True
+    assert '__duplicate__' not in importer.extract(path)[0].meta
+
+
+def test_persistent_cache_skips_parsing_unchanged_files(tmp_path, monkeypatch):
+    path = _write_ndjson(tmp_path)
+    cache_dir = str(tmp_path / 'cache')
+    entries = UpbankImporter(cache_dir=cache_dir).extract(path)
+    assert len(os.listdir(cache_dir)) == 1
+
+    # A new run (a new importer) reads the entries back without parsing.
+    monkeypatch.setattr(UpbankImporter, '_extract', lambda self, f: pytest.fail('parsed'))
+    assert UpbankImporter(cache_dir=cache_dir).extract(path) == entries
+
+    # Different configuration, different entries.
+    monkeypatch.undo()
+    tagged = UpbankImporter(tags=frozenset({'joint'}), cache_dir=cache_dir).extract(path)
+    assert tagged[0].tags == {'joint'}
+    assert len(os.listdir(cache_dir)) == 2
+
+    # A corrupt cache file is ignored.
+    for name in os.listdir(cache_dir):
+        (tmp_path / 'cache' / name).write_bytes(b'junk')
+    assert UpbankImporter(cache_dir=cache_dir).extract(path) == entries
@@ -0,0 +1,130 @@
+"""Up Bank webhook receiver.
+
+Up POSTs an event to a registered webhook URL whenever a transaction is
+created, settled or deleted. The receiver checks each event's signature,
+fetches the transaction it refers to, and saves it, so new transactions
+arrive without polling. A deleted transaction (eg: a HELD one that was
+reversed) is removed from the store.
+
+See https://developer.up.com.au/#webhooks
+"""
+import collections
+import hashlib
+import hmac
+import http.server
+import json
+
+import click
+
+# Header carrying the HMAC-SHA256 (hex) of the raw body, keyed by the
+# webhook's secretKey.
+SIGNATURE_HEADER = "X-Up-Authenticity-Signature"
+
+# Events that refer to a transaction worth (re)fetching.
+TRANSACTION_EVENTS = frozenset({"TRANSACTION_CREATED", "TRANSACTION_SETTLED"})
+
+# Event for a transaction Up no longer has; it can't be fetched.
+DELETED_EVENT = "TRANSACTION_DELETED"
+
+
+def sign(secret: str, body: bytes) -> str:
+    """Return the signature Up sends for body."""
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(secret: str, body: bytes, signature: str) -> bool:
+    """True if signature is Up's signature of body with secret."""
+    return hmac.compare_digest(sign(secret, body), signature or "")
+
+
+class NdjsonSpool:
+    """Append each transaction to a file as a line of JSON.
+
+    The spool is append-only: it has no delete(), so deletions are only
+    logged.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def save(self, transactions: list):
+        with open(self.path, "a") as fileobj:
+            for trans in transactions:
+                fileobj.write(json.dumps(trans) + "\n")
+
+
+class WebhookServer(http.server.HTTPServer):
+    """HTTP server receiving Up webhook events.
+
+    Requests are handled one at a time, so the sink (eg: an UpbankStore,
+    whose SQLite connection belongs to this thread) needs no locking.
+    """
+
+    def __init__(self, address, secret: str, client, sink):
+        """
+        address: (host, port) to listen on; port 0 picks a free one.
+        secret: the webhook's secretKey, from `upbank webhook register`.
+        client: UpbankClient to fetch the transactions with.
+        sink: object with a save(transactions) method; UpbankStore or NdjsonSpool.
+        """
+        super().__init__(address, WebhookHandler)
+        self.secret = secret
+        self.client = client
+        self.sink = sink
+        # Event ids already handled, since Up retries deliveries it thinks
+        # failed; only the most recent SEEN_MAX are remembered.
+        self.seen = collections.OrderedDict()
+
+    # Up gives up redelivering after a few attempts, so this is plenty.
+    SEEN_MAX = 1000
+
+    def remember(self, event_id: str):
+        """Note that event_id has been handled, forgetting the oldest beyond SEEN_MAX."""
+        self.seen[event_id] = None
+        self.seen.move_to_end(event_id)
+        while len(self.seen) > self.SEEN_MAX:
+            self.seen.popitem(last=False)
+
+
+class WebhookHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if not verify_signature(server.secret, body, self.headers.get(SIGNATURE_HEADER)):
+            return self._reply(401)
+        try:
+            event = json.loads(body)["data"]
+            event_id = event["id"]
+            event_type = event["attributes"]["eventType"]
+            if event_type in TRANSACTION_EVENTS or event_type == DELETED_EVENT:
+                transaction_id = event["relationships"]["transaction"]["data"]["id"]
+        except (ValueError, KeyError, TypeError):
+            return self._reply(400)
+
+        if event_id in server.seen:
+            return self._reply(200)  # A redelivery of one already handled.
+        if event_type in TRANSACTION_EVENTS:
+            try:
+                trans = server.client.transaction(transaction_id)
+            except click.ClickException as exc:
+                self.log_message("%s", exc.format_message())
+                # A 5xx asks Up to deliver the event again later.
+                return self._reply(502)
+            server.sink.save([trans])
+            server.remember(event_id)
+            self.log_message("%s %s", event_type, transaction_id)
+        elif event_type == DELETED_EVENT:
+            delete = getattr(server.sink, "delete", None)
+            if delete is None:
+                self.log_message("%s %s (not removed from the spool)", event_type, transaction_id)
+            else:
+                delete([transaction_id])
+                self.log_message("%s %s", event_type, transaction_id)
+            server.remember(event_id)
+        self._reply(200)
+
+    def _reply(self, status):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
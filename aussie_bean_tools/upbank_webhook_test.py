@@ -0,0 +1,156 @@
+import datetime
+import json
+import threading
+
+import click
+import pytest
+import requests
+
+from aussie_bean_tools.upbank_store import UpbankStore
+from aussie_bean_tools.upbank_webhook import (
+    SIGNATURE_HEADER, NdjsonSpool, WebhookServer, sign, verify_signature)
+
+SECRET = "shh"
+
+
+class _FakeClient:
+    def __init__(self):
+        self.fetched = []
+
+    def transaction(self, transaction_id):
+        self.fetched.append(transaction_id)
+        if transaction_id == "broken":
+            raise click.ClickException("HTTP 503")
+        return {
+            "type": "transactions",
+            "id": transaction_id,
+            "attributes": {"status": "SETTLED",
+                           "createdAt": "2026-05-01T09:00:00+10:00"},
+        }
+
+
+def _event(event_id, event_type, transaction_id="t1", relationships=True):
+    event = {"data": {
+        "type": "webhook-events",
+        "id": event_id,
+        "attributes": {"eventType": event_type,
+                       "createdAt": "2026-05-01T09:00:01+10:00"},
+        "relationships": {"webhook": {"data": {"type": "webhooks", "id": "w1"}}},
+    }}
+    if event_type != "PING" and relationships:
+        event["data"]["relationships"]["transaction"] = {
+            "data": {"type": "transactions", "id": transaction_id}}
+    return json.dumps(event).encode()
+
+
+@pytest.fixture
+def receiver(tmp_path):
+    """A WebhookServer on a free local port, spooling to a file."""
+    client = _FakeClient()
+    spool = tmp_path / "spool.ndjson"
+    server = WebhookServer(("127.0.0.1", 0), SECRET, client, NdjsonSpool(str(spool)))
+    server.fake_client = client
+    server.spool = spool
+    server.url = f"http://127.0.0.1:{server.server_port}/"
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _send(receiver, body, secret=SECRET):
+    """Deliver body as Up would: a POST signed with the webhook's secret."""
+    return requests.post(
+        receiver.url, data=body, headers={SIGNATURE_HEADER: sign(secret, body)})
+
+
+def test_verify_signature():
+    assert verify_signature(SECRET, b"body", sign(SECRET, b"body"))
+    assert not verify_signature(SECRET, b"body", sign("other", b"body"))
+    assert not verify_signature(SECRET, b"body", None)
+
+
+def test_created_event_fetches_and_spools_transaction(receiver):
+    assert _send(receiver, _event("e1", "TRANSACTION_CREATED")).status_code == 200
+    assert receiver.fake_client.fetched == ["t1"]
+    lines = receiver.spool.read_text().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == ["t1"]
+
+
+def test_redelivered_event_is_fetched_once(receiver):
+    _send(receiver, _event("e1", "TRANSACTION_SETTLED"))
+    _send(receiver, _event("e1", "TRANSACTION_SETTLED"))
+    assert receiver.fake_client.fetched == ["t1"]
+
+
+def test_bad_signature_is_rejected(receiver):
+    response = _send(receiver, _event("e1", "TRANSACTION_CREATED"), secret="forged")
+    assert response.status_code == 401
+    assert receiver.fake_client.fetched == []
+    assert not receiver.spool.exists()
+
+
+def test_ping_is_acknowledged_without_fetching(receiver):
+    assert _send(receiver, _event("e1", "PING")).status_code == 200
+    assert receiver.fake_client.fetched == []
+
+
+def test_signed_but_malformed_event_is_a_bad_request(receiver):
+    response = _send(receiver, _event("e1", "TRANSACTION_CREATED", relationships=False))
+    assert response.status_code == 400
+    assert receiver.fake_client.fetched == []
+
+
+def test_deleted_event_is_not_fetched_or_spooled(receiver):
+    assert _send(receiver, _event("e1", "TRANSACTION_DELETED")).status_code == 200
+    assert receiver.fake_client.fetched == []
+    assert not receiver.spool.exists()
+
+
+def test_seen_events_are_bounded(receiver):
+    receiver.SEEN_MAX = 2
+    for event_id in ("e1", "e2", "e3"):
+        _send(receiver, _event(event_id, "TRANSACTION_CREATED", event_id))
+    assert list(receiver.seen) == ["e2", "e3"]
+
+
+def test_failed_fetch_asks_up_to_retry(receiver):
+    response = _send(receiver, _event("e1", "TRANSACTION_CREATED", "broken"))
+    assert response.status_code == 502
+    assert not receiver.spool.exists()
+    # Up's redelivery of the same event is then fetched again.
+    _send(receiver, _event("e1", "TRANSACTION_CREATED", "broken"))
+    assert receiver.fake_client.fetched == ["broken", "broken"]
+
+
+def test_saves_to_store(tmp_path):
+    # Handle the request on this thread, which owns the store's connection,
+    # as 'webhook serve' does.
+    with UpbankStore(str(tmp_path / "up.sqlite")) as store:
+        server = WebhookServer(("127.0.0.1", 0), SECRET, _FakeClient(), store)
+        server.url = f"http://127.0.0.1:{server.server_port}/"
+        sender = threading.Thread(
+            target=_send, args=(server, _event("e1", "TRANSACTION_CREATED")))
+        sender.start()
+        server.handle_request()
+        sender.join()
+        server.server_close()
+        since = datetime.datetime(2026, 4, 30, tzinfo=datetime.timezone.utc)
+        assert [t["id"] for t in store.transactions(since)] == ["t1"]
+
+
+def test_deleted_event_removes_from_store(tmp_path):
+    with UpbankStore(str(tmp_path / "up.sqlite")) as store:
+        server = WebhookServer(("127.0.0.1", 0), SECRET, _FakeClient(), store)
+        server.url = f"http://127.0.0.1:{server.server_port}/"
+        for event in (_event("e1", "TRANSACTION_CREATED"), _event("e2", "TRANSACTION_DELETED")):
+            sender = threading.Thread(target=_send, args=(server, event))
+            sender.start()
+            server.handle_request()
+            sender.join()
+        server.server_close()
+        since = datetime.datetime(2026, 4, 30, tzinfo=datetime.timezone.utc)
+        assert store.transactions(since) == []
+        assert server.client.fetched == ["t1"]